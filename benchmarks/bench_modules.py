@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+#
+# Benchmark suite of the library modules against a fake db2 toolchain
+#
+# The stand-ins in benchmarks/fake_db2 (db2ls, db2ilist, db2, su) emit output of
+# configurable size after a configurable latency. Each scenario runs the main()
+# of a module in its own python process against a generated fake installation
+# and reports wall time, number of subprocesses, peak RSS of the module and its
+# children.
+#
+#   $ python benchmarks/bench_modules.py                 # all scenarios
+#   $ python benchmarks/bench_modules.py --scenario facts --latency 0.1
+#
+# Requires ansible to be importable (the modules import AnsibleModule).
+#
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import importlib
+import json
+import os
+import re
+import resource
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_PATH = os.path.dirname(os.path.abspath(__file__))
+LIBRARY_PATH = os.path.join(BENCHMARK_PATH, '..', 'library')
+MODULE_UTILS_PATH = os.path.join(BENCHMARK_PATH, '..', 'module_utils')
+FAKE_DB2_PATH = os.path.join(BENCHMARK_PATH, 'fake_db2')
+
+#
+# Scenarios: (name, module, params, fake toolchain environment)
+#
+def get_scenarios(latency):
+    scenarios = []
+
+    # Database discovery by number of instances, serial and concurrent
+    for installs, instances in [(1, 1), (2, 4), (4, 8)]:
+        for max_workers in [1, 8]:
+            scenarios.append(('facts', 'facts_%sx%s_instances_workers_%s' % (installs, instances, max_workers), 'db2_facts',
+                              {'max_workers': max_workers},
+                              {'FAKE_DB2_INSTALLS': installs, 'FAKE_DB2_INSTANCES': instances, 'FAKE_DB2_DATABASES': 10, 'FAKE_DB2_LATENCY': latency}))
+
+    # SQL file output size, captured and streamed
+    for lines in [1000, 10000, 100000]:
+        for stream_output in [False, True]:
+            scenarios.append(('command', 'command_file_%s_lines_stream_%s' % (lines * 10, stream_output), 'db2_command',
+                              {'instance': 'db2i1_1', 'database': 'DB1', 'file': '{statements_file}', 'stream_output': stream_output,
+                               'ignorable_sqlcodes': 'SQL0601N'},
+                              {'FAKE_DB2_OUTPUT_LINES': 10, 'FAKE_DB2_STATEMENTS': lines, 'FAKE_DB2_ERROR_RATE': 100, 'FAKE_DB2_LATENCY': latency}))
+
+    # Statements per task, one CLP call per statement and one session
+    for statements in [10, 100]:
+        scenarios.append(('command', 'command_session_%s_statements' % statements, 'db2_command',
+                          {'instance': 'db2i1_1', 'database': 'DB1', 'commands': ['SELECT %s FROM SYSIBM.SYSDUMMY1' % n for n in range(statements)]},
+                          {'FAKE_DB2_LATENCY': latency}))
+
+    # DBM CFG diff and update by number of configuration parameters
+    for parameters in [10, 100, 500]:
+        scenarios.append(('instance', 'instance_dbm_cfg_%s_parameters' % parameters, 'db2_instance',
+                          {'name': 'db2i1_1', 'configurations': [{'name': 'PARAM_%s' % n, 'value': n + 1} for n in range(parameters)]},
+                          {'FAKE_DB2_DBM_PARAMS': parameters, 'FAKE_DB2_LATENCY': latency}))
+
+    return scenarios
+
+#
+# Fake installation
+#
+# <root>/installs/V11.5_<n>/bin/db2ilist, <root>/home/<instance>/sqllib/db2profile
+#
+def create_fake_installation(root, environment):
+    installs = int(environment.get('FAKE_DB2_INSTALLS', 1))
+    instances = int(environment.get('FAKE_DB2_INSTANCES', 1))
+
+    for install in range(1, installs + 1):
+        bin_path = os.path.join(root, 'installs', 'V11.5_%s' % install, 'bin')
+        os.makedirs(bin_path)
+        shutil.copy(os.path.join(FAKE_DB2_PATH, 'db2ilist'), bin_path)
+
+        for instance in range(1, instances + 1):
+            instance_name = 'db2i%s_%s' % (install, instance)
+            sqllib_path = os.path.join(root, 'home', instance_name, 'sqllib')
+            os.makedirs(sqllib_path)
+            with open(os.path.join(sqllib_path, 'db2profile'), 'w') as f:
+                f.write("export PATH=%s:%s:$PATH\nexport DB2INSTANCE=%s\n" % (FAKE_DB2_PATH, os.path.dirname(sys.executable), instance_name))
+
+    statements = int(environment.get('FAKE_DB2_STATEMENTS', 0))
+    statements_file = os.path.join(root, 'statements.sql')
+    with open(statements_file, 'w') as f:
+        for n in range(statements):
+            f.write("CREATE TABLE DB2INST1.T%s (ID INTEGER);\n" % n)
+
+    return statements_file
+
+#
+# Stand-in for AnsibleModule
+#
+# run_command maps the absolute paths used by the modules (db2ls, su, sudo, ~instance)
+# to the fake toolchain and counts the subprocesses.
+#
+class BenchmarkExit(Exception):
+    pass
+
+class BenchmarkSubprocess(object):
+    PIPE = subprocess.PIPE
+    STDOUT = subprocess.STDOUT
+
+    def __init__(self, popen):
+        self.Popen = popen
+
+def get_benchmark_module_class(root, params):
+    home_path = os.path.join(root, 'home')
+
+    def rewrite(command):
+        command = command.replace('/usr/local/bin/db2ls', os.path.join(FAKE_DB2_PATH, 'db2ls'))
+        command = command.replace('/bin/sudo ', '')
+        command = command.replace('/bin/su ', os.path.join(FAKE_DB2_PATH, 'su') + ' ')
+        return re.sub(r"~(\w+)/", lambda match: os.path.join(home_path, match.group(1)) + '/', command)
+
+    class BenchmarkModule(object):
+        subprocess_count = 0
+
+        def __init__(self, argument_spec=None, **kwargs):
+            self.params = dict((name, spec.get('default')) for name, spec in (argument_spec or {}).items())
+            self.params.update(params)
+
+        @staticmethod
+        def popen(args, **kwargs):
+            BenchmarkModule.subprocess_count += 1
+            if isinstance(args, (list, tuple)):
+                args = [rewrite(arg) for arg in args]
+            else:
+                args = shlex.split(rewrite(args))
+            if args[0] == '/bin/sudo':
+                args = args[1:]
+            if args[0] == '/bin/su':
+                args[0] = os.path.join(FAKE_DB2_PATH, 'su')
+            if os.path.basename(args[-2] if len(args) > 1 else '') == 'sh' and os.path.isfile(args[-1]):
+                # CLP session script in a file
+                with open(args[-1]) as f:
+                    script = rewrite(f.read())
+                with open(args[-1], 'w') as f:
+                    f.write(script)
+            return subprocess.Popen(args, **kwargs)
+
+        def run_command(self, args, data=None, **kwargs):
+            process = BenchmarkModule.popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+            out, err = process.communicate(data)
+            return process.returncode, out, err
+
+        def warn(self, warning):
+            pass
+
+        def exit_json(self, **kwargs):
+            raise BenchmarkExit(dict(kwargs, failed=False))
+
+        def fail_json(self, **kwargs):
+            raise BenchmarkExit(dict(kwargs, failed=True))
+
+    return BenchmarkModule
+
+def load_module(name):
+    # module_utils of the role are merged into ansible.module_utils, as ansible does for roles
+    import ansible.module_utils
+    if MODULE_UTILS_PATH not in ansible.module_utils.__path__:
+        ansible.module_utils.__path__.append(MODULE_UTILS_PATH)
+
+    sys.path.insert(0, LIBRARY_PATH)
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.pop(0)
+
+#
+# Run one scenario in this process, called in a child process per scenario
+#
+def run_scenario(module_name, params, environment):
+    root = tempfile.mkdtemp(prefix='bench_db2_')
+    try:
+        statements_file = create_fake_installation(root, environment)
+        params = json.loads(json.dumps(params).replace('{statements_file}', statements_file))
+
+        os.environ.update(dict((key, str(value)) for key, value in environment.items()))
+        os.environ['FAKE_DB2_ROOT'] = root
+
+        module = load_module(module_name)
+        module.AnsibleModule = get_benchmark_module_class(root, params)
+        if hasattr(module, 'subprocess'):
+            # stream_output and detached jobs call Popen directly
+            module.subprocess = BenchmarkSubprocess(module.AnsibleModule.popen)
+        for patched_module in [module, sys.modules['ansible.module_utils.db2_common']]:
+            if hasattr(patched_module, 'DB2LS_COMMAND'):
+                patched_module.DB2LS_COMMAND = os.path.join(FAKE_DB2_PATH, 'db2ls')
+        if hasattr(module, 'INSTANCE_STATE_CACHE'):
+            # Instance exists and is running, the instance users do not exist on this host
+            module.INSTANCE_STATE_CACHE[('exists', params.get('name'))] = True
+            module.INSTANCE_STATE_CACHE[('running', params.get('name'))] = True
+
+        # Fake instances are no users on this host
+        expanduser = os.path.expanduser
+        os.path.expanduser = lambda path: re.sub(r"^~(\w+)", lambda match: os.path.join(root, 'home', match.group(1)), path) if path.startswith('~') and path[1:2] != '/' else expanduser(path)
+
+        start = time.time()
+        try:
+            module.main()
+            result = {'failed': None}
+        except BenchmarkExit as e:
+            result = e.args[0]
+        elapsed = time.time() - start
+        os.path.expanduser = expanduser
+
+        return {
+            'elapsed': elapsed,
+            'subprocess_count': module.AnsibleModule.subprocess_count,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'peak_rss_children_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+            'failed': result.get('failed'),
+            'rc': result.get('rc'),
+            'msg': str(result.get('msg', ''))[:200]
+        }
+    finally:
+        shutil.rmtree(root)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the db2 modules against a fake db2 toolchain')
+    parser.add_argument('--scenario', choices=['facts', 'command', 'instance'], default=None, help='run only scenarios of this group')
+    parser.add_argument('--latency', type=float, default=0.05, help='latency in seconds of each fake db2 tool call')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    parser.add_argument('--run-one', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        module_name, params, environment = json.loads(args.run_one)
+        print(json.dumps(run_scenario(module_name, params, environment)))
+        return
+
+    if not args.json:
+        print("%-48s %10s %12s %14s %14s" % ('scenario', 'wall [s]', 'subprocesses', 'rss [MB]', 'child rss [MB]'))
+
+    for group, name, module_name, params, environment in get_scenarios(args.latency):
+        if args.scenario and group != args.scenario:
+            continue
+
+        # Fresh process per scenario: module caches and peak RSS start from zero
+        out = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--run-one', json.dumps([module_name, params, environment])],
+                                      universal_newlines=True)
+        result = json.loads(out.strip().splitlines()[-1])
+        result['scenario'] = name
+
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print("%-48s %10.3f %12s %14.1f %14.1f%s" % (name, result['elapsed'], result['subprocess_count'],
+                                                         result['peak_rss_kb'] / 1024.0, result['peak_rss_children_kb'] / 1024.0,
+                                                         '  FAILED: %s' % result['msg'] if result['failed'] else ''))
+
+if __name__ == '__main__':
+    main()
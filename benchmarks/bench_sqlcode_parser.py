@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#
+# Microbenchmark of the SQLCODE parser of db2_command on synthetic CLP logs
+#
+# Generates a 'db2 -vtxf' like log of the given size and parses it line by line
+# with the legacy per line re.match and with Db2OutputParser.
+#
+#   $ python benchmarks/bench_sqlcode_parser.py --size-mb 4096
+#
+# Requires ansible to be importable (library/db2_command.py imports AnsibleModule).
+#
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import importlib
+import os
+import re
+import sys
+import tempfile
+import time
+
+LIBRARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'library')
+MODULE_UTILS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'module_utils')
+
+STATEMENT_BLOCKS = [
+    "CREATE TABLE DB2INST1.T%(n)s (ID INTEGER NOT NULL, NAME VARCHAR(128))\n"
+    "DB20000I  The SQL command completed successfully.\n\n",
+
+    "CREATE TABLE DB2INST1.T%(n)s (ID INTEGER NOT NULL, NAME VARCHAR(128))\n"
+    "DB21034E  The command was processed as an SQL statement because it was not a\n"
+    "valid Command Line Processor command.  During SQL processing it returned:\n"
+    "SQL0601N  The name of the object to be created is identical to the existing\n"
+    "name \"DB2INST1.T%(n)s\" of type \"TABLE\".  SQLSTATE=42710\n\n",
+
+    "SELECT ID, NAME FROM DB2INST1.T%(n)s WHERE 1=0\n"
+    "SQL0100W  No row was found for FETCH, UPDATE or DELETE; or the result of a\n"
+    "query is an empty table.  SQLSTATE=02000\n\n",
+
+    "SELECT ID, NAME FROM DB2INST1.T%(n)s\n"
+    "          1 NAME1\n"
+    "          2 NAME2\n"
+    "          3 NAME3\n\n",
+]
+
+
+def load_module(name):
+    # module_utils of the role are merged into ansible.module_utils, as ansible does for roles
+    import ansible.module_utils
+    if MODULE_UTILS_PATH not in ansible.module_utils.__path__:
+        ansible.module_utils.__path__.append(MODULE_UTILS_PATH)
+
+    sys.path.insert(0, LIBRARY_PATH)
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.pop(0)
+
+
+def generate_log(path, size_bytes):
+    written = 0
+    n = 0
+    with open(path, 'w') as f:
+        while written < size_bytes:
+            block = STATEMENT_BLOCKS[n % len(STATEMENT_BLOCKS)] % {'n': n}
+            f.write(block)
+            written += len(block)
+            n += 1
+    return n
+
+
+def parse_legacy(path):
+    sqlcodes = {}
+    with open(path) as f:
+        for line in f:
+            match = re.match(r"^(SQL\d+N) .*$", line, re.I)
+            if match:
+                sqlcodes[match.group(1)] = sqlcodes.get(match.group(1), 0) + 1
+    return sqlcodes
+
+
+def parse_single_pass(parser_class, path):
+    parser = parser_class()
+    with open(path) as f:
+        for line in f:
+            parser.feed(line.rstrip('\n'))
+    return parser.sqlcodes
+
+
+def measure(label, function, size_bytes):
+    start = time.time()
+    result = function()
+    elapsed = time.time() - start
+    print("%-12s %8.2fs %8.1f MB/s  %s" % (label, elapsed, size_bytes / 1024.0 / 1024.0 / elapsed, result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the SQLCODE parser of db2_command')
+    parser.add_argument('--size-mb', type=int, default=256, help='size of the synthetic CLP log in MB')
+    parser.add_argument('--log', default=None, help='parse this CLP log instead of a synthetic one')
+    args = parser.parse_args()
+
+    db2_command = load_module('db2_command')
+
+    path = args.log
+    if not path:
+        fd, path = tempfile.mkstemp(prefix='bench_clp_', suffix='.log')
+        os.close(fd)
+        statements = generate_log(path, args.size_mb * 1024 * 1024)
+        print("Generated %s statements in %s" % (statements, path))
+
+    try:
+        size_bytes = os.path.getsize(path)
+        measure('legacy', lambda: parse_legacy(path), size_bytes)
+        measure('single-pass', lambda: parse_single_pass(db2_command.Db2OutputParser, path), size_bytes)
+    finally:
+        if not args.log:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+#
+# Benchmark of the per-task overhead of the library modules
+#
+# Ansible executes a module in a fresh python process per task. The startup part
+# imports each module in many cold processes and reports the import time of
+# the module (ansible.module_utils.basic excluded) and the wall time of the
+# process. With --baseline the modules of another git revision are measured as
+# well, e.g. before the move to module_utils/db2_common.py. The parse part
+# measures the parsers of DBM/DB CFG and database directory output against the
+# former per line re.match.
+#
+#   $ python benchmarks/bench_startup.py                          # all modules, 200 executions each
+#   $ python benchmarks/bench_startup.py --executions 2000 --module db2_command --baseline HEAD~1
+#   $ python benchmarks/bench_startup.py --parse-only --iterations 10000
+#
+# Requires ansible to be importable (the modules import AnsibleModule).
+#
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_PATH = os.path.dirname(os.path.abspath(__file__))
+ROOT_PATH = os.path.abspath(os.path.join(BENCHMARK_PATH, '..'))
+
+MODULES = ['db2_facts', 'db2_instance', 'db2_command', 'db2_database_cfg', 'db2_load',
+           'db2_maintenance', 'db2_diag', 'db2_monitor', 'db2_backup']
+
+# Executed by each cold process: import ansible first, then the module
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.time()
+import ansible.module_utils
+import ansible.module_utils.basic
+ansible_elapsed = time.time() - start
+ansible.module_utils.__path__.append(sys.argv[2])
+sys.path.insert(0, sys.argv[1])
+start = time.time()
+__import__(sys.argv[3])
+print(json.dumps({'ansible': ansible_elapsed, 'module': time.time() - start}))
+"""
+
+#
+# Startup
+#
+def export_revision(revision, path):
+    # library and module_utils of a git revision, module_utils may not exist
+    for folder in ['library', 'module_utils']:
+        os.makedirs(os.path.join(path, folder))
+        try:
+            files = subprocess.check_output(['git', '-C', ROOT_PATH, 'ls-tree', '--name-only', '%s:%s' % (revision, folder)],
+                                            universal_newlines=True, stderr=subprocess.STDOUT).split()
+        except subprocess.CalledProcessError:
+            continue
+        for name in files:
+            with open(os.path.join(path, folder, name), 'wb') as f:
+                f.write(subprocess.check_output(['git', '-C', ROOT_PATH, 'show', '%s:%s/%s' % (revision, folder, name)]))
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def measure_startup(root, module_name, executions):
+    if not os.path.isfile(os.path.join(root, 'library', module_name + '.py')):
+        return None
+
+    # Warm up: bytecode of the modules is written once, as for repeated tasks on a host
+    command = [sys.executable, '-c', STARTUP_SCRIPT, os.path.join(root, 'library'), os.path.join(root, 'module_utils'), module_name]
+    subprocess.check_output(command)
+
+    module_times = []
+    process_times = []
+    for n in range(executions):
+        start = time.time()
+        out = subprocess.check_output(command, universal_newlines=True)
+        process_times.append(time.time() - start)
+        module_times.append(json.loads(out.strip().splitlines()[-1])['module'])
+
+    return {
+        'module_ms': 1000 * sum(module_times) / executions,
+        'module_p95_ms': 1000 * percentile(module_times, 0.95),
+        'process_ms': 1000 * sum(process_times) / executions,
+        # Module import time of 1000 task executions
+        'per_1000_tasks_s': sum(module_times) / executions * 1000
+    }
+
+#
+# Parse
+#
+def get_dbm_cfg_output(parameters):
+    lines = ["", "          Database Manager Configuration", "", "     Node type = Enterprise Server Edition with local and remote clients", ""]
+    for n in range(parameters):
+        lines.append(" Configuration parameter number %-18s (PARAM_%s) = AUTOMATIC(%s)" % (n, n, n))
+    return "\n".join(lines)
+
+def get_database_directory_output(databases):
+    lines = ["", " System Database Directory", "", " Number of entries in the directory = %s" % databases, ""]
+    for n in range(databases):
+        lines.extend([
+            "Database %s entry:" % (n + 1), "",
+            " Database alias                       = DB%s" % n,
+            " Database name                        = DB%s" % n,
+            " Local database directory             = /db2/db2inst1/home",
+            " Database release level               = 15.00",
+            " Comment                              =",
+            " Directory entry type                 = Indirect",
+            " Catalog database partition number    = 0",
+            " Alternate server hostname            =",
+            " Alternate server port number         =", ""
+        ])
+    return "\n".join(lines)
+
+# Former parsers of db2_instance and db2_facts
+def parse_cfg_legacy(out):
+    configurations = {}
+    for line in out.splitlines():
+        match = re.match(r".* \((.*)\) = (.*)", line)
+        if match:
+            configurations[match.group(1).upper()] = match.group(2)
+    return configurations
+
+def parse_database_directory_legacy(out):
+    databases = []
+    database_alias = None
+    database_name = None
+    local_database_directory = None
+    for line in out.splitlines():
+        if re.match('^ +Database name += .*$', line):
+            database_name = line.split('=')[1].strip()
+        if re.match('^ +Database alias += .*$', line):
+            database_alias = line.split('=')[1].strip()
+        if re.match('^ +Local database directory += .*$', line):
+            local_database_directory = line.split('=')[1].strip()
+        if re.match('^ +Directory entry type += Indirect$', line):
+            databases.append({'database_alias': database_alias, 'database_name': database_name, 'local_database_directory': local_database_directory})
+            database_alias = None
+            database_name = None
+            local_database_directory = None
+    return databases
+
+def measure_parse(function, out, iterations):
+    start = time.time()
+    for n in range(iterations):
+        result = function(out)
+    return 1000000 * (time.time() - start) / iterations, result
+
+def run_parse(iterations):
+    import ansible.module_utils
+    ansible.module_utils.__path__.append(os.path.join(ROOT_PATH, 'module_utils'))
+    from ansible.module_utils.db2_common import parse_cfg, parse_database_directory
+
+    results = []
+    for name, out, legacy, current in [
+            ('dbm_cfg_200_parameters', get_dbm_cfg_output(200), parse_cfg_legacy, parse_cfg),
+            ('database_directory_50_databases', get_database_directory_output(50), parse_database_directory_legacy, parse_database_directory)]:
+        legacy_us, legacy_result = measure_parse(legacy, out, iterations)
+        current_us, current_result = measure_parse(current, out, iterations)
+        results.append({'parser': name, 'legacy_us': legacy_us, 'current_us': current_us,
+                        'same_result': legacy_result == current_result})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark module startup and output parsing of the db2 modules')
+    parser.add_argument('--module', choices=MODULES, action='append', default=None, help='measure only this module, repeatable')
+    parser.add_argument('--executions', type=int, default=200, help='cold processes per module')
+    parser.add_argument('--baseline', default=None, help='git revision to compare with, e.g. HEAD~1')
+    parser.add_argument('--iterations', type=int, default=2000, help='parses per parser')
+    parser.add_argument('--startup-only', action='store_true', help='skip the parse benchmark')
+    parser.add_argument('--parse-only', action='store_true', help='skip the startup benchmark')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    args = parser.parse_args()
+
+    if not args.parse_only:
+        trees = [('current', ROOT_PATH)]
+        baseline_path = None
+        if args.baseline:
+            baseline_path = tempfile.mkdtemp(prefix='bench_startup_')
+            export_revision(args.baseline, baseline_path)
+            trees.append((args.baseline, baseline_path))
+
+        try:
+            if not args.json:
+                print("%-18s %-10s %12s %12s %12s %18s" % ('module', 'tree', 'import [ms]', 'p95 [ms]', 'process [ms]', 'per 1000 tasks [s]'))
+            for module_name in args.module or MODULES:
+                for tree, path in trees:
+                    result = measure_startup(path, module_name, args.executions)
+                    if result is None:
+                        continue
+                    if args.json:
+                        print(json.dumps(dict(result, module=module_name, tree=tree)))
+                    else:
+                        print("%-18s %-10s %12.2f %12.2f %12.2f %18.2f" % (module_name, tree, result['module_ms'], result['module_p95_ms'],
+                                                                            result['process_ms'], result['per_1000_tasks_s']))
+        finally:
+            if baseline_path:
+                shutil.rmtree(baseline_path)
+
+    if not args.startup_only:
+        if not args.json:
+            print("\n%-34s %12s %12s %8s" % ('parser', 'legacy [us]', 'current [us]', 'same'))
+        for result in run_parse(args.iterations):
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print("%-34s %12.1f %12.1f %8s" % (result['parser'], result['legacy_us'], result['current_us'], result['same_result']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,441 @@
+#!/usr/bin/python
+
+from __future__ import (absolute_import, division)
+__metaclass__ = type
+
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+
+DOCUMENTATION = '''
+---
+module: db2_backup
+version_added: 2.4
+short_description: Back up or restore many Db2 databases concurrently
+description:
+  - Runs BACKUP DATABASE or RESTORE DATABASE for one database, a list of targets or all
+    local databases. Up to max_workers databases are processed at the same time, limited
+    by io_budget. Returns duration, image size and throughput in MB/s per database.
+options:
+  action:
+    description:
+      - backup or restore
+    required: false
+    default: backup
+    choices: ["backup", "restore"]
+
+  instance:
+    description:
+      - name of the Db2 instance. Required unless targets or all_databases is used.
+    required: false
+
+  database:
+    description:
+      - name of the Db2 database. Required with instance.
+    required: false
+
+  targets:
+    description:
+      - list of targets with keys C(instance) and C(database). Restore also accepts
+        C(taken_at) and C(into) per target.
+    required: false
+
+  all_databases:
+    description:
+      - Back up all local databases of all instances (same discovery as db2_facts).
+    required: false
+    default: false
+
+  paths:
+    description:
+      - directories of the backup images. A backup is split over all directories, one
+        session per directory. Not used with use_tsm.
+    required: false
+
+  use_tsm:
+    description:
+      - Back up to or restore from TSM with C(sessions) sessions.
+    required: false
+    default: false
+
+  sessions:
+    description:
+      - Number of TSM sessions (OPEN n SESSIONS).
+    required: false
+
+  online:
+    description:
+      - Online backup including the logs.
+    required: false
+    default: false
+
+  compress:
+    description:
+      - Compress the backup image.
+    required: false
+    default: false
+
+  parallelism:
+    description:
+      - PARALLELISM (number of buffer manipulators) of each backup or restore. Db2 chooses the value if not set.
+    required: false
+
+  buffers:
+    description:
+      - Number of buffers (WITH n BUFFERS). Db2 chooses the value if not set.
+    required: false
+
+  buffer_size:
+    description:
+      - Buffer size in 4 KB pages (BUFFER n). Db2 chooses the value if not set.
+    required: false
+
+  util_impact_priority:
+    description:
+      - UTIL_IMPACT_PRIORITY (1-100) of online backups, throttled by UTIL_IMPACT_LIM of the instance.
+    required: false
+
+  taken_at:
+    description:
+      - Timestamp of the image to restore. The only image in paths if not set.
+    required: false
+
+  into:
+    description:
+      - Restore into a database with this name.
+    required: false
+
+  max_workers:
+    description:
+      - Maximum number of databases processed concurrently.
+    required: false
+    default: 2
+
+  io_budget:
+    description:
+      - Maximum sum of the parallelism (1 if parallelism is not set) of all backups and
+        restores running at the same time. 0 disables the budget.
+    required: false
+    default: 0
+
+  progress_file:
+    description:
+      - path of a file to which a JSON line is appended when a database starts and finishes.
+    required: false
+
+author:
+  - ma44in
+'''
+
+EXAMPLES = '''
+# Note:
+# Nightly offline backup of all local databases, 3 at a time, at most 8 buffer manipulators
+- db2_backup:
+    all_databases: true
+    paths:
+      - /backup/fs1
+      - /backup/fs2
+    compress: true
+    parallelism: 4
+    buffers: 8
+    buffer_size: 4096
+    max_workers: 3
+    io_budget: 8
+    progress_file: /tmp/backup_progress.json
+  register: backup
+
+- debug:
+    msg: "{{ item.database }}: {{ item.mb_per_sec }} MB/s"
+  loop: "{{ backup.results }}"
+
+# Restore a copy
+- db2_backup:
+    action: restore
+    instance: db2inst1
+    database: SAMPLE
+    into: SAMPLE2
+    taken_at: "20170713152823"
+    paths:
+      - /backup/fs1
+      - /backup/fs2
+'''
+
+RETURN = '''
+results:
+  description: result per database, in the order of the targets
+  returned: always
+  type: list
+  sample:
+    - instance: db2inst1
+      database: SAMPLE
+      command: "BACKUP DATABASE SAMPLE TO /backup/fs1, /backup/fs2 WITH 8 BUFFERS BUFFER 4096 PARALLELISM 4 COMPRESS WITHOUT PROMPTING"
+      rc: 0
+      timestamp: "20170713152823"
+      images: ["/backup/fs1/SAMPLE.0.db2inst1.DBPART000.20170713152823.001"]
+      image_size_mb: 1024.5
+      elapsed: 12.3
+      waited: 0.0
+      mb_per_sec: 83.3
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.db2_common import exec_db2_session, get_db2_database_targets, map_concurrently, write_progress
+import glob
+import os
+import re
+import threading
+import time
+
+# Backup successful. The timestamp for this backup image is : 20170713152823
+BACKUP_TIMESTAMP_PATTERN = re.compile(r"timestamp for this backup image is\s*:\s*(\d{14})")
+
+#
+# Build BACKUP and RESTORE commands
+#
+def __get_media_clause(options):
+    if options['use_tsm']:
+        return "USE TSM" + (" OPEN %s SESSIONS" % options['sessions'] if options['sessions'] else "")
+    return "%s %s" % ('TO' if options['action'] == 'backup' else 'FROM', ", ".join(options['paths']))
+
+def __get_buffer_clause(options):
+    clause = []
+    if options['buffers']:
+        clause.append("WITH %s BUFFERS" % options['buffers'])
+    if options['buffer_size']:
+        clause.append("BUFFER %s" % options['buffer_size'])
+    return clause
+
+def __get_parallelism_clause(options):
+    return ["PARALLELISM %s" % options['parallelism']] if options['parallelism'] else []
+
+# Clauses in the order of the syntax diagrams of BACKUP DATABASE and RESTORE DATABASE
+def __build_backup_command(target, options):
+    command = ["BACKUP DATABASE %s" % target['database']]
+    if options['online']:
+        command.append("ONLINE")
+    command.append(__get_media_clause(options))
+    command.extend(__get_buffer_clause(options))
+    command.extend(__get_parallelism_clause(options))
+    if options['compress']:
+        command.append("COMPRESS")
+    if options['online'] and options['util_impact_priority']:
+        command.append("UTIL_IMPACT_PRIORITY %s" % options['util_impact_priority'])
+    if options['online']:
+        command.append("INCLUDE LOGS")
+    command.append("WITHOUT PROMPTING")
+    return " ".join(command)
+
+def __build_restore_command(target, options):
+    command = ["RESTORE DATABASE %s" % target['database']]
+    command.append(__get_media_clause(options))
+    taken_at = target.get('taken_at') or options['taken_at']
+    if taken_at:
+        command.append("TAKEN AT %s" % taken_at)
+    into = target.get('into') or options['into']
+    if into:
+        command.append("INTO %s" % into)
+    command.extend(__get_buffer_clause(options))
+    command.append("REPLACE EXISTING")
+    command.extend(__get_parallelism_clause(options))
+    command.append("WITHOUT PROMPTING")
+    return " ".join(command)
+
+#
+# Backup images on disk
+#
+#   <path>/SAMPLE.0.db2inst1.DBPART000.20170713152823.001
+#
+def __get_backup_images(paths, instance_name, database_name, timestamp=None):
+    images = []
+    for path in paths:
+        images.extend(glob.glob(os.path.join(path, "%s.0.%s.*.%s.*" % (database_name.upper(), instance_name, timestamp or '[0-9]*'))))
+    return sorted(images)
+
+def __get_newest_backup_images(images):
+    # All parts of the image with the latest timestamp
+    timestamps = [os.path.basename(image).split('.')[4] for image in images]
+    return [image for image, timestamp in zip(images, timestamps) if timestamp == max(timestamps)] if images else []
+
+def __get_images_size_mb(images):
+    size = 0
+    for image in images:
+        try:
+            size += os.path.getsize(image)
+        except OSError:
+            pass
+    return round(size / (1024 * 1024), 3)
+
+#
+# I/O budget
+#
+# Each running backup or restore consumes its parallelism from the budget. A worker
+# waits until its share is available, so the sum over all running jobs stays within
+# the budget even if max_workers would allow more jobs.
+#
+class IoBudget(object):
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, units):
+        if not self.budget:
+            return
+        # A single job larger than the budget runs alone
+        units = min(units, self.budget)
+        with self.condition:
+            while self.used + units > self.budget:
+                self.condition.wait()
+            self.used += units
+
+    def release(self, units):
+        if not self.budget:
+            return
+        with self.condition:
+            self.used -= min(units, self.budget)
+            self.condition.notify_all()
+
+def __process_database(module, target, options, io_budget):
+    instance_name = target['instance']
+    database_name = target['database']
+
+    if options['action'] == 'backup':
+        command = __build_backup_command(target, options)
+    else:
+        command = __build_restore_command(target, options)
+
+    result = {'instance': instance_name, 'database': database_name, 'command': command}
+    units = options['parallelism'] or 1
+
+    wait_start = time.time()
+    io_budget.acquire(units)
+    try:
+        result['waited'] = round(time.time() - wait_start, 3)
+        write_progress(module, options['progress_file'], {'instance': instance_name, 'database': database_name, 'action': options['action'], 'status': 'started'})
+
+        start = time.time()
+        rc, out, err, results = exec_db2_session(module, instance_name, [command])
+        elapsed = time.time() - start
+    finally:
+        io_budget.release(units)
+
+    command_rc, command_out = results[0]
+    result.update(rc=command_rc, elapsed=round(elapsed, 3))
+
+    # rc 2: warning, e. g. SQL2540W restore successful with warnings
+    if command_rc >= 4:
+        result.update(stdout=command_out, stderr=err)
+
+    images = []
+    if not options['use_tsm']:
+        if options['action'] == 'backup':
+            match = BACKUP_TIMESTAMP_PATTERN.search(command_out)
+            if match:
+                result['timestamp'] = match.group(1)
+                images = __get_backup_images(options['paths'], instance_name, database_name, match.group(1))
+        else:
+            taken_at = target.get('taken_at') or options['taken_at']
+            images = __get_backup_images(options['paths'], instance_name, database_name, taken_at)
+            if not taken_at:
+                images = __get_newest_backup_images(images)
+
+    result['images'] = images
+    result['image_size_mb'] = __get_images_size_mb(images) if images else None
+    result['mb_per_sec'] = round(result['image_size_mb'] / elapsed, 3) if images and elapsed > 0 and command_rc < 4 else None
+
+    write_progress(module, options['progress_file'], {'instance': instance_name, 'database': database_name, 'action': options['action'],
+                                                        'status': 'failed' if command_rc >= 4 else 'finished', 'rc': command_rc,
+                                                        'elapsed': result['elapsed'], 'mb_per_sec': result['mb_per_sec']})
+    return result
+
+def __process_databases(module, targets, options, max_workers, io_budget):
+    # Results keep the order of the targets
+    return map_concurrently(__process_database, [(module, target, options, io_budget) for target in targets], max_workers)
+
+def main():
+    module = AnsibleModule(
+        argument_spec = dict(
+            action = dict(required=False, choices=['backup', 'restore'], default='backup'),
+            instance = dict(required=False, type='str', default=None),
+            database = dict(required=False, type='str', default=None),
+            targets = dict(required=False, type='list', default=None),
+            all_databases = dict(required=False, type='bool', default=False),
+            paths = dict(required=False, type='list', default=None),
+            use_tsm = dict(required=False, type='bool', default=False),
+            sessions = dict(required=False, type='int', default=None),
+            online = dict(required=False, type='bool', default=False),
+            compress = dict(required=False, type='bool', default=False),
+            parallelism = dict(required=False, type='int', default=None),
+            buffers = dict(required=False, type='int', default=None),
+            buffer_size = dict(required=False, type='int', default=None),
+            util_impact_priority = dict(required=False, type='int', default=None),
+            taken_at = dict(required=False, type='str', default=None),
+            into = dict(required=False, type='str', default=None),
+            max_workers = dict(required=False, type='int', default=2),
+            io_budget = dict(required=False, type='int', default=0),
+            progress_file = dict(required=False, type='path', default=None)
+        ),
+        mutually_exclusive = [['instance', 'targets', 'all_databases'], ['paths', 'use_tsm']],
+        required_together = [['instance', 'database']]
+    )
+
+    options = module.params
+    targets = module.params['targets']
+
+    if not (module.params['paths'] or module.params['use_tsm']):
+        module.fail_json(msg="must specify paths or use_tsm")
+        return
+
+    if module.params['action'] == 'restore' and module.params['all_databases']:
+        module.fail_json(msg="all_databases is supported with action backup only")
+        return
+
+    if module.params['all_databases']:
+        targets = get_db2_database_targets(module)
+    elif module.params['instance']:
+        targets = [{'instance': module.params['instance'], 'database': module.params['database']}]
+    elif not targets:
+        module.fail_json(msg="must specify instance and database, targets or all_databases")
+        return
+
+    for target in targets:
+        if not isinstance(target, dict) or 'instance' not in target or 'database' not in target:
+            module.fail_json(msg="each target must be a dict with keys instance and database: %s" % target)
+            return
+
+    start = time.time()
+    results = __process_databases(module, targets, options, module.params['max_workers'], IoBudget(module.params['io_budget']))
+    elapsed = round(time.time() - start, 3)
+
+    failed_targets = ["%s/%s" % (result['instance'], result['database']) for result in results if result['rc'] >= 4]
+    image_size_mb = sum([result['image_size_mb'] or 0 for result in results])
+    summary = dict(elapsed=elapsed, image_size_mb=round(image_size_mb, 3), mb_per_sec=round(image_size_mb / elapsed, 3) if elapsed > 0 else None)
+
+    if failed_targets:
+        module.fail_json(msg="%s FAILED FOR TARGETS: %s" % (module.params['action'].upper(), failed_targets), changed=len(failed_targets) < len(results), results=results, **summary)
+        return
+
+    module.exit_json(changed=len(results) > 0, results=results, **summary)
+
+def init():
+    if __name__ == '__main__':
+        return main()
+
+init()
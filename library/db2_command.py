@@ -33,8 +33,8 @@ description:
 options:
   instance:
     description:
-      - name of the Db2 instance
-    required: true
+      - name of the Db2 instance. Required unless targets or all_databases is used.
+    required: false
     
   database:
     description:
@@ -52,14 +52,180 @@ options:
       - path to sql file with db2 commands
     required: true
 
+  commands:
+    description:
+      - list of db2 commands which are executed in one CLP session. The db2profile is sourced
+        once and all commands share the same CLP back-end process and database connection.
+        Returns rc, stdout, sqlcodes and sqlcode_records for each command in C(results).
+    required: false
+
   logfile:
     description:
       - path where to write logfile
     required: false
 
+  engine:
+    description:
+      - Execution engine. C(clp) runs the db2 command line processor. C(ibm_db) executes
+        SQL statements through the ibm_db python module and returns result sets as lists
+        of dicts in C(results). C(ibm_db) supports command and commands only.
+    required: false
+    default: clp
+    choices: ["clp", "ibm_db"]
+
+  fetch_size:
+    description:
+      - Number of rows fetched per chunk from a result set with engine C(ibm_db). With a logfile,
+        every chunk is appended to the logfile as JSON lines (C({"command": <index>, "row": {...}}))
+        as soon as it is fetched and rows are not returned in C(results), so at most fetch_size rows
+        are held in memory. Without logfile all fetched rows are returned, use max_rows to bound them.
+    required: false
+    default: 1000
+
+  targets:
+    description:
+      - list of targets with keys C(instance) and C(database). The command, file or commands
+        are executed against all targets concurrently. Results are returned per target in
+        C(target_results).
+    required: false
+
+  all_databases:
+    description:
+      - Execute against all local databases of all instances on the host (see db2_facts).
+    required: false
+    default: false
+
+  max_workers:
+    description:
+      - Maximum number of targets processed concurrently.
+    required: false
+    default: 8
+
+  timeout:
+    description:
+      - Timeout in seconds for the execution against one target. 0 disables the timeout.
+    required: false
+    default: 0
+
+  stream_output:
+    description:
+      - Read the CLP output incrementally instead of capturing it in memory. The output is
+        written to logfile as it arrives, sqlcodes are counted on the fly and only the first
+        and last output_lines lines are returned in stdout. Stderr is merged into stdout.
+        Intended for large file runs.
+    required: false
+    default: false
+
+  output_lines:
+    description:
+      - Number of lines returned from the head and from the tail of the output with stream_output.
+        Must be 0 or greater.
+    required: false
+    default: 100
+
+  detach:
+    description:
+      - Start the command or file as a detached job and return its C(job_id) immediately.
+        The job writes its output, the parsed sqlcodes and a heartbeat to files in job_dir.
+    required: false
+    default: false
+
+  job_id:
+    description:
+      - Return the state of a detached job (status starting, running, finished, failed or lost,
+        rc, sqlcodes and the last output_lines lines of output) instead of executing a command.
+    required: false
+
+  job_dir:
+    description:
+      - Directory for state and output files of detached jobs.
+    required: false
+    default: /var/tmp/db2_command_jobs
+
+  result_format:
+    description:
+      - C(text) returns the CLP output in stdout. C(structured) executes command as query and
+        returns C(columns) and C(rows) as list of dicts with typed values. The query runs
+        through DESCRIBE and EXPORT ... OF DEL in one CLP session instead of parsing the
+        terminal output. Values of integer types are returned as int, of DOUBLE, REAL and
+        FLOAT as float, all other values (DECIMAL and DECFLOAT included, to keep their precision)
+        as strings and NULL as null. Not supported with targets or all_databases.
+    required: false
+    default: text
+    choices: ["text", "structured"]
+
+  max_rows:
+    description:
+      - Maximum number of rows returned with result_format C(structured) and per result set with
+        engine C(ibm_db). With engine C(ibm_db), fetching stops after max_rows rows and the result
+        of the command has C(truncated) true if the result set has more rows. 0 returns all rows.
+    required: false
+    default: 0
+
+  row_offset:
+    description:
+      - Number of rows skipped with result_format C(structured). Together with max_rows the
+        result of a large query can be read in chunks. The query is wrapped in
+        C(SELECT * FROM (query) FETCH FIRST n ROWS ONLY) to fetch only the required rows, except
+        for queries starting with WITH or containing ORDER BY, FETCH, OFFSET or LIMIT. Their
+        rows are exported completely and max_rows and row_offset are applied while parsing.
+    required: false
+    default: 0
+
+  profile:
+    description:
+      - Add C(profile) to the result with elapsed time, count and output bytes of all
+        subprocesses by phase (db2ls, db2ilist, db2_clp, ...), peak RSS and the calibrated
+        cost of sourcing db2profile and of the CLP startup of the instance. CLP calls with
+        stream_output are included in db2_clp. A detached job runs after the module returned,
+        only its start is profiled; the job status has its start and end time.
+    required: false
+    default: false
+
+  resume:
+    description:
+      - Execute file statement by statement in one CLP session and record the progress (statement
+        index and hash) in a state file next to the logfile (<logfile>.state, or <file>.state without
+        logfile). The session stops at the first statement with a non-ignorable sqlcode, a rerun
+        continues with this statement. It replays the CONNECT and SET statements (SET SCHEMA,
+        SET CURRENT ...) of the statements which completed before and skips the others. The state
+        file is removed after the whole file completed. Statements are split on the terminator ';'
+        or the terminator set with --#SET TERMINATOR.
+    required: false
+    default: false
+
+  deploy:
+    description:
+      - Directory or manifest (YAML or JSON) of SQL files to deploy. In a directory, *.sql files
+        are ordered in stages by their numeric name prefix (e. g. 010_, 020_), each file depends
+        on all files of the previous stage. A manifest lists C(files) with keys C(file) (relative
+        to the manifest) and C(depends_on) (list of files). Independent files run concurrently
+        in up to max_workers CLP sessions, timeout applies per file. Files depending on a failed
+        file (non-ignorable sqlcodes) are skipped. Returns status, elapsed time and sqlcodes per
+        file and the critical path. With logfile, the output of each file is written to
+        <logfile>.<index>.<file name>, index is the position of the file in the directory or manifest.
+    required: false
+
+  ledger:
+    description:
+      - Record the content hash of each successfully executed command, commands list or file
+        (with deploy, each file) in a ledger per instance and database. A command or file whose
+        hash is in the ledger is not executed again and returns changed false, a changed content
+        or another target executes it. The commands list is one unit, because statements can
+        depend on each other in the session.
+    required: false
+    default: false
+
+  ledger_dir:
+    description:
+      - Directory of the ledger files (<instance>_<database>.json).
+    required: false
+    default: /var/tmp/db2_command_ledger
+
   ignorable_sqlcodes:
     description:
       - comma seperated list of sqlcodes to ignore. E. g.: SQL0601N,SQL0579N to ignore sql601 and sql579 errors.
+        Only error sqlcodes (N, C) are checked, warnings (W) never fail the command.
     required: false
   
     
@@ -90,42 +256,275 @@ EXAMPLES = '''
     database: SAMPLE
     file: "/tmp/my_sql_to_create_storagegroups.sql"
     logfile: "/tmp/output.log"
+
+- db2_command:
+    instance: db2inst1
+    database: SAMPLE
+    commands:
+      - "CREATE TABLE T1 (ID INT)"
+      - "CREATE TABLE T2 (ID INT)"
+      - "RUNSTATS ON TABLE DB2INST1.T1"
+    ignorable_sqlcodes: "SQL0601N"
+
+- db2_command:
+    instance: db2inst1
+    database: SAMPLE
+    engine: ibm_db
+    command: "SELECT TABSCHEMA, TABNAME FROM SYSCAT.TABLES"
+    fetch_size: 5000
+
+- db2_command:
+    all_databases: true
+    command: "SELECT count(*) FROM SYSCAT.TABLES"
+    max_workers: 16
+    timeout: 300
+
+- db2_command:
+    instance: db2inst1
+    database: SAMPLE
+    file: "/tmp/migration.sql"
+    logfile: "/tmp/migration.log"
+    stream_output: true
+    output_lines: 50
+
+- db2_command:
+    instance: db2inst1
+    database: SAMPLE
+    file: "/tmp/migration.sql"
+    logfile: "/tmp/migration.log"
+    ignorable_sqlcodes: "SQL0601N"
+    resume: true
+
+- db2_command:
+    instance: db2inst1
+    database: SAMPLE
+    command: "SELECT TABSCHEMA, TABNAME, CARD FROM SYSCAT.TABLES ORDER BY CARD DESC"
+    result_format: structured
+    max_rows: 500
+    row_offset: 0
+
+- db2_command:
+    instance: db2inst1
+    database: SAMPLE
+    command: "REORG TABLE APP.ORDERS"
+    detach: true
+  register: reorg
+
+- db2_command:
+    job_id: "{{ reorg.job_id }}"
+  register: reorg_status
+  until: reorg_status.status not in ['starting', 'running']
+  retries: 360
+  delay: 10
+
+# Schema deployment: /opt/app/sql/010_tables.sql, 010_sequences.sql, 020_views.sql, ...
+# Files applied in a previous run and not changed since are skipped.
+- db2_command:
+    instance: db2inst1
+    database: SAMPLE
+    deploy: /opt/app/sql
+    ignorable_sqlcodes: "SQL0601N,SQL0204N"
+    max_workers: 4
+    ledger: true
 '''
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.six.moves import queue, shlex_quote
+from ansible.module_utils.db2_common import (DB2_SESSION_MARKER, MAX_COMMAND_ARGUMENT_BYTES, Db2Profiler, build_db2_session_script,
+                                             create_thread_pool, exec_db2_session, get_db2_database_targets, import_optional, map_concurrently,
+                                             write_temp_file)
+from collections import deque
+import fcntl
+import hashlib
+import json
 import os
-import pwd
 import re
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+
+# Optional python modules, imported on first use: ibm_db by engine ibm_db, yaml by deploy manifests
+ibm_db = None
 
 #
 # Parse SQLCodes from Db2 CLP Output
 #
-def __get_sqlcodes_from_db2_output(output):
-  # Build dict with sql codes and counts. E. g.: {'0': 3, '-601': 14}
-  sqlcodes = {}
+# SQL0601N  The name of the object to be created is identical to the existing
+# name "DB2INST1.T1" of type "TABLE".  SQLSTATE=42710
+#
+SQLCODE_PATTERN = re.compile(r"^SQL(\d+)([NWCI])\s+(.*)$", re.I)
+SQLSTATE_PATTERN = re.compile(r"SQLSTATE=(\w{5})")
+SQLCODE_SEVERITIES = {'N': 'error', 'C': 'critical', 'W': 'warning', 'I': 'info'}
+MAX_SQLCODE_RECORDS = 1000
 
-  for line in output.splitlines(): 
-    # SQL0601N  The name of the object to be created is identical to the existing
-    # Extract sqlcode with regex
-    match = re.match( r"^(SQL\d+N) .*$", line, re.I)
+#
+# Single pass parser for CLP output, fed line by line
+#
+# sqlcodes: dict with counts of error sqlcodes (N, C). E. g.: {'SQL0601N': 14}
+# records: list of dicts with statement index, sqlcode, severity, sqlstate and message
+#          of every SQL message (at most max_records)
+#
+# The statement index is derived from the statement echo of 'db2 -v' only: given
+# the statements sent to the CLP (e.g. of an SQL file), a line which starts the
+# next statement is its echo. Without statements, all records belong to statement 1.
+#
+STATEMENT_COMMENT_PATTERN = re.compile(r"--.*$|/\*.*?(\*/|$)")
+
+class Db2OutputParser(object):
+
+  def __init__(self, max_records=MAX_SQLCODE_RECORDS, statements=None):
+    self.sqlcodes = {}
+    self.records = []
+    self.record_count = 0
+    self.statement = 0
+    self.max_records = max_records
+    self._record = None
+    self._statements = iter(statements) if statements is not None else None
+    self._next_terminator = None
+    self._next_statement = self._get_next_statement()
+
+  def feed(self, line):
+    if not line.strip():
+      self._record = None
+      return
+
+    match = SQLCODE_PATTERN.match(line)
     if match:
-      sqlcode = match.group(1)
-      if sqlcode in sqlcodes:
-        sqlcodes[sqlcode] += 1
+      self._add_record(match)
+    elif self._record is not None:
+      # Continuation of message
+      if self._record['sqlstate'] is None:
+        self._record['message'] += " " + line.strip()
+        self._set_sqlstate(line)
+    elif self._next_statement and self._is_echo(line):
+      self.statement += 1
+      self._next_statement = self._get_next_statement()
+
+  def feed_output(self, output):
+    for line in output.splitlines():
+      self.feed(line)
+    return self
+
+  @staticmethod
+  def _normalize(text):
+    # Comments removed, whitespace collapsed
+    return " ".join(STATEMENT_COMMENT_PATTERN.sub(" ", text).split())
+
+  def _get_next_statement(self):
+    if self._statements is None:
+      return None
+    for statement in self._statements:
+      self._next_terminator = None
+      if isinstance(statement, tuple):
+        statement, self._next_terminator = statement # (statement, terminator) of __split_sql_file
+      statement = self._normalize(statement)
+      if statement:
+        return statement
+    return None
+
+  def _is_echo(self, line):
+    # Echo of a statement may span lines, its first line is a prefix of whole words.
+    # The echo of a single statement may end with its terminator.
+    echo = self._normalize(line)
+    if self._next_terminator and echo.endswith(self._next_terminator):
+      echo = echo[:-len(self._next_terminator)].rstrip()
+    if not echo or not self._next_statement.startswith(echo):
+      return False
+    return len(echo) == len(self._next_statement) or self._next_statement[len(echo)] == " "
+
+  def _add_record(self, match):
+    number, severity, message = match.groups()
+    severity = severity.upper()
+    sqlcode = "SQL%s%s" % (number, severity)
+
+    if self.statement == 0:
+      self.statement = 1
+
+    if severity in ('N', 'C'):
+      self.sqlcodes[sqlcode] = self.sqlcodes.get(sqlcode, 0) + 1
+
+    self.record_count += 1
+    self._record = {
+      'statement': self.statement,
+      'sqlcode': sqlcode,
+      'code': -int(number) if severity in ('N', 'C') else int(number),
+      'severity': SQLCODE_SEVERITIES[severity],
+      'sqlstate': None,
+      'message': message.strip()
+    }
+
+    if len(self.records) < self.max_records:
+      self.records.append(self._record)
+
+    self._set_sqlstate(message)
+
+  def _set_sqlstate(self, line):
+    match = SQLSTATE_PATTERN.search(line)
+    if match:
+      self._record['sqlstate'] = match.group(1)
+      self._record = None
+
+def __get_sqlcodes_from_db2_output(output):
+  # Build dict with sql codes and counts. E. g.: {'SQL0601N': 14}
+  return Db2OutputParser().feed_output(output).sqlcodes
+
+#
+# Check SQLCodes against ignorable SQLCodes
+#
+# Returns rc 0 if all found sqlcodes are ignorable, otherwise 100
+#
+def __check_ignorable_sqlcodes(sqlcodes, ignorable_sqlcodes):
+    rc = 0
+    for sqlcode in sqlcodes:
+      if sqlcode in ignorable_sqlcodes or sqlcode == '0':
+        continue
       else:
-        sqlcodes[sqlcode] = 1 # Found sqlcode the first time
-  
-  return sqlcodes
+        rc = 100
 
+    return rc
+
+
+#
+# Profiling
+#
+# Db2Profiler of db2_common, set in main() with profile: true
+#
+PROFILER = None
+
+#
+# Measure db2profile and CLP startup of an instance once
+#
+# Two additional subprocesses, only executed with profile: true. They are recorded
+# in the calibration phase, not in db2_clp. The time of the db2_clp phase minus these
+# costs per CLP call is the time spent in SQL.
+#
+def __calibrate_profile(module, instance_name):
+    start = time.time()
+    PROFILER.run_command(["/bin/sh", "-c", "LANG=C PATH=/bin:/usr/bin . ~%s/sqllib/db2profile" % instance_name])
+    db2profile_elapsed = time.time() - start
+
+    start = time.time()
+    PROFILER.run_command(["/bin/sh", "-c", "LANG=C PATH=/bin:/usr/bin . ~%s/sqllib/db2profile; db2 terminate > /dev/null" % instance_name])
+    clp_elapsed = time.time() - start
+
+    PROFILER.add('calibration', db2profile_elapsed)
+    PROFILER.add('calibration', clp_elapsed)
+
+    return {'db2profile': round(db2profile_elapsed, 6), 'clp_startup': round(max(clp_elapsed - db2profile_elapsed, 0), 6)}
 
 #
 # Execute command local
 #
 # Using db2 command line interface on the host to execute command
 #
-def __exec_db2_commmand_local(module, instance_name, database_name, command_or_file, logfile=None, ignorable_sqlcodes=None):
+def __build_db2_command_line(instance_name, database_name, command_or_file, timeout=0):
     # build db2 command line call
     db2_command=[]
+    if timeout:
+      db2_command.append("timeout %s" % timeout)
     db2_command.append("/bin/sh -c \"")
     db2_command.append("LANG=C PATH=/bin:/usr/bin . ~%s/sqllib/db2profile;" % instance_name)
     
@@ -138,75 +537,1376 @@ def __exec_db2_commmand_local(module, instance_name, database_name, command_or_f
       db2_command.append("db2 -tx \\\"%s;\\\"" % command_or_file)
 
     db2_command.append("\"")
-    db2_command = " ".join(db2_command)
+    return " ".join(db2_command)
+
+def __get_db2_output_parser(command_or_file):
+    # Statements of a file are echoed by 'db2 -v', they give the statement index of the records
+    if os.path.isfile(command_or_file):
+      return Db2OutputParser(statements=__iter_sql_statements(command_or_file))
+    return Db2OutputParser()
+
+def __exec_db2_commmand_local(module, instance_name, database_name, command_or_file, logfile=None, ignorable_sqlcodes=None, timeout=0, stream_output=False, output_lines=100):
+    db2_command = __build_db2_command_line(instance_name, database_name, command_or_file, timeout)
+
+    if stream_output:
+      # Execute db2 command now, output is written to logfile and parsed while it arrives
+      rc, out, err, parser = __run_db2_command_streaming(module, db2_command, logfile, output_lines, __get_db2_output_parser(command_or_file))
+    else:
+      # Execute db2 command now
+      rc, out, err = module.run_command(db2_command) 
+
+      # Write to Logfile
+      if logfile:
+        try:
+          with open(logfile, "w") as f:
+            f.write(out)
+            f.close()
+        except Exception as e:
+          module.warn("Logfile could not be written. Error:" + str(e))
+        
+      # Check for SQLCodes
+      parser = __get_db2_output_parser(command_or_file).feed_output(out)
+
+    sqlcodes = parser.sqlcodes
+
+    # rc 124: killed by timeout
+    if ignorable_sqlcodes and not (timeout and rc == 124):
+      # Check identified sqlcodes against ignorable_sqlcodes  
+      rc = __check_ignorable_sqlcodes(sqlcodes, ignorable_sqlcodes)
+      
+      if rc > 0:
+        err = out
+        out = "Found following SQLCODES: %s. Please see STDERR for details." % sqlcodes    
+
+    return (rc, out, err, db2_command, parser)
+
+#
+# Run db2 command and stream its output
+#
+# Memory usage is bounded by output_lines: only the head and the tail of the
+# output are kept, every line is written to the logfile and checked for sqlcodes
+# as soon as it is read.
+#
+def __run_db2_command_streaming(module, db2_command, logfile=None, output_lines=100, parser=None):
+    head = []
+    tail = deque(maxlen=output_lines)
+    line_count = 0
+    parser = parser or Db2OutputParser()
+
+    log = None
+    if logfile:
+      try:
+        log = open(logfile, "w")
+      except Exception as e:
+        module.warn("Logfile could not be written. Error:" + str(e))
+
+    start = time.time()
+    output_bytes = 0
+    process = subprocess.Popen(shlex.split(db2_command), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    try:
+      for line in iter(process.stdout.readline, b''):
+        output_bytes += len(line)
+        line = to_text(line, errors='surrogate_or_strict').rstrip('\n')
+        line_count += 1
+
+        if log:
+          log.write(line + "\n")
+
+        parser.feed(line)
+
+        if len(head) < output_lines:
+          head.append(line)
+        else:
+          tail.append(line)
+    finally:
+      process.stdout.close()
+      rc = process.wait()
+      if log:
+        log.close()
+      if PROFILER:
+        PROFILER.add(PROFILER.classify(db2_command), time.time() - start, output_bytes)
+
+    out = head
+    omitted_lines = line_count - len(head) - len(tail)
+    if omitted_lines > 0:
+      out = out + ["... %s lines omitted ..." % omitted_lines]
+    out = "\n".join(out + list(tail))
+
+    return (rc, out, '', parser)
 
-    # Execute db2 command now
-    rc, out, err = module.run_command(db2_command) 
+#
+# Execute list of commands local in one CLP session
+#
+# exec_db2_session of db2_common runs the commands in one shell, so they share one
+# CLP back-end process (db2bp) and therefore one attachment/connection. The
+# output of each command is checked for sqlcodes here. Returns the results per
+# command, output and error of the shell and the generated script.
+#
+def __exec_db2_commands_local(module, instance_name, database_name, commands, logfile=None, ignorable_sqlcodes=None, timeout=0, stop_on_error=False, terminator=';'):
+    rc, out, err, session_results = exec_db2_session(module, instance_name, commands, database_name, timeout, stop_on_error, terminator)
+    script = build_db2_session_script(instance_name, commands, database_name, stop_on_error, terminator)
 
     # Write to Logfile
     if logfile:
       try:
         with open(logfile, "w") as f:
           f.write(out)
-          f.close()
       except Exception as e:
         module.warn("Logfile could not be written. Error:" + str(e))
-        
-    # Check for SQLCodes
-    sqlcodes = __get_sqlcodes_from_db2_output(out)
 
-    if ignorable_sqlcodes:
-      # Check identified sqlcodes against ignorable_sqlcodes  
-      rc = 0
-      for sqlcode in sqlcodes:
-        if sqlcode in ignorable_sqlcodes or sqlcode == '0':
+    # Commands after the last marker line were not executed
+    executed = len([line for line in out.splitlines() if line.startswith(DB2_SESSION_MARKER)])
+
+    results = []
+    for command, (db2_rc, command_stdout) in zip(commands, session_results):
+      if len(results) >= executed:
+        results.append({
+          'command': command,
+          'rc': db2_rc,
+          'stdout': command_stdout,
+          'sqlcodes': {},
+          'executed': False
+        })
+        continue
+
+      command_rc = db2_rc
+      command_parser = Db2OutputParser().feed_output(command_stdout)
+      command_sqlcodes = command_parser.sqlcodes
+
+      # A failure without sqlcode keeps the rc of db2
+      if ignorable_sqlcodes and command_sqlcodes:
+        command_rc = __check_ignorable_sqlcodes(command_sqlcodes, ignorable_sqlcodes)
+
+      results.append({
+        'command': command,
+        'rc': command_rc,
+        'db2_rc': db2_rc,
+        'stdout': command_stdout,
+        'sqlcodes': command_sqlcodes,
+        'sqlcode_records': command_parser.records
+      })
+
+    return (results, out, err, script)
+
+#
+# Split SQL file into statements
+#
+# Statements are separated by the terminator outside of quotes, -- and /* */ comments.
+# The CLP directive --#SET TERMINATOR changes the terminator for the following
+# statements. Yields (statement, terminator), __split_sql_file returns the list.
+#
+TERMINATOR_DIRECTIVE_PATTERN = re.compile(r"^\s*--#SET\s+TERMINATOR\s+(\S+)", re.I)
+
+def __iter_sql_statements(path, terminator=';'):
+    statement = []
+    quote = None
+    comment = False
+
+    with open(path) as f:
+      for line in f:
+        directive = TERMINATOR_DIRECTIVE_PATTERN.match(line)
+        if directive and quote is None and not comment:
+          terminator = directive.group(1)
           continue
-        else:     
-          rc = 100
-      
-      if rc > 0:
-        err = out
-        out = "Found following SQLCODES: %s. Please see STDERR for details." % sqlcodes    
 
-    return (rc, out, err, db2_command)
+        i = 0
+        while i < len(line):
+          char = line[i]
+          if comment:
+            # Block comment, replaced by a blank
+            end = line.find('*/', i)
+            if end < 0:
+              break
+            comment = False
+            statement.append(" ")
+            i = end + 2
+            continue
+          if quote:
+            if char == quote:
+              quote = None
+          elif char in ("'", '"'):
+            quote = char
+          elif line.startswith('--', i):
+            break # Rest of line is a comment
+          elif line.startswith('/*', i):
+            comment = True
+            i += 2
+            continue
+          elif line.startswith(terminator, i):
+            text = "".join(statement).strip()
+            if text:
+              yield (text, terminator)
+            statement = []
+            i += len(terminator)
+            continue
+          statement.append(char)
+          i += 1
+
+        # End of line removed with a comment
+        if not statement or statement[-1] != "\n":
+          statement.append("\n")
+
+    text = "".join(statement).strip()
+    if text:
+      yield (text, terminator)
+
+def __split_sql_file(path, terminator=';'):
+    return list(__iter_sql_statements(path, terminator))
+
+#
+# Execute SQL file statement by statement with checkpoints
+#
+# All statements run in one persistent CLP session: a shell reads one db2 call
+# per statement from its stdin, all calls share the CLP back-end process, so
+# CONNECT, SET SCHEMA, SET CURRENT ... stay in effect for the following
+# statements. After each call a marker line with the return code is echoed, the
+# next statement is only sent after the output of the previous one was checked.
+# The session stops at the first statement with a non-ignorable error.
+#
+# Progress (index and sha1 hash of each completed statement) is recorded in a
+# state file next to the logfile. A statement completed when its 'db2 -v' echo
+# was parsed and it returned no error, or only ignorable sqlcodes. A rerun
+# replays the session statements (CONNECT, SET ...) of the completed statements
+# and skips the others, as long as the file did not change up to that point.
+# The state file is removed after the whole file completed.
+#
+SESSION_STATEMENT_PATTERN = re.compile(r"^\s*(CONNECT\s+TO|SET\s+(SCHEMA|CURRENT|CURRENT_SCHEMA|CURRENT_PATH|PATH|SQLID|ISOLATION|ENCRYPTION\s+PASSWORD)\b)", re.I)
+
+def __get_resume_state_file(file, logfile):
+    return "%s.state" % (logfile or file)
+
+def __load_resume_state(state_file):
+    try:
+      with open(state_file) as f:
+        return json.load(f).get('completed', [])
+    except (IOError, OSError, ValueError):
+      return []
+
+def __save_resume_state(module, state_file, file, completed):
+    try:
+      with open(state_file + ".tmp", "w") as f:
+        json.dump({'file': os.path.abspath(file), 'completed': completed}, f)
+      os.rename(state_file + ".tmp", state_file)
+    except (IOError, OSError) as e:
+      module.warn("State file %s could not be written. Error: %s" % (state_file, str(e)))
+
+def __statement_succeeded(result, ignorable_sqlcodes):
+    if result.get('executed') is False:
+      return False
+    if result['db2_rc'] < 4:
+      return True
+    # Error, check if all sqlcodes are ignorable
+    return bool(ignorable_sqlcodes) and bool(result['sqlcodes']) and __check_ignorable_sqlcodes(result['sqlcodes'], ignorable_sqlcodes) == 0
+
+def __build_db2_session_prologue(instance_name, database_name):
+    prologue = ["LANG=C PATH=/bin:/usr/bin . ~%s/sqllib/db2profile" % instance_name]
+    if database_name:
+      prologue.append("export DB2DBDFT=%s" % database_name)
+    return prologue
+
+def __start_db2_session(instance_name, database_name, timeout=0):
+    shell_command = ["/bin/sh"]
+    if timeout:
+      shell_command = ["timeout", str(timeout)] + shell_command
+
+    process = subprocess.Popen(shell_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    __send_to_db2_session(process, __build_db2_session_prologue(instance_name, database_name))
+    return process
+
+def __send_to_db2_session(process, lines):
+    try:
+      process.stdin.write(to_bytes("\n".join(lines) + "\n"))
+      process.stdin.flush()
+      return True
+    except (IOError, OSError):
+      # Shell terminated, e. g. timeout
+      return False
+
+def __exec_db2_session_statement(process, statement, terminator):
+    # Returns rc of the db2 call (None if the session terminated before) and its output lines
+    db2_options = "-tvx" if terminator == ';' else "-td%s -vx" % terminator
+
+    statement_file = None
+    if len(to_bytes(statement)) > MAX_COMMAND_ARGUMENT_BYTES:
+      statement_file = write_temp_file('db2_statement_', '.sql', "%s%s\n" % (statement, terminator))
+      db2_call = "db2 %s -f %s" % (db2_options, shlex_quote(statement_file))
+    else:
+      db2_call = "db2 %s %s" % (db2_options, shlex_quote("%s%s" % (statement, terminator)))
+
+    try:
+      lines = []
+      if not __send_to_db2_session(process, ["%s < /dev/null" % db2_call, "echo \"%s $?\"" % DB2_SESSION_MARKER]):
+        return None, lines
+
+      for line in iter(process.stdout.readline, b''):
+        line = to_text(line, errors='surrogate_or_strict').rstrip('\n')
+        if DB2_SESSION_MARKER in line:
+          # Output without line break at its end is followed by the marker
+          output, marker = line.split(DB2_SESSION_MARKER, 1)
+          if output:
+            lines.append(output)
+          return int(marker.split()[0]), lines
+        lines.append(line)
+
+      return None, lines
+    finally:
+      if statement_file:
+        os.remove(statement_file)
+
+def __stop_db2_session(process):
+    __send_to_db2_session(process, ["db2 terminate > /dev/null", "exit"])
+    try:
+      process.stdin.close()
+    except (IOError, OSError):
+      pass
+    process.stdout.read()
+    process.stdout.close()
+    return process.wait()
+
+def __exec_db2_file_resumable(module, instance_name, database_name, file, logfile=None, ignorable_sqlcodes=None, timeout=0):
+    statements = __split_sql_file(file)
+    hashes = [hashlib.sha1(to_bytes(statement)).hexdigest() for statement, terminator in statements]
+
+    state_file = __get_resume_state_file(file, logfile)
+    completed = __load_resume_state(state_file)
+
+    # Skip statements which completed in a previous run and did not change
+    start = 0
+    while start < len(completed) and start < len(statements) and completed[start] == {'index': start, 'hash': hashes[start]}:
+      start += 1
+    completed = completed[:start]
+    skipped = start
+
+    log = None
+    if logfile:
+      try:
+        log = open(logfile, "a" if skipped else "w")
+      except Exception as e:
+        module.warn("Logfile could not be written. Error:" + str(e))
+
+    # Session statements of the skipped part first, then the remaining statements
+    replayed = [index for index in range(skipped) if SESSION_STATEMENT_PATTERN.match(statements[index][0])]
+    executions = [(index, True) for index in replayed] + [(index, False) for index in range(skipped, len(statements))]
+
+    sqlcodes = {}
+    failed = None
+    executed = 0
+    session_start = time.time()
+    process = __start_db2_session(instance_name, database_name, timeout)
+    try:
+      for index, replay in executions:
+        statement, terminator = statements[index]
+        db2_rc, lines = __exec_db2_session_statement(process, statement, terminator)
+
+        if log:
+          log.write("".join([line + "\n" for line in lines]))
+          log.flush()
+
+        parser = Db2OutputParser(statements=[(statement, terminator)])
+        for line in lines:
+          parser.feed(line)
+
+        result = {'command': statement, 'rc': db2_rc, 'db2_rc': db2_rc, 'stdout': "\n".join(lines),
+                  'sqlcodes': parser.sqlcodes, 'sqlcode_records': parser.records}
+        if db2_rc is None or parser.statement == 0:
+          # Session terminated (e. g. timeout) or statement not echoed, it was not executed
+          result.update(rc=db2_rc if db2_rc else 8, executed=False)
+        elif ignorable_sqlcodes and db2_rc >= 4 and __statement_succeeded(result, ignorable_sqlcodes):
+          result['rc'] = 0
+
+        if not replay:
+          for sqlcode, count in parser.sqlcodes.items():
+            sqlcodes[sqlcode] = sqlcodes.get(sqlcode, 0) + count
+          if result.get('executed') is not False:
+            executed += 1
+
+        if not __statement_succeeded(result, ignorable_sqlcodes):
+          failed = dict(result, index=index, replayed=replay)
+          break
+
+        if not replay:
+          completed.append({'index': index, 'hash': hashes[index]})
+          __save_resume_state(module, state_file, file, completed)
+    finally:
+      __stop_db2_session(process)
+      if log:
+        log.close()
+      if PROFILER:
+        PROFILER.add('db2_clp', time.time() - session_start)
+
+    if failed is None and os.path.isfile(state_file):
+      os.remove(state_file)
+
+    return {
+      'statements_total': len(statements),
+      'statements_skipped': skipped,
+      'statements_replayed': len(replayed),
+      'statements_executed': executed,
+      'failed_statement': failed,
+      'sqlcodes': sqlcodes,
+      'state_file': state_file
+    }
+
+#
+# Detached jobs
+#
+# A detached job runs the db2 command in a daemonized process which outlives the
+# module. Output is written to <job_dir>/<job_id>.log while it arrives, the state
+# file <job_dir>/<job_id>.json holds status, pid, heartbeat, line count, sqlcodes
+# and finally rc. The state file is rewritten at least every JOB_HEARTBEAT_INTERVAL
+# seconds, so a job whose heartbeat stops while status is starting or running was
+# lost.
+#
+JOB_HEARTBEAT_INTERVAL = 10
+
+def __get_job_paths(job_dir, job_id):
+    return (os.path.join(job_dir, "%s.json" % job_id), os.path.join(job_dir, "%s.log" % job_id))
+
+def __write_job_state(state_file, state):
+    with open(state_file + ".tmp", "w") as f:
+      json.dump(state, f)
+    os.rename(state_file + ".tmp", state_file)
+
+def __run_db2_job(db2_command, state_file, logfile, state, ignorable_sqlcodes=None, parser=None):
+    parser = parser or Db2OutputParser()
+    lock = threading.Lock()
+    finished = threading.Event()
+
+    def write_state():
+      with lock:
+        state['heartbeat'] = time.time()
+        state['lines'] = line_count[0]
+        state['sqlcodes'] = parser.sqlcodes
+        state['sqlcode_records'] = parser.records
+        __write_job_state(state_file, state)
+
+    def heartbeat():
+      while not finished.wait(JOB_HEARTBEAT_INTERVAL):
+        write_state()
+
+    line_count = [0]
+    process = subprocess.Popen(shlex.split(db2_command), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    state['status'] = 'running'
+    state['pid'] = os.getpid()
+    write_state()
+
+    heartbeat_thread = threading.Thread(target=heartbeat)
+    heartbeat_thread.daemon = True
+    heartbeat_thread.start()
+
+    with open(logfile, "w") as log:
+      for line in iter(process.stdout.readline, b''):
+        line = to_text(line, errors='surrogate_or_strict').rstrip('\n')
+        log.write(line + "\n")
+        log.flush()
+        with lock:
+          line_count[0] += 1
+          parser.feed(line)
+
+    rc = process.wait()
+    if ignorable_sqlcodes and parser.sqlcodes:
+      rc = __check_ignorable_sqlcodes(parser.sqlcodes, ignorable_sqlcodes)
+
+    finished.set()
+    heartbeat_thread.join()
+    state['status'] = 'finished' if rc == 0 else 'failed'
+    state['rc'] = rc
+    state['end'] = time.time()
+    write_state()
+
+def __start_db2_job(module, instance_name, database_name, command_or_file, job_dir, ignorable_sqlcodes=None, timeout=0):
+    db2_command = __build_db2_command_line(instance_name, database_name, command_or_file, timeout)
+    job_id = "%s_%s_%s_%s" % (instance_name, database_name or 'nodb', time.strftime('%Y%m%d%H%M%S'), os.getpid())
+    state_file, logfile = __get_job_paths(job_dir, job_id)
+
+    if not os.path.isdir(job_dir):
+      os.makedirs(job_dir)
+
+    state = {'job_id': job_id, 'cmd': db2_command, 'status': 'starting', 'start': time.time(), 'logfile': logfile}
+    __write_job_state(state_file, state)
+
+    # Double fork, the job must not be a child of the module process
+    pid = os.fork()
+    if pid > 0:
+      os.waitpid(pid, 0)
+      return job_id, state_file, logfile, db2_command
+
+    os.setsid()
+    if os.fork() > 0:
+      os._exit(0)
+
+    # Detach from the stdin/stdout/stderr of the module
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+      os.dup2(devnull, fd)
+
+    try:
+      __run_db2_job(db2_command, state_file, logfile, state, ignorable_sqlcodes, __get_db2_output_parser(command_or_file))
+    except Exception as e:
+      state.update(status='failed', rc=255, msg=str(e), end=time.time())
+      __write_job_state(state_file, state)
+    os._exit(0)
+
+def __get_db2_job_status(module, job_dir, job_id, output_lines=100):
+    state_file, logfile = __get_job_paths(job_dir, job_id)
+
+    try:
+      with open(state_file) as f:
+        state = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+      module.fail_json(msg="Job %s not found in %s: %s" % (job_id, job_dir, str(e)))
+      return
+
+    if state['status'] in ('starting', 'running'):
+      # A starting job has no pid and heartbeat yet, its start time is the last sign of life
+      try:
+        if 'pid' in state:
+          os.kill(state['pid'], 0)
+      except OSError:
+        state['status'] = 'lost' # Process of job is gone
+      else:
+        if time.time() - state.get('heartbeat', state['start']) > 3 * JOB_HEARTBEAT_INTERVAL:
+          state['status'] = 'lost'
+
+    # Tail of the output
+    tail = deque(maxlen=output_lines)
+    if os.path.isfile(logfile):
+      with open(logfile) as f:
+        for line in f:
+          tail.append(line.rstrip('\n'))
+    state['stdout'] = "\n".join(tail)
+
+    return state
+
+#
+# Execute query with structured result
+#
+# The column names are read with DESCRIBE, the rows are exported in DEL format
+# to a temporary file and parsed from there, so no CLP terminal output is scraped.
+# Both commands run in one CLP session. Values are converted by the SQL type of
+# their column in the DESCRIBE output: integer types to int, floating point types
+# to float, all others are kept as strings. DECIMAL and DECFLOAT stay strings, a
+# float would lose precision. Unquoted empty values are NULL.
+#
+#  $ db2 describe select tabschema, card from syscat.tables
+#  448   VARCHAR                 128  TABSCHEMA                                 9
+#  493   BIGINT                    8  CARD                                      4
+#
+DESCRIBE_COLUMN_PATTERN = re.compile(r"^\s*(\d+)\s+(.+?)\s+(\d+(?:,\s*\d+)?)\s+(\S.*?)\s+(\d+)\s*$")
+INTEGER_SQL_TYPES = ('SMALLINT', 'INTEGER', 'INT', 'BIGINT')
+FLOAT_SQL_TYPES = ('REAL', 'DOUBLE', 'FLOAT')
+
+# Queries that cannot be nested in a FETCH FIRST subselect (common table expressions,
+# own row limits) or whose order would be lost by the nesting
+UNWRAPPABLE_QUERY_PATTERN = re.compile(r"^\s*WITH\b|\bORDER\s+BY\b|\bFETCH\s+(FIRST|NEXT)\b|\bOFFSET\b|\bLIMIT\b", re.I)
+
+def __parse_describe_columns(out):
+    # Returns list of (column name, SQL type)
+    columns = []
+    for line in out.splitlines():
+      match = DESCRIBE_COLUMN_PATTERN.match(line)
+      if match:
+        columns.append((match.group(4), match.group(2).split()[0].upper()))
+
+    return columns
+
+def __convert_del_value(value, quoted, sql_type=None):
+    if value == '' and not quoted:
+      return None
+    try:
+      if sql_type in INTEGER_SQL_TYPES:
+        return int(value)
+      if sql_type in FLOAT_SQL_TYPES:
+        return float(value)
+    except ValueError:
+      pass
+    return value
+
+def __parse_del_rows(lines, sql_types=None):
+    # Yields rows as list of values, quoted strings may contain newlines
+    sql_types = sql_types or []
+
+    def convert(value, quoted, index):
+      return __convert_del_value(value, quoted, sql_types[index] if index < len(sql_types) else None)
+
+    fields = []
+    field = []
+    quoted = False
+    in_quotes = False
+
+    for line in lines:
+      i = 0
+      while i < len(line):
+        char = line[i]
+        if in_quotes:
+          if char == '"':
+            if line[i + 1:i + 2] == '"':
+              field.append('"') # Escaped quote
+              i += 1
+            else:
+              in_quotes = False
+          else:
+            field.append(char)
+        elif char == '"':
+          in_quotes = quoted = True
+        elif char == ',':
+          fields.append(convert("".join(field), quoted, len(fields)))
+          field = []
+          quoted = False
+        elif char == '\n':
+          fields.append(convert("".join(field), quoted, len(fields)))
+          yield fields
+          fields = []
+          field = []
+          quoted = False
+        else:
+          field.append(char)
+        i += 1
+
+    if field or fields:
+      fields.append(convert("".join(field), quoted, len(fields)))
+      yield fields
+
+def __exec_db2_query_structured(module, instance_name, database_name, query, max_rows=0, row_offset=0, timeout=0):
+    if max_rows and not UNWRAPPABLE_QUERY_PATTERN.search(query):
+      # Fetch only the required rows
+      query = "SELECT * FROM (%s) AS T FETCH FIRST %s ROWS ONLY" % (query, max_rows + row_offset)
+
+    fd, export_file = tempfile.mkstemp(prefix='db2_command_', suffix='.del')
+    os.close(fd)
+    try:
+      commands = ["DESCRIBE %s" % query, "EXPORT TO %s OF DEL MODIFIED BY DATESISO STRIPLZEROS %s" % (export_file, query)]
+      results, out, err, script = __exec_db2_commands_local(module, instance_name, database_name, commands, timeout=timeout)
+
+      for result in results:
+        if result['db2_rc'] >= 4 or result.get('executed') is False:
+          return {'rc': result['db2_rc'], 'stdout': result['stdout'], 'stderr': err, 'command': result['command']}
+
+      columns = []
+      sql_types = []
+      for column, sql_type in __parse_describe_columns(results[0]['stdout']):
+        columns.append(column)
+        sql_types.append(sql_type)
+
+      rows = []
+      with open(export_file) as f:
+        for index, values in enumerate(__parse_del_rows(f, sql_types)):
+          if index < row_offset:
+            continue
+          if max_rows and len(rows) >= max_rows:
+            break
+          rows.append(dict(zip(columns, values)))
+    finally:
+      os.remove(export_file)
+
+    return {'rc': 0, 'columns': columns, 'rows': rows, 'row_count': len(rows), 'command': query}
+
+#
+# Execute commands with ibm_db python module
+#
+# Connections are reused per instance and database within one module run, so
+# the commands of a task share one connection. All connections are closed at the
+# end of the run, they are not kept across tasks.
+#
+DB2_CONNECTIONS = {}
+
+def __get_ibm_db_connection(instance_name, database_name):
+    key = (instance_name, database_name)
+
+    if key not in DB2_CONNECTIONS:
+      # Local connection with implicit authentication of the current user. The
+      # instance is read from DB2INSTANCE when connecting, the environment of the
+      # module is restored afterwards.
+      previous_instance = os.environ.get('DB2INSTANCE')
+      os.environ['DB2INSTANCE'] = instance_name
+      try:
+        DB2_CONNECTIONS[key] = ibm_db.connect(database_name, '', '')
+      finally:
+        if previous_instance is None:
+          os.environ.pop('DB2INSTANCE', None)
+        else:
+          os.environ['DB2INSTANCE'] = previous_instance
+
+    return DB2_CONNECTIONS[key]
+
+def __close_ibm_db_connections():
+    for key in list(DB2_CONNECTIONS.keys()):
+      try:
+        ibm_db.close(DB2_CONNECTIONS.pop(key))
+      except Exception:
+        pass
+
+def __fetch_ibm_db_chunks(stmt, fetch_size, max_rows=0):
+    # Yield rows of result set in chunks of fetch_size rows, at most max_rows rows (0: all)
+    chunk = []
+    fetched = 0
+    while not max_rows or fetched < max_rows:
+      row = ibm_db.fetch_assoc(stmt)
+      if not row:
+        break
+      chunk.append(row)
+      fetched += 1
+      if len(chunk) >= fetch_size:
+        yield chunk
+        chunk = []
+
+    if chunk:
+      yield chunk
+
+def __exec_db2_command_ibm_db(module, instance_name, database_name, commands, fetch_size=1000, ignorable_sqlcodes=None, max_rows=0, logfile=None):
+    global ibm_db
+    ibm_db = import_optional('ibm_db')
+    if ibm_db is None:
+      module.fail_json(msg="ibm_db python module is required for engine ibm_db")
+      return
+
+    if not database_name:
+      module.fail_json(msg="engine ibm_db requires a database")
+      return
+
+    try:
+      conn = __get_ibm_db_connection(instance_name, database_name)
+    except Exception as e:
+      module.fail_json(msg="Connect to database %s of instance %s failed: %s" % (database_name, instance_name, str(e)))
+      return
+
+    # With logfile, result sets are written chunk by chunk and not returned
+    log = None
+    if logfile:
+      try:
+        log = open(logfile, "w")
+      except IOError as e:
+        module.fail_json(msg="Could not write logfile %s: %s" % (logfile, str(e)))
+        return
+
+    results = []
+    for index, command in enumerate(commands):
+      result = {'command': command, 'rc': 0, 'sqlcodes': {}}
+
+      try:
+        stmt = ibm_db.exec_immediate(conn, command)
+
+        if ibm_db.num_fields(stmt) > 0:
+          # Statement returns a result set
+          rows = []
+          row_count = 0
+          for chunk in __fetch_ibm_db_chunks(stmt, fetch_size, max_rows):
+            row_count += len(chunk)
+            if log:
+              log.write("".join([json.dumps({'command': index, 'row': row}, default=str) + "\n" for row in chunk]))
+            else:
+              rows.extend(chunk)
+          if log:
+            result['logfile'] = logfile
+          else:
+            result['rows'] = rows
+          result['row_count'] = row_count
+          if max_rows and row_count == max_rows:
+            result['truncated'] = bool(ibm_db.fetch_assoc(stmt))
+        else:
+          result['row_count'] = ibm_db.num_rows(stmt)
+
+        ibm_db.free_result(stmt)
+      except Exception:
+        # SQL0204N  "DB2INST1.T1" is an undefined name.  SQLSTATE=42704 SQLCODE=-204
+        error = ibm_db.stmt_errormsg() or ibm_db.conn_errormsg()
+        result['stdout'] = error
+        result['sqlcodes'] = __get_sqlcodes_from_db2_output(re.sub(r".*\] ?", "", error))
+        result['rc'] = 4
+
+        # An error without sqlcode is never ignorable
+        if ignorable_sqlcodes and result['sqlcodes']:
+          result['rc'] = __check_ignorable_sqlcodes(result['sqlcodes'], ignorable_sqlcodes)
+
+      results.append(result)
+
+    if log:
+      log.close()
+
+    return results
+
+#
+# Execute command, file or commands against many targets concurrently
+#
+def __exec_db2_target(module, target, command, file, commands, logfile, ignorable_sqlcodes, timeout, stream_output, output_lines):
+    instance_name = target['instance']
+    database_name = target.get('database')
+
+    # One logfile per target
+    if logfile:
+      logfile = "%s.%s_%s" % (logfile, instance_name, database_name)
+
+    start = time.time()
+    result = {'instance': instance_name, 'database': database_name}
+    try:
+      if commands:
+        results, out, err, generated_command = __exec_db2_commands_local(module, instance_name, database_name, commands, logfile, ignorable_sqlcodes, timeout)
+        result['results'] = results
+        result['rc'] = max([r['rc'] for r in results])
+      else:
+        rc, out, err, generated_command, parser = __exec_db2_commmand_local(module, instance_name, database_name, command or file, logfile, ignorable_sqlcodes, timeout, stream_output, output_lines)
+        result['rc'] = rc
+        result['sqlcode_records'] = parser.records
+
+      result['stdout'] = out
+      result['stderr'] = err
+      result['cmd'] = generated_command
+      if timeout and result['rc'] == 124:
+        result['msg'] = "Timeout after %s seconds" % timeout
+    except Exception as e:
+      result['rc'] = 255
+      result['msg'] = str(e)
+
+    result['elapsed'] = round(time.time() - start, 3)
+    return result
+
+def __exec_db2_targets(module, targets, command, file, commands, logfile, ignorable_sqlcodes, max_workers, timeout, stream_output=False, output_lines=100):
+    # Results keep the order of the targets
+    return map_concurrently(__exec_db2_target, [(module, target, command, file, commands, logfile, ignorable_sqlcodes, timeout, stream_output, output_lines)
+                                                for target in targets], max_workers)
+
+#
+# Execution ledger
+#
+# Content hashes of successfully executed commands, command lists and files, one
+# ledger file per instance and database:
+#
+#   {"<sha1>": {"type": "file", "name": "/tmp/migration.sql", "applied": 1500000000.0}}
+#
+# A command or file whose hash is in the ledger of the target is skipped. Runs
+# against the same target merge their entries under an exclusive lock of
+# <ledger file>.lock, the ledger file itself is replaced by rename.
+#
+def __get_ledger_file(ledger_dir, instance_name, database_name):
+    return os.path.join(ledger_dir, "%s_%s.json" % (instance_name, (database_name or '').upper()))
+
+def __get_ledger_entry(command_or_file):
+    if isinstance(command_or_file, list):
+      content_hash = hashlib.sha1(to_bytes("commands:" + "\n".join([command.strip() for command in command_or_file]))).hexdigest()
+      return content_hash, {'type': 'commands', 'name': command_or_file[0] if command_or_file else ''}
+
+    # Same decision as __build_db2_command_line: an existing path is executed as file
+    if os.path.isfile(command_or_file):
+      content_hash = hashlib.sha1(b"file:")
+      with open(command_or_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+          content_hash.update(chunk)
+      return content_hash.hexdigest(), {'type': 'file', 'name': command_or_file}
+
+    return hashlib.sha1(to_bytes("command:" + command_or_file.strip())).hexdigest(), {'type': 'command', 'name': command_or_file}
+
+def __load_ledger(ledger_file):
+    try:
+      with open(ledger_file) as f:
+        return json.load(f)
+    except (IOError, OSError, ValueError):
+      return {}
+
+def __save_ledger(module, ledger_file, entries):
+    if not entries:
+      return
+
+    try:
+      ledger_dir = os.path.dirname(ledger_file)
+      if not os.path.isdir(ledger_dir):
+        os.makedirs(ledger_dir)
+
+      with open(ledger_file + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        # Merge with entries written by other runs in the meantime
+        ledger = __load_ledger(ledger_file)
+        applied = time.time()
+        for content_hash, entry in entries.items():
+          ledger[content_hash] = dict(entry, applied=applied)
+
+        fd, tmp_file = tempfile.mkstemp(dir=ledger_dir, prefix='.db2_command_ledger_')
+        with os.fdopen(fd, 'w') as f:
+          json.dump(ledger, f)
+        os.rename(tmp_file, ledger_file)
+    except (IOError, OSError) as e:
+      module.warn("Ledger %s could not be written. Error: %s" % (ledger_file, str(e)))
+
+#
+# Deploy many SQL files
+#
+# The files come from a directory or from a manifest. In a directory, *.sql files
+# are grouped into stages by their numeric name prefix (010_tables.sql and
+# 010_sequences.sql form stage 010) and each file depends on all files of the
+# previous stage. Files without prefix are a stage of their own. A manifest
+# declares the dependencies of each file:
+#
+#   files:
+#     - file: tables.sql
+#     - file: views.sql
+#       depends_on: [tables.sql]
+#
+# Every file runs in its own CLP session (db2 -vtxf), up to max_workers files at
+# the same time. A file starts as soon as all files it depends on succeeded; if a
+# file fails, all files which depend on it directly or indirectly are skipped.
+#
+DEPLOY_STAGE_PATTERN = re.compile(r"^(\d+)")
+
+def __get_deploy_files_from_directory(path):
+    names = sorted([name for name in os.listdir(path) if name.endswith('.sql') and os.path.isfile(os.path.join(path, name))])
+
+    stages = []
+    for name in names:
+      match = DEPLOY_STAGE_PATTERN.match(name)
+      stage = match.group(1) if match else name
+      if stages and stages[-1][0] == stage:
+        stages[-1][1].append(name)
+      else:
+        stages.append((stage, [name]))
+
+    deploy_files = []
+    previous_stage_names = []
+    for stage, stage_names in stages:
+      for name in stage_names:
+        deploy_files.append({'name': name, 'file': os.path.join(path, name), 'depends_on': list(previous_stage_names)})
+      previous_stage_names = stage_names
+
+    return deploy_files
+
+def __get_deploy_files_from_manifest(path):
+    with open(path) as f:
+      content = f.read()
+
+    yaml = import_optional('yaml')
+    manifest = yaml.safe_load(content) if yaml else json.loads(content)
+    entries = manifest.get('files', []) if isinstance(manifest, dict) else manifest
+    if not isinstance(entries, list):
+      raise ValueError("manifest %s must contain a list of files" % path)
+
+    deploy_files = []
+    for entry in entries:
+      if not isinstance(entry, dict):
+        entry = {'file': entry}
+      if not entry.get('file'):
+        raise ValueError("each manifest entry must have key file: %s" % entry)
+
+      depends_on = entry.get('depends_on') or []
+      if not isinstance(depends_on, list):
+        depends_on = [depends_on]
+
+      deploy_files.append({'name': entry['file'], 'file': os.path.join(os.path.dirname(os.path.abspath(path)), entry['file']), 'depends_on': depends_on})
+
+    return deploy_files
+
+# Raises ValueError for missing files, duplicates, unknown dependencies and cycles
+def __check_deploy_files(deploy_files):
+    names = [deploy_file['name'] for deploy_file in deploy_files]
+
+    for deploy_file in deploy_files:
+      if names.count(deploy_file['name']) > 1:
+        raise ValueError("file %s is listed more than once" % deploy_file['name'])
+      if not os.path.isfile(deploy_file['file']):
+        raise ValueError("file %s does not exist" % deploy_file['file'])
+      for dependency in deploy_file['depends_on']:
+        if dependency not in names:
+          raise ValueError("file %s depends on unknown file %s" % (deploy_file['name'], dependency))
+
+    # Kahn: all files can be ordered if there is no cycle
+    waiting = dict((deploy_file['name'], len(deploy_file['depends_on'])) for deploy_file in deploy_files)
+    ready = [name for name in names if waiting[name] == 0]
+    ordered = 0
+    while ready:
+      name = ready.pop()
+      ordered += 1
+      for deploy_file in deploy_files:
+        if name in deploy_file['depends_on']:
+          waiting[deploy_file['name']] -= 1
+          if waiting[deploy_file['name']] == 0:
+            ready.append(deploy_file['name'])
+
+    if ordered < len(deploy_files):
+      raise ValueError("dependency cycle between files %s" % sorted([name for name in names if waiting[name] > 0]))
+
+def __deploy_file(module, instance_name, database_name, deploy_file, logfile, ignorable_sqlcodes, timeout, stream_output, output_lines, deploy_start):
+    result = {'name': deploy_file['name'], 'started': round(time.time() - deploy_start, 3)}
+    start = time.time()
+    try:
+      rc, out, err, generated_command, parser = __exec_db2_commmand_local(module, instance_name, database_name, deploy_file['file'],
+                                                                         logfile, ignorable_sqlcodes, timeout, stream_output, output_lines)
+      result.update(rc=rc, sqlcodes=parser.sqlcodes, status='succeeded' if rc == 0 else 'failed')
+      if rc != 0:
+        result.update(stdout=out, stderr=err, cmd=generated_command)
+      if timeout and rc == 124:
+        result['msg'] = "Timeout after %s seconds" % timeout
+    except Exception as e:
+      result.update(rc=255, status='failed', msg=str(e))
+
+    result['elapsed'] = round(time.time() - start, 3)
+    return result
+
+def __deploy_files(module, instance_name, database_name, deploy_files, logfile, ignorable_sqlcodes, max_workers, timeout, stream_output, output_lines, unchanged_files=None):
+    results = dict((deploy_file['name'], {'name': deploy_file['name'], 'depends_on': deploy_file['depends_on'], 'status': 'pending'}) for deploy_file in deploy_files)
+    deploy_files_by_name = dict((deploy_file['name'], deploy_file) for deploy_file in deploy_files)
+    deploy_indexes = dict((deploy_file['name'], index) for index, deploy_file in enumerate(deploy_files))
+    dependents = dict((deploy_file['name'], []) for deploy_file in deploy_files)
+    waiting = {}
+    for deploy_file in deploy_files:
+      waiting[deploy_file['name']] = len(deploy_file['depends_on'])
+      for dependency in deploy_file['depends_on']:
+        dependents[dependency].append(deploy_file['name'])
+
+    ready = [deploy_file['name'] for deploy_file in deploy_files if waiting[deploy_file['name']] == 0]
+    finished = queue.Queue()
+    running = 0
+    deploy_start = time.time()
+
+    # Files already applied (ledger) count as succeeded without running
+    def is_unchanged(name):
+      return bool(unchanged_files) and name in unchanged_files
+
+    pool = create_thread_pool(max(1, min(max_workers, len(deploy_files))))
+    try:
+      while ready or running:
+        while ready:
+          name = ready.pop(0)
+          if is_unchanged(name):
+            results[name].update(status='unchanged', rc=0, elapsed=0)
+            for dependent in dependents[name]:
+              waiting[dependent] -= 1
+              if waiting[dependent] == 0 and results[dependent]['status'] == 'pending':
+                ready.append(dependent)
+            continue
+
+          results[name]['status'] = 'running'
+          file_logfile = "%s.%03d.%s" % (logfile, deploy_indexes[name], os.path.basename(name)) if logfile else None
+          pool.apply_async(__deploy_file, (module, instance_name, database_name, deploy_files_by_name[name], file_logfile, ignorable_sqlcodes,
+                                           timeout, stream_output, output_lines, deploy_start), callback=finished.put)
+          running += 1
+
+        if not running:
+          continue
+
+        result = finished.get()
+        running -= 1
+        results[result['name']].update(result)
+
+        if result['status'] == 'succeeded':
+          for dependent in dependents[result['name']]:
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0 and results[dependent]['status'] == 'pending':
+              ready.append(dependent)
+        else:
+          # Skip everything downstream of the failed file
+          downstream = list(dependents[result['name']])
+          while downstream:
+            dependent = downstream.pop()
+            if results[dependent]['status'] == 'pending':
+              results[dependent].update(status='skipped', msg="upstream file %s failed" % result['name'])
+              downstream.extend(dependents[dependent])
+    finally:
+      pool.close()
+      pool.join()
+
+    return [results[deploy_file['name']] for deploy_file in deploy_files], round(time.time() - deploy_start, 3)
+
+#
+# Critical path: the chain of dependent files with the longest total elapsed time
+#
+def __get_deploy_critical_path(deploy_files, results):
+    elapsed = dict((result['name'], result.get('elapsed', 0)) for result in results)
+    path_elapsed = {}
+    path_previous = {}
+
+    remaining = list(deploy_files)
+    while remaining:
+      for deploy_file in list(remaining):
+        if all([dependency in path_elapsed for dependency in deploy_file['depends_on']]):
+          previous = max(deploy_file['depends_on'], key=lambda dependency: path_elapsed[dependency]) if deploy_file['depends_on'] else None
+          path_elapsed[deploy_file['name']] = elapsed[deploy_file['name']] + (path_elapsed[previous] if previous else 0)
+          path_previous[deploy_file['name']] = previous
+          remaining.remove(deploy_file)
+
+    if not path_elapsed:
+      return [], 0
+
+    name = max(path_elapsed, key=lambda name: path_elapsed[name])
+    critical_path_elapsed = path_elapsed[name]
+    critical_path = []
+    while name:
+      critical_path.insert(0, name)
+      name = path_previous[name]
+
+    return critical_path, round(critical_path_elapsed, 3)
 
 def main():
     module = AnsibleModule(
         argument_spec = dict(
-            instance = dict(required=True, type='str'),
+            instance = dict(required=False, type='str', default=None),
             database = dict(required=False, type='str', default=None),
             command = dict(required=False, type='str', default=None),
             file = dict(required=False, type='str', default=None),
+            commands = dict(required=False, type='list', default=None),
             logfile = dict(required=False, type='str', default=None),
-            ignorable_sqlcodes = dict(required=False, type='str', default=None)
-        )
+            ignorable_sqlcodes = dict(required=False, type='str', default=None),
+            engine = dict(required=False, choices=['clp', 'ibm_db'], default='clp'),
+            fetch_size = dict(required=False, type='int', default=1000),
+            targets = dict(required=False, type='list', default=None),
+            all_databases = dict(required=False, type='bool', default=False),
+            max_workers = dict(required=False, type='int', default=8),
+            timeout = dict(required=False, type='int', default=0),
+            stream_output = dict(required=False, type='bool', default=False),
+            output_lines = dict(required=False, type='int', default=100),
+            resume = dict(required=False, type='bool', default=False),
+            detach = dict(required=False, type='bool', default=False),
+            job_id = dict(required=False, type='str', default=None),
+            job_dir = dict(required=False, type='path', default='/var/tmp/db2_command_jobs'),
+            result_format = dict(required=False, choices=['text', 'structured'], default='text'),
+            max_rows = dict(required=False, type='int', default=0),
+            row_offset = dict(required=False, type='int', default=0),
+            deploy = dict(required=False, type='path', default=None),
+            ledger = dict(required=False, type='bool', default=False),
+            ledger_dir = dict(required=False, type='path', default='/var/tmp/db2_command_ledger'),
+            profile = dict(required=False, type='bool', default=False)
+        ),
+        mutually_exclusive = [['command', 'file', 'commands', 'deploy'], ['instance', 'targets', 'all_databases']]
     )
 
+    global PROFILER
+    if module.params['profile']:
+      PROFILER = Db2Profiler()
+      PROFILER.enable(module)
+
     instance_name = module.params['instance']
     database_name = module.params['database']
     command = module.params['command']
     file = module.params['file']
+    commands = module.params['commands']
     logfile = module.params['logfile']
     ignorable_sqlcodes = None
     if module.params['ignorable_sqlcodes']:
       ignorable_sqlcodes = module.params['ignorable_sqlcodes'].split(',')
+    engine = module.params['engine']
+    fetch_size = module.params['fetch_size']
+    targets = module.params['targets']
+    all_databases = module.params['all_databases']
+    max_workers = module.params['max_workers']
+    timeout = module.params['timeout']
+    stream_output = module.params['stream_output']
+    output_lines = module.params['output_lines']
+    resume = module.params['resume']
+    detach = module.params['detach']
+    job_id = module.params['job_id']
+    job_dir = module.params['job_dir']
+    result_format = module.params['result_format']
+    max_rows = module.params['max_rows']
+    row_offset = module.params['row_offset']
+    deploy = module.params['deploy']
+    ledger = module.params['ledger']
+    ledger_file = None
+
+    if output_lines < 0:
+      module.fail_json(msg="output_lines must be 0 or greater")
+      return
+
+    # Status of detached job
+    if job_id:
+      state = __get_db2_job_status(module, job_dir, job_id, output_lines)
+      if state['status'] in ('failed', 'lost'):
+        msg = "JOB %s %s" % (job_id, state['status'].upper())
+        if 'msg' in state:
+          msg += ": %s" % state.pop('msg')
+        module.fail_json(msg=msg, changed=False, **state)
+        return
+
+      module.exit_json(changed=False, **state)
+      return
+
+    if not (instance_name or targets or all_databases):
+      module.fail_json(msg="must specify instance, targets or all_databases")
+      return
+
+    if result_format == 'structured' and (targets or all_databases):
+      module.fail_json(msg="result_format structured is supported for a single instance only, not with targets or all_databases")
+      return
+
+    if ledger:
+      if targets or all_databases or engine != 'clp' or resume or detach or result_format == 'structured':
+        module.fail_json(msg="ledger is supported for command, file, commands and deploy with engine clp and a single instance only")
+        return
+      ledger_file = __get_ledger_file(module.params['ledger_dir'], instance_name, database_name)
+
+    if PROFILER and instance_name:
+      PROFILER.calibration = __calibrate_profile(module, instance_name)
+
+    # Start detached job
+    if detach:
+      if not (command or file) or engine != 'clp' or targets or all_databases:
+        module.fail_json(msg="detach is supported for command or file with engine clp and a single instance only")
+        return
+
+      job_id, state_file, job_logfile, generated_command = __start_db2_job(module, instance_name, database_name, command or file, job_dir, ignorable_sqlcodes, timeout)
+      module.exit_json(changed=True, job_id=job_id, state_file=state_file, logfile=job_logfile, msg="STARTED DB2 JOB: %s" % generated_command)
+      return
+
+    # Deploy directory or manifest of SQL files
+    if deploy:
+      if engine != 'clp' or targets or all_databases:
+        module.fail_json(msg="deploy is supported with engine clp and a single instance only")
+        return
+
+      try:
+        if os.path.isdir(deploy):
+          deploy_files = __get_deploy_files_from_directory(deploy)
+        else:
+          deploy_files = __get_deploy_files_from_manifest(deploy)
+        __check_deploy_files(deploy_files)
+      except (IOError, OSError, ValueError) as e:
+        module.fail_json(msg="INVALID DEPLOYMENT %s: %s" % (deploy, str(e)))
+        return
+
+      ledger_entries = {}
+      unchanged_files = set()
+      if ledger:
+        applied = __load_ledger(ledger_file)
+        for deploy_file in deploy_files:
+          content_hash, entry = __get_ledger_entry(deploy_file['file'])
+          ledger_entries[deploy_file['name']] = (content_hash, entry)
+          if content_hash in applied:
+            unchanged_files.add(deploy_file['name'])
+
+      results, elapsed = __deploy_files(module, instance_name, database_name, deploy_files, logfile, ignorable_sqlcodes, max_workers, timeout, stream_output, output_lines, unchanged_files)
+
+      if ledger:
+        __save_ledger(module, ledger_file, dict([ledger_entries[result['name']] for result in results if result['status'] == 'succeeded']))
+      critical_path, critical_path_elapsed = __get_deploy_critical_path(deploy_files, results)
+      summary = dict(elapsed=elapsed, files_elapsed=round(sum([result.get('elapsed', 0) for result in results]), 3),
+                     critical_path=critical_path, critical_path_elapsed=critical_path_elapsed)
+
+      failed_files = [result['name'] for result in results if result['status'] == 'failed']
+      skipped_files = [result['name'] for result in results if result['status'] == 'skipped']
+      has_changed = any([result['status'] == 'succeeded' for result in results])
+
+      if failed_files:
+        module.fail_json(msg="DEPLOYMENT FAILED FOR FILES: %s, SKIPPED FILES: %s" % (failed_files, skipped_files), changed=has_changed, rc=100, results=results, **summary)
+        return
+
+      module.exit_json(changed=has_changed, rc=0, results=results, msg="DEPLOYED %s FILES" % len(results), **summary)
+      return
+
+    # Execute against many targets concurrently
+    if targets or all_databases:
+      if engine != 'clp':
+        module.fail_json(msg="targets and all_databases are supported with engine clp only")
+        return
+
+      if not (command or file or commands):
+        module.fail_json(msg="must specify command, file or commands")
+        return
+
+      if all_databases:
+        targets = get_db2_database_targets(module, max_workers)
+
+      for target in targets:
+        if not isinstance(target, dict) or 'instance' not in target:
+          module.fail_json(msg="each target must be a dict with keys instance and database: %s" % target)
+          return
+
+      target_results = __exec_db2_targets(module, targets, command, file, commands, logfile, ignorable_sqlcodes, max_workers, timeout, stream_output, output_lines)
+      failed_targets = ["%s/%s" % (r['instance'], r['database']) for r in target_results if r['rc'] != 0]
+
+      if failed_targets:
+        module.fail_json(msg="DB2 COMMAND FAILED FOR TARGETS: %s" % failed_targets, rc=100, target_results=target_results)
+        return
+
+      module.exit_json(changed=True, rc=0, target_results=target_results, msg="DB2 COMMAND EXECUTED FOR %s TARGETS" % len(target_results))
+      return
+
+    # Execute commands with ibm_db
+    if engine == 'ibm_db':
+      if file or not (command or commands):
+        module.fail_json(msg="engine ibm_db supports command and commands only")
+        return
+
+      try:
+        results = __exec_db2_command_ibm_db(module, instance_name, database_name, commands or [command], fetch_size, ignorable_sqlcodes, max_rows, logfile)
+      finally:
+        __close_ibm_db_connections()
+      failed_commands = [result['command'] for result in results if result['rc'] != 0]
+
+      if failed_commands:
+        module.fail_json(msg="IBM_DB COMMANDS FAILED: %s" % failed_commands, rc=100, results=results)
+        return
+
+      module.exit_json(changed=True, rc=0, results=results, msg="IBM_DB COMMANDS: %s" % (commands or [command]))
+      return
+
+    # Execute file with checkpoints
+    if resume:
+      if not file or engine != 'clp' or targets or all_databases:
+        module.fail_json(msg="resume is supported for file with engine clp and a single instance only")
+        return
+
+      result = __exec_db2_file_resumable(module, instance_name, database_name, file, logfile, ignorable_sqlcodes, timeout)
+
+      if result['failed_statement']:
+        module.fail_json(msg="STATEMENT %s OF FILE %s FAILED. Rerun to resume with this statement." % (result['failed_statement']['index'] + 1, file), rc=100, **result)
+        return
+
+      module.exit_json(changed=result['statements_executed'] > 0, rc=0, msg="EXECUTED %s OF %s STATEMENTS OF FILE %s" % (result['statements_executed'], result['statements_total'], file), **result)
+      return
+
+    # Command, commands or file applied before
+    ledger_hash = None
+    if ledger and (command or file or commands):
+      ledger_hash, ledger_entry = __get_ledger_entry(commands or command or file)
+      if ledger_hash in __load_ledger(ledger_file):
+        module.exit_json(changed=False, rc=0, stdout='', skipped=True, ledger_file=ledger_file, content_hash=ledger_hash,
+                         msg="ALREADY APPLIED: %s" % (commands or command or file))
+        return
+
+    # Execute commands in one session
+    if commands:
+      results, out, err, generated_script = __exec_db2_commands_local(module, instance_name, database_name, commands, logfile, ignorable_sqlcodes)
+      failed_commands = [result['command'] for result in results if result['rc'] != 0]
+
+      if failed_commands:
+        module.fail_json(msg="DB2 SESSION COMMANDS FAILED: %s" % failed_commands, rc=100, stdout=out, stderr=err, results=results)
+        return
+
+      if ledger_hash:
+        __save_ledger(module, ledger_file, {ledger_hash: ledger_entry})
+
+      module.exit_json(changed=True, rc=0, stdout=out, results=results, msg="GENERATED DB2 SESSION: %s" % generated_script)
+      return
+
+    # Execute query with structured result
+    if result_format == 'structured' and engine == 'clp':
+      if not command:
+        module.fail_json(msg="result_format structured requires command")
+        return
+
+      result = __exec_db2_query_structured(module, instance_name, database_name, command, max_rows, row_offset, timeout)
+      if result['rc'] != 0:
+        module.fail_json(msg="GENERATED DB2 COMMAND FAILED: %s" % result.pop('command'), **result)
+        return
+
+      module.exit_json(changed=False, msg="GENERATED DB2 QUERY: %s" % result.pop('command'), **result)
+      return
 
     # Execute command
     if command:
-      rc, out, err, generated_command = __exec_db2_commmand_local(module, instance_name, database_name, command, logfile, ignorable_sqlcodes)
+      rc, out, err, generated_command, parser = __exec_db2_commmand_local(module, instance_name, database_name, command, logfile, ignorable_sqlcodes, timeout, stream_output, output_lines)
     elif file:
-      rc, out, err, generated_command = __exec_db2_commmand_local(module, instance_name, database_name, file, logfile, ignorable_sqlcodes)
+      rc, out, err, generated_command, parser = __exec_db2_commmand_local(module, instance_name, database_name, file, logfile, ignorable_sqlcodes, timeout, stream_output, output_lines)
     else:
-      module.fail_json(msg="must specify command or file")
+      module.fail_json(msg="must specify command, file or commands")
       return
+    sqlcode_records = parser.records
         
     if rc == 0:
         has_changed=True
+        if ledger_hash:
+          __save_ledger(module, ledger_file, {ledger_hash: ledger_entry})
     else:
-        module.fail_json(msg="GENERATED DB2 COMMAND FAILED: %s" % generated_command, rc=rc, stdout=out, stderr=err)
+        module.fail_json(msg="GENERATED DB2 COMMAND FAILED: %s" % generated_command, rc=rc, stdout=out, stderr=err, sqlcode_records=sqlcode_records)
         return
     
-    module.exit_json(changed=has_changed, rc=rc, stdout=out, msg="GENERATED DB2 COMMAND: %s" % (generated_command))
+    module.exit_json(changed=has_changed, rc=rc, stdout=out, sqlcode_records=sqlcode_records, msg="GENERATED DB2 COMMAND: %s" % (generated_command))
 
 def init():
     if __name__ == '__main__':
@@ -0,0 +1,215 @@
+#!/usr/bin/python
+
+from __future__ import (absolute_import, division)
+__metaclass__ = type
+
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+
+DOCUMENTATION = '''
+---
+module: db2_database_cfg
+version_added: 2.4
+short_description: Configure Db2 databases (DB CFG)
+description:
+  - Read the DB CFG of one or many databases, compare it with the given configurations
+    and apply all differences of a database in one CLP session.
+options:
+  instance:
+    description:
+      - name of the Db2 instance. Required unless targets is used.
+    required: false
+
+  database:
+    description:
+      - name of the Db2 database. Required unless targets is used.
+    required: false
+
+  targets:
+    description:
+      - list of targets with keys C(instance) and C(database). All targets are
+        configured concurrently.
+    required: false
+
+  configurations:
+    description:
+      - list of DB CFG parameters with keys C(name), C(value) and optional C(automatic)
+    required: true
+
+  max_workers:
+    description:
+      - Maximum number of databases configured concurrently.
+    required: false
+    default: 8
+
+author:
+  - ma44in
+'''
+
+EXAMPLES = '''
+# Note:
+# Basic database configuration example
+- db2_database_cfg:
+    instance: db2inst1
+    database: SAMPLE
+    configurations:
+      - name: LOGFILSIZ
+        value: 16384
+      - name: DBHEAP
+        value: 1200
+        automatic: true
+
+# Same configuration for many databases, configured concurrently
+- db2_database_cfg:
+    targets:
+      - instance: db2inst1
+        database: SAMPLE
+      - instance: db2inst2
+        database: SAMPLE
+    max_workers: 4
+    configurations:
+      - name: LOGFILSIZ
+        value: 16384
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.db2_common import exec_db2_session, map_concurrently, parse_cfg
+
+#
+# Build UPDATE DB CFG commands for all parameters which differ from the current configuration
+#
+def __get_update_db_cfg_commands(database_name, current_configurations, configurations):
+    updates = []
+
+    for target_configuration in configurations:
+        parameter = target_configuration['name'].upper()
+
+        if parameter not in current_configurations:
+            raise ValueError("Unknown DB CFG parameter %s" % parameter)
+
+        current_value = current_configurations[parameter]
+        target_value = target_configuration['value']
+        target_automatic_flag = target_configuration['automatic'] if 'automatic' in target_configuration else False
+
+        if target_automatic_flag is True:
+            if current_value != "AUTOMATIC(%s)" % target_value:
+                updates.append((parameter, "UPDATE DB CFG FOR %s USING %s %s AUTOMATIC" % (database_name, parameter, target_value)))
+        else:
+            if current_value != "%s" % target_value:
+                updates.append((parameter, "UPDATE DB CFG FOR %s USING %s %s" % (database_name, parameter, target_value)))
+
+    return updates
+
+#
+# Configure one database
+#
+# Reads the DB CFG in a first session. All updates and a final GET DB CFG to read
+# the resulting values are executed in a second session.
+#
+def __configure_database(module, instance_name, database_name, configurations):
+    result = {'instance': instance_name, 'database': database_name, 'changed': False, 'rc': 0, 'update_results': []}
+    get_db_cfg_command = "GET DB CFG FOR %s" % database_name
+
+    rc, out, err, results = exec_db2_session(module, instance_name, [get_db_cfg_command])
+    get_rc, get_out = results[0]
+    if get_rc != 0:
+        result.update(rc=get_rc, msg="FAILED COMMAND: %s" % get_db_cfg_command, stdout=get_out, stderr=err)
+        return result
+
+    current_configurations = parse_cfg(get_out)
+    try:
+        updates = __get_update_db_cfg_commands(database_name, current_configurations, configurations)
+    except ValueError as e:
+        result.update(rc=1, msg=str(e))
+        return result
+
+    if not updates:
+        return result
+
+    update_commands = [command for parameter, command in updates]
+    rc, out, err, results = exec_db2_session(module, instance_name, update_commands + [get_db_cfg_command])
+    updated_configurations = parse_cfg(results[-1][1]) if results[-1][0] == 0 else {}
+
+    for (parameter, command), (update_rc, update_out) in zip(updates, results):
+        result['update_results'].append({
+            'parameter': parameter,
+            'command': command,
+            'rc': update_rc,
+            'stdout': update_out,
+            'previous_value': current_configurations[parameter],
+            'value': updated_configurations.get(parameter)
+        })
+
+    failed_commands = [update['command'] for update in result['update_results'] if update['rc'] != 0]
+    if failed_commands:
+        result.update(rc=100, msg="FAILED COMMANDS: %s" % failed_commands, stderr=err)
+
+    result['changed'] = len(failed_commands) < len(updates)
+    return result
+
+def __configure_databases(module, targets, configurations, max_workers):
+    # Results keep the order of the targets
+    return map_concurrently(__configure_database, [(module, target['instance'], target['database'], configurations) for target in targets], max_workers)
+
+def main():
+    module = AnsibleModule(
+        argument_spec = dict(
+            instance = dict(required=False, type='str', default=None),
+            database = dict(required=False, type='str', default=None),
+            targets = dict(required=False, type='list', default=None),
+            configurations = dict(required=True, type='list'),
+            max_workers = dict(required=False, type='int', default=8)
+        ),
+        mutually_exclusive = [['instance', 'targets'], ['database', 'targets']],
+        required_together = [['instance', 'database']]
+    )
+
+    instance_name = module.params['instance']
+    database_name = module.params['database']
+    targets = module.params['targets']
+    configurations = module.params['configurations']
+    max_workers = module.params['max_workers']
+
+    if not targets:
+        if not instance_name:
+            module.fail_json(msg="must specify instance and database or targets")
+            return
+        targets = [{'instance': instance_name, 'database': database_name}]
+
+    for target in targets:
+        if not isinstance(target, dict) or 'instance' not in target or 'database' not in target:
+            module.fail_json(msg="each target must be a dict with keys instance and database: %s" % target)
+            return
+
+    results = __configure_databases(module, targets, configurations, max_workers)
+    has_changed = any([result['changed'] for result in results])
+    failed_targets = ["%s/%s" % (result['instance'], result['database']) for result in results if result['rc'] != 0]
+
+    if failed_targets:
+        module.fail_json(msg="DB CFG FAILED FOR TARGETS: %s" % failed_targets, changed=has_changed, results=results)
+        return
+
+    module.exit_json(changed=has_changed, results=results)
+
+def init():
+    if __name__ == '__main__':
+        return main()
+
+init()
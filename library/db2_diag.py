@@ -0,0 +1,487 @@
+#!/usr/bin/python
+
+from __future__ import (absolute_import, division)
+__metaclass__ = type
+
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+
+DOCUMENTATION = '''
+---
+module: db2_diag
+version_added: 2.4
+short_description: Read entries of db2diag.log of Db2 instances
+description:
+  - Locates the diagnostic path of each instance (DIAGPATH of the DBM CFG) and returns
+    the records of db2diag.log filtered by level, time window and SQLCODE.
+  - The log is read memory-mapped. The byte offset of the last complete record and a
+    sparse timestamp index are kept in a state file per instance, so a run only parses
+    the records written since the previous run, and a time window starts reading near
+    its first record instead of at the beginning of the log.
+options:
+  instance:
+    description:
+      - name of the Db2 instance. All local instances if not set.
+    required: false
+
+  diag_path:
+    description:
+      - directory of db2diag.log. Skips reading the DBM CFG. Only with instance.
+    required: false
+
+  levels:
+    description:
+      - record levels to return
+    required: false
+    default: ["Critical", "Severe", "Error"]
+    choices: ["Critical", "Severe", "Error", "Warning", "Event", "Info"]
+
+  since:
+    description:
+      - Return records written at or after this local time. Format YYYY-MM-DD-HH.MM.SS or
+        YYYY-MM-DD HH:MM:SS, a shorter prefix (e. g. YYYY-MM-DD) is allowed.
+    required: false
+
+  until:
+    description:
+      - Return records written before this local time. Same format as since.
+    required: false
+
+  sqlcodes:
+    description:
+      - Return only records which contain one of these sqlcodes, e. g. SQL0911N or -911.
+    required: false
+
+  incremental:
+    description:
+      - Only read records written since the previous run with the same state_dir. Without
+        since, the first run reads the whole log. With incremental false the log is read
+        from the start or, with since, from the indexed position before since.
+    required: false
+    default: true
+
+  max_entries:
+    description:
+      - Maximum number of records returned per instance. The most recent records are kept.
+    required: false
+    default: 100
+
+  state_dir:
+    description:
+      - directory of the state files with offset and timestamp index
+    required: false
+    default: /var/tmp/db2_diag
+
+  max_workers:
+    description:
+      - Maximum number of instances whose DIAGPATH is read concurrently.
+    required: false
+    default: 8
+
+author:
+  - ma44in
+'''
+
+EXAMPLES = '''
+# Note:
+# Errors written since the previous run of this task
+- db2_diag:
+    instance: db2inst1
+  register: diag
+
+# Triage after a failed command: records with a deadlock or timeout in the last hour
+- db2_diag:
+    instance: db2inst1
+    levels: ["Severe", "Error", "Warning"]
+    since: "{{ lookup('pipe', 'date -d \\"1 hour ago\\" +%Y-%m-%d-%H.%M.%S') }}"
+    sqlcodes:
+      - SQL0911N
+      - SQL0913N
+    incremental: false
+'''
+
+RETURN = '''
+entries:
+  description: matching records of all instances, ordered by instance and offset
+  returned: always
+  type: list
+  sample:
+    - instance: db2inst1
+      timestamp: "2017-07-13-15.28.23.123456+120"
+      record_id: I1234E567
+      level: Error
+      pid: "12345"
+      function: "DB2 UDB, lock manager, sqlplnfd, probe:10"
+      database: SAMPLE
+      message: "ZRC=0x80100002=-2146435070=SQLP_LTIMEOUT"
+      sqlcodes: [-911]
+      offset: 1048576
+      text: "2017-07-13-15.28.23.123456+120 I1234E567 LEVEL: Error ..."
+instances:
+  description: scan statistics per instance
+  returned: always
+  type: dict
+  sample:
+    db2inst1:
+      log_file: /home/db2inst1/sqllib/db2dump/DIAG0000/db2diag.log
+      start_offset: 1048576
+      end_offset: 1050112
+      scanned_bytes: 1536
+      records_scanned: 3
+      entries_matched: 1
+      level_counts: {Error: 1, Info: 2}
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.six.moves import shlex_quote
+from collections import deque
+from ansible.module_utils.db2_common import get_db2_instance_facts, map_concurrently
+import bisect
+import json
+import mmap
+import os
+import re
+import tempfile
+
+DB2DIAG_LOG = 'db2diag.log'
+
+# Index entry every INDEX_INTERVAL bytes of the log
+INDEX_INTERVAL = 1024 * 1024
+
+# Record text returned per entry
+MAX_RECORD_TEXT = 4096
+
+#
+# db2diag.log record
+#
+#   2017-07-13-15.28.23.123456+120 I1234E567          LEVEL: Error
+#   PID     : 12345                TID : 140000       PROC : db2sysc 0
+#   INSTANCE: db2inst1             NODE : 000          DB   : SAMPLE
+#   FUNCTION: DB2 UDB, lock manager, sqlplnfd, probe:10
+#   MESSAGE : ZRC=0x80100002=-2146435070=SQLP_LTIMEOUT
+#   DATA #1 : SQLCA, PD_DB2_TYPE_SQLCA, 136 bytes
+#    sqlcaid : SQLCA     sqlcabc: 136   sqlcode: -911   sqlerrml: 2
+#
+# Records start with the timestamp at the beginning of a line and end with an empty line.
+#
+RECORD_HEADER_PATTERN = re.compile(br"^(\d{4}-\d{2}-\d{2}-\d{2}\.\d{2}\.\d{2}\.\d+(?:[+-]\d+)?)\s+(\S+)\s+LEVEL:\s*(\w+)", re.M)
+PID_PATTERN = re.compile(br"^PID\s*:\s*(\d+)", re.M)
+DB_PATTERN = re.compile(br"\bDB\s*:\s*(\S+)")
+FUNCTION_PATTERN = re.compile(br"^FUNCTION:\s*(.*)$", re.M)
+MESSAGE_PATTERN = re.compile(br"^MESSAGE\s*:\s*(.*)$", re.M)
+SQLCODE_VALUE_PATTERN = re.compile(br"sqlcode\s*[:=]\s*(-?\d+)", re.I)
+SQLCODE_MESSAGE_PATTERN = re.compile(br"\bSQL(\d{4,5})([NWC])\b")
+DIAGPATH_RESOLVED_PATTERN = re.compile(r"^\s*Current member resolved DIAGPATH\s+= (.*)$")
+DIAGPATH_PATTERN = re.compile(r"^.*\(DIAGPATH\) = (.*)$")
+TIMESTAMP_PATTERN = re.compile(r"^(\d{4})-(\d{2})-(\d{2})(?:[- T](\d{2})[.:](\d{2})(?:[.:](\d{2}))?)?$")
+
+LEVELS = ['Critical', 'Severe', 'Error', 'Warning', 'Event', 'Info']
+
+#
+# Locate diagnostic path of an instance
+#
+#   $ db2 get dbm cfg
+#   Diagnostic data directory path               (DIAGPATH) = /home/db2inst1/sqllib/db2dump/ $m
+#   Current member resolved DIAGPATH                        = /home/db2inst1/sqllib/db2dump/DIAG0000/
+#
+# An empty DIAGPATH means the default ~instance/sqllib/db2dump.
+#
+def __get_diag_path(module, instance_name):
+    default_diag_path = os.path.join(os.path.expanduser('~%s' % instance_name), 'sqllib', 'db2dump')
+
+    script = "PATH=/bin:/usr/bin . ~%s/sqllib/db2profile; LANG=C db2 %s" % (instance_name, shlex_quote("GET DBM CFG"))
+    rc, out, err = module.run_command(["/bin/sh", "-c", script])
+    if rc != 0:
+        return default_diag_path
+
+    diag_path = None
+    for line in out.splitlines():
+        match = DIAGPATH_RESOLVED_PATTERN.match(line)
+        if match and match.group(1).strip():
+            return match.group(1).strip()
+
+        match = DIAGPATH_PATTERN.match(line)
+        if match and match.group(1).strip():
+            # $h, $n, $m: expanded by Db2 per host/member, use the resolved path or the default
+            value = match.group(1).strip().split()[0]
+            if '$' not in value:
+                diag_path = value
+
+    return diag_path or default_diag_path
+
+def __get_diag_paths(module, instances, max_workers):
+    return map_concurrently(__get_diag_path, [(module, instance_name) for instance_name in instances], max_workers)
+
+#
+# Filters
+#
+def __normalize_timestamp(module, value):
+    if not value:
+        return None
+
+    match = TIMESTAMP_PATTERN.match(value.strip())
+    if not match:
+        module.fail_json(msg="invalid timestamp %s, expected YYYY-MM-DD-HH.MM.SS or YYYY-MM-DD HH:MM:SS" % value)
+        return
+
+    # Record timestamps compare as strings: 2017-07-13-15.28.23
+    timestamp = "%s-%s-%s" % match.group(1, 2, 3)
+    if match.group(4):
+        timestamp += "-%s.%s.%s" % (match.group(4), match.group(5), match.group(6) or '00')
+    return timestamp
+
+# SQL0911N -> -911, SQL0100W -> 100, -911 -> -911
+def __normalize_sqlcode(module, value):
+    value = str(value).strip().upper()
+    match = re.match(r"^SQL(\d{4,5})([NWC])$", value)
+    if match:
+        return int(match.group(1)) * (1 if match.group(2) == 'W' else -1)
+
+    try:
+        return int(value)
+    except ValueError:
+        module.fail_json(msg="invalid sqlcode %s, expected e. g. SQL0911N or -911" % value)
+
+def __get_record_sqlcodes(record):
+    sqlcodes = set()
+    for match in SQLCODE_VALUE_PATTERN.finditer(record):
+        sqlcodes.add(int(match.group(1)))
+    for match in SQLCODE_MESSAGE_PATTERN.finditer(record):
+        sqlcodes.add(int(match.group(1)) * (1 if match.group(2) == b'W' else -1))
+    sqlcodes.discard(0)
+    return sorted(sqlcodes)
+
+def __get_record_entry(record, header, offset):
+    def search(pattern):
+        match = pattern.search(record)
+        return to_text(match.group(1).strip(), errors='surrogate_or_strict') if match else None
+
+    return {
+        'timestamp': to_text(header.group(1)),
+        'record_id': to_text(header.group(2)),
+        'level': to_text(header.group(3)),
+        'pid': search(PID_PATTERN),
+        'function': search(FUNCTION_PATTERN),
+        'database': search(DB_PATTERN),
+        'message': search(MESSAGE_PATTERN),
+        'sqlcodes': __get_record_sqlcodes(record),
+        'offset': offset,
+        'text': to_text(record[:MAX_RECORD_TEXT].rstrip(), errors='surrogate_or_strict')
+    }
+
+#
+# State per instance
+#
+# {
+#   "log_file": "/home/db2inst1/sqllib/db2dump/DIAG0000/db2diag.log",
+#   "inode": 1234, "offset": 1050112,
+#   "index": [["2017-07-13-15.28.23", 0], ["2017-07-13-16.01.02", 1048576]]
+# }
+#
+# offset: end of the last complete record read. index: timestamp and offset of the
+# first record after each INDEX_INTERVAL boundary, up to offset.
+#
+def __get_state_file(state_dir, instance_name):
+    return os.path.join(state_dir, "%s.json" % instance_name)
+
+def __load_state(module, state_file, log_file, log_stat):
+    empty_state = {'log_file': log_file, 'inode': log_stat.st_ino, 'offset': 0, 'index': []}
+
+    try:
+        with open(state_file) as f:
+            state = json.load(f)
+    except (IOError, OSError, ValueError):
+        return empty_state
+
+    # Log rotated, archived (db2diag -A) or moved to another DIAGPATH
+    if state.get('log_file') != log_file or state.get('inode') != log_stat.st_ino or state.get('offset', 0) > log_stat.st_size:
+        return empty_state
+
+    return state
+
+def __save_state(module, state_file, state):
+    try:
+        state_dir = os.path.dirname(state_file)
+        if not os.path.isdir(state_dir):
+            os.makedirs(state_dir)
+
+        fd, tmp_file = tempfile.mkstemp(dir=state_dir, prefix='.db2_diag_')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+        os.rename(tmp_file, state_file)
+    except (IOError, OSError) as e:
+        module.warn("State file %s could not be written. Error: %s" % (state_file, str(e)))
+
+#
+# Scan db2diag.log
+#
+# Only record headers are matched over the memory-mapped file, record bodies are
+# searched for sqlcodes and decoded only for records of the requested levels and
+# time window.
+#
+def __scan_diag_log(module, instance_name, log_file, state_file, levels, since, until, sqlcodes, incremental, max_entries):
+    stats = {'log_file': log_file, 'start_offset': 0, 'end_offset': 0, 'scanned_bytes': 0,
+             'records_scanned': 0, 'entries_matched': 0, 'level_counts': {}}
+
+    try:
+        log_stat = os.stat(log_file)
+    except OSError:
+        stats['msg'] = "%s not found" % log_file
+        return [], stats
+
+    state = __load_state(module, state_file, log_file, log_stat)
+    index_timestamps = [timestamp for timestamp, offset in state['index']]
+
+    start = 0
+    if incremental:
+        start = state['offset']
+    elif since:
+        # Last indexed record before since, records are written in time order
+        position = bisect.bisect_left(index_timestamps, since)
+        if position > 0:
+            start = state['index'][position - 1][1]
+
+    stats['start_offset'] = stats['end_offset'] = start
+    if log_stat.st_size <= start:
+        return [], stats
+
+    level_set = set([to_bytes(level.lower()) for level in levels])
+    entries = deque(maxlen=max_entries)
+
+    with open(log_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            size = len(mm)
+
+            # A record is complete when the next header or the empty line at the end of the file follows
+            headers = RECORD_HEADER_PATTERN.finditer(mm, start)
+            header = next(headers, None)
+            end = header.start() if header else start
+
+            while header:
+                next_header = next(headers, None)
+                record_start = header.start()
+
+                if next_header:
+                    record_end = next_header.start()
+                elif mm[size - 2:size] == b"\n\n":
+                    record_end = size
+                else:
+                    # Record still being written, read it on the next run
+                    break
+
+                end = record_end
+                stats['records_scanned'] += 1
+                level = to_text(header.group(3))
+                stats['level_counts'][level] = stats['level_counts'].get(level, 0) + 1
+
+                # Extend the timestamp index beyond the indexed part of the log
+                if record_start >= state['offset']:
+                    indexed_offset = state['index'][-1][1] if state['index'] else -INDEX_INTERVAL
+                    if record_start - indexed_offset >= INDEX_INTERVAL:
+                        state['index'].append([to_text(header.group(1)[:19]), record_start])
+
+                timestamp = header.group(1)[:19]
+                if header.group(3).lower() in level_set \
+                        and (not since or timestamp >= to_bytes(since)) \
+                        and (not until or timestamp < to_bytes(until)):
+                    record = mm[record_start:record_end]
+                    entry = __get_record_entry(record, header, record_start)
+
+                    if not sqlcodes or set(entry['sqlcodes']) & sqlcodes:
+                        entry['instance'] = instance_name
+                        entries.append(entry)
+                        stats['entries_matched'] += 1
+
+                header = next_header
+        finally:
+            mm.close()
+
+    stats['end_offset'] = end
+    stats['scanned_bytes'] = end - start
+
+    if end > state['offset']:
+        state['offset'] = end
+        __save_state(module, state_file, state)
+
+    return list(entries), stats
+
+def main():
+    module = AnsibleModule(
+        argument_spec = dict(
+            instance = dict(required=False, type='str', default=None),
+            diag_path = dict(required=False, type='path', default=None),
+            levels = dict(required=False, type='list', default=['Critical', 'Severe', 'Error']),
+            since = dict(required=False, type='str', default=None),
+            until = dict(required=False, type='str', default=None),
+            sqlcodes = dict(required=False, type='list', default=None),
+            incremental = dict(required=False, type='bool', default=True),
+            max_entries = dict(required=False, type='int', default=100),
+            state_dir = dict(required=False, type='path', default='/var/tmp/db2_diag'),
+            max_workers = dict(required=False, type='int', default=8)
+        )
+    )
+
+    instance_name = module.params['instance']
+    diag_path = module.params['diag_path']
+    levels = module.params['levels']
+    since = __normalize_timestamp(module, module.params['since'])
+    until = __normalize_timestamp(module, module.params['until'])
+    sqlcodes = set([__normalize_sqlcode(module, sqlcode) for sqlcode in module.params['sqlcodes'] or []])
+    incremental = module.params['incremental']
+    max_entries = module.params['max_entries']
+    state_dir = module.params['state_dir']
+    max_workers = module.params['max_workers']
+
+    for level in levels:
+        if level.capitalize() not in LEVELS:
+            module.fail_json(msg="unknown level %s, valid levels: %s" % (level, ", ".join(LEVELS)))
+            return
+
+    if diag_path and not instance_name:
+        module.fail_json(msg="diag_path requires instance")
+        return
+
+    if instance_name:
+        instances = [instance_name]
+    else:
+        instances = sorted(get_db2_instance_facts(module).keys())
+
+    if diag_path:
+        diag_paths = [diag_path]
+    else:
+        diag_paths = __get_diag_paths(module, instances, max_workers)
+
+    entries = []
+    instance_stats = {}
+    for instance, instance_diag_path in zip(instances, diag_paths):
+        instance_entries, instance_stats[instance] = __scan_diag_log(module, instance, os.path.join(instance_diag_path, DB2DIAG_LOG),
+                                                                     __get_state_file(state_dir, instance), levels, since, until,
+                                                                     sqlcodes, incremental, max_entries)
+        entries.extend(instance_entries)
+
+    module.exit_json(changed=False, entries=entries, instances=instance_stats)
+
+def init():
+    if __name__ == '__main__':
+        return main()
+
+init()
@@ -17,6 +17,46 @@ options:
     required: false
     default: present
     choices: ["software", "instances", "databases"]
+  max_workers:
+    description:
+      - Maximum number of db2ilist and list database directory calls executed concurrently
+    required: false
+    default: 8
+  cache_file:
+    description:
+      - Path of an on-disk fact cache. If set, discovered facts are stored in this file and
+        reused by later runs as long as cache_ttl is not exceeded and the modification time
+        of db2ls, the install paths and the sqllib directories of the instances did not change.
+    required: false
+  cache_ttl:
+    description:
+      - Maximum age in seconds of each entry (software, instances, databases) of the on-disk
+        fact cache
+    required: false
+    default: 3600
+  database_details:
+    description:
+      - Gather size, tablespaces, HADR role and DB CFG of each database. The details of a
+        database are read in one CLP session, databases are processed concurrently.
+    required: false
+    default: false
+  snapshot_file:
+    description:
+      - Path of a snapshot of the database details of the previous run. Only databases whose
+        directory entry or local database directory changed, or whose details are older than
+        snapshot_ttl, are gathered again. The changes are reported in db2_database_changes.
+    required: false
+  snapshot_ttl:
+    description:
+      - Maximum age of the database details in the snapshot in seconds
+    required: false
+    default: 86400
+  profile:
+    description:
+      - Add C(profile) to the result with elapsed time, count and output bytes of all
+        subprocesses by phase (db2ls, db2ilist, db2_list_database_directory, db2_clp) and peak RSS.
+    required: false
+    default: false
 
 author:
   - ma44in  
@@ -27,6 +67,17 @@ EXAMPLES = '''
 # Basic fact gathering
 - db2_facts:
     filter: software
+
+# Reuse facts of earlier runs for up to one hour
+- db2_facts:
+    cache_file: /var/tmp/db2_facts.json
+    cache_ttl: 3600
+
+# Database details, gathered again only for changed databases
+- db2_facts:
+    filter: databases
+    database_details: true
+    snapshot_file: /var/tmp/db2_database_snapshot.json
     
 '''
 
@@ -45,12 +96,32 @@ db2_instance_list
   db2inst2:
     path: /opt/IBM/db2/V11.5.5.0
 
+db2_database_changes # only with snapshot_file
+  added: []
+  changed: [db2inst1_SAMPLE]
+  removed: []
+  unchanged: [db2inst2_SAMPLE]
+
 db2_database_list
   db2inst1_SAMPLE:
     database_alias: SAMPLE
     database_name: SAMPLE
     instance_name: db2inst1
     instance_path: /opt/IBM/db2/V11.1.1.1
+    local_database_directory: /db2/db2inst1/home
+    details: # only with database_details
+      size: 123731968
+      capacity: 53687091200
+      hadr_role: STANDARD
+      tablespaces:
+        USERSPACE1:
+          type: DMS
+          page_size: 4096
+          total_pages: 8192
+          used_pages: 1024
+          state: NORMAL
+      configuration:
+        LOGFILSIZ: 1024
 
   db2inst2_SAMPLE:
     database_alias: SAMPLE
@@ -60,134 +131,252 @@ db2_database_list
 '''
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.six.moves import shlex_quote
+from ansible.module_utils.db2_common import (DEFAULT_MAX_WORKERS, DB2LS_COMMAND, DISCOVERY_CACHE, DB2_SESSION_MARKER, CFG_PARAMETER_PATTERN,
+                                             Db2Profiler, get_db2_software_facts, get_db2_instance_facts, get_db2_database_facts,
+                                             run_commands_concurrently)
+import hashlib
+import json
 import os
 import re
+import time
 
-# db2ls output:
 #
-# # /usr/local/bin/db2ls -c
-# #PATH:VRMF:FIXPACK:SPECIAL:INSTALLTIME:INSTALLERUID
-# /opt/IBM/db2/V10.5:10.5.0.6:6 :1:Wed Feb  3 15:01:15 2016 CET :0
-# /opt/IBM/db2/V10.5_FP7:10.5.0.7:7:1:Wed Feb 15 16:07:21 2017 CET :0
-# /opt/IBM/db2/V11.1:11.1.1.1:1 :1:Thu Jul 13 15:28:23 2017 CESTcet :0
+# Database details
 #
-def get_db2_software_facts(module):
-  db2ls_command = os.path.join('/', 'usr', 'local', 'bin', 'db2ls') # /usr/local/bin/db2ls
-  software_facts = {}
-  
-  if os.path.isfile(db2ls_command):
-    # Call dbls with '-c' to get colon-seperated output
-    db2ls_command = "%s %s" % (db2ls_command, '-c') 
-    rc, out, err = module.run_command(db2ls_command)
-    if rc == 0:
-      for line in out.splitlines(): # e. g. line: /opt/IBM/db2/V10.5:10.5.0.6:6 :1:Wed Feb 3 15:01:15 2016 CET :0"
-        if not line.startswith('#'):       
-          software_path = line.split(':')[0]
-        
-          # Add Software to Dict
-          software_facts[software_path] = {
-            'vrmf' : line.split(':')[1], # Db2 Version e. g.: 10.5.0.6   
-            'fixpack' : line.split(':')[2], 
-            'special' : line.split(':')[3] 
-            #'installtime' : line.split(':')[4], CSV Output broken due to : in date ... 
-            #'installeruid' : line.split(':')[5] 
-          }
+# One CLP session per database as instance user: GET DB CFG, GET_DBSIZE_INFO and
+# MON_GET_TABLESPACE. The outputs are separated by a marker line.
+#
+HADR_ROLE_PATTERN = re.compile(r"^\s*HADR database role\s+= (\S+)")
+PARAMETER_NAME_PATTERN = re.compile(r"^\s*Parameter Name\s+: (\S+)")
+PARAMETER_VALUE_PATTERN = re.compile(r"^\s*Parameter Value\s+: (\S+)")
+
+TABLESPACE_QUERY = ("SELECT RTRIM(TBSP_NAME) || '|' || RTRIM(TBSP_TYPE) || '|' || RTRIM(CHAR(TBSP_PAGE_SIZE))"
+                    " || '|' || RTRIM(CHAR(TBSP_TOTAL_PAGES)) || '|' || RTRIM(CHAR(TBSP_USED_PAGES)) || '|' || RTRIM(TBSP_STATE)"
+                    " FROM TABLE(MON_GET_TABLESPACE(NULL, -2))")
+
+def get_db2_database_details_command(database):
+  db2profile_path = os.path.join(os.path.expanduser('~%s' % database['instance_name']), 'sqllib', 'db2profile')
 
+  script = []
+  script.append(". %s; export LANG=C DB2DBDFT=%s" % (db2profile_path, database['database_name']))
+  for statement in ["GET DB CFG FOR %s" % database['database_name'], "CALL GET_DBSIZE_INFO(?, ?, ?, -1)", TABLESPACE_QUERY]:
+    script.append("db2 -x %s; echo %s $?" % (shlex_quote(statement), DB2_SESSION_MARKER))
+  script.append("db2 terminate > /dev/null")
+
+  command = []
+  if os.getuid() != 0:
+    command.append("/bin/sudo")
+  command.extend(["/bin/su", database['instance_name'], "-c", "; ".join(script)])
+
+  return command
+
+def parse_db2_database_details(out):
+  outputs = [[]]
+  for line in out.splitlines():
+    if line.startswith(DB2_SESSION_MARKER):
+      outputs.append([])
     else:
-      module.fail_json(msg="Command %s failed with rc %s\n. stdout: %s\nstderr: %s\n" % (db2ls_command, rc, out, err))
+      outputs[-1].append(line)
 
-  return software_facts
+  db_cfg_lines, dbsize_lines, tablespace_lines = (outputs + [[], [], []])[:3]
+  details = {'configuration': {}, 'tablespaces': {}, 'hadr_role': None, 'size': None, 'capacity': None}
 
-def get_db2_instance_facts(module):
-  instance_facts = {}
+  #   Log file size (4KB)                         (LOGFILSIZ) = 1024
+  #   HADR database role                                      = STANDARD
+  for line in db_cfg_lines:
+    match = CFG_PARAMETER_PATTERN.match(line)
+    if match:
+      details['configuration'][match.group(1).upper()] = match.group(2)
+    match = HADR_ROLE_PATTERN.match(line)
+    if match:
+      details['hadr_role'] = match.group(1)
 
-  for software_path in get_db2_software_facts(module).keys():
-    db2ilist_command = os.path.join(software_path, 'bin', 'db2ilist') # e. g. /opt/ibm/db2/V11.1/bin/db2ilist
- 
-    if os.path.isfile(db2ilist_command):
-      # Get list of db2 instances
-      rc, out, err = module.run_command(db2ilist_command)
-      if rc == 0:
-        for instance in out.splitlines():
-          # Add Instance to Dict
-          instance_facts[instance] = {
-            'path': software_path
-          }
-      else:
-        module.fail_json(msg="Command %s failed with rc %s\n. stdout: %s\nstderr: %s\n" % (db2ilist_command, rc, out, err))
-        return
- 
-  return instance_facts
+  #   Parameter Name  : DATABASESIZE
+  #   Parameter Value : 123731968
+  parameter = None
+  for line in dbsize_lines:
+    match = PARAMETER_NAME_PATTERN.match(line)
+    if match:
+      parameter = match.group(1)
+    match = PARAMETER_VALUE_PATTERN.match(line)
+    if match and parameter in ('DATABASESIZE', 'DATABASECAPACITY'):
+      details['size' if parameter == 'DATABASESIZE' else 'capacity'] = int(match.group(1))
 
-def get_db2_database_facts(module):
-  instance_facts = get_db2_instance_facts(module)
-  database_facts = {}
-  
+  #   USERSPACE1|DMS|4096|8192|1024|NORMAL
+  for line in tablespace_lines:
+    columns = line.strip().split('|')
+    if len(columns) == 6:
+      details['tablespaces'][columns[0]] = {
+        'type': columns[1],
+        'page_size': int(columns[2]),
+        'total_pages': int(columns[3]),
+        'used_pages': int(columns[4]),
+        'state': columns[5]
+      }
 
-  for instance in instance_facts.keys():
-    instance_home_dir = os.path.expanduser('~%s' % instance)
-    instance_db2profile_path = os.path.join(instance_home_dir, 'sqllib', 'db2profile')
-    
-    #database_facts[instance] = {}
+  return details
 
-    if os.path.isfile(instance_db2profile_path):
-      command = []
+#
+# Fingerprint of a database for incremental gathering: directory entry and
+# modification time of its local database directory
+#
+def get_db2_database_fingerprint(database):
+  directory_entry = json.dumps([database.get(key) for key in sorted(database.keys()) if key != 'details'])
 
-      if os.getuid() != 0:
-        command.append("/bin/sudo")
+  try:
+    path_mtime = os.path.getmtime(os.path.join(database['local_database_directory'], database['instance_name']))
+  except (OSError, TypeError, AttributeError):
+    path_mtime = None
 
-      command.append("/bin/su %s -c" % instance)
-      command.append("'. %s; LANG=C db2 list database directory'" % instance_db2profile_path) 
-      command = " ".join(command)
-  
-      # Get Database Directory of Instance
-      rc, out, err = module.run_command(command)
-      if rc != 0:
-        # SQL1057W  The system database directory is empty.  
-        # SQL1031N  The database directory cannot be found on the indicated file system.
-        if "SQL1057W" in out or "SQL1031N" in out:
-          return database_facts # No databases
-        else:
-          module.fail_json(msg="Command %s failed with rc %s\n. stdout: %s\nstderr: %s\n" % (command, rc, out, err))
-          return
-
-      # Parse Output
-      # Database 1 entry:
-      #   Database alias                       = MWT1
-      #   Database name                        = MWT1
-      #   Local database directory             = /db2/db2mwtt1/home
-      #   Database release level               = 14.00
-      #   Comment                              =
-      #   Directory entry type                 = Indirect
-      database_alias = None
-      database_name = None
-      for line in out.splitlines():
-        if re.match('^ +Database name += .*$', line):
-          database_name = line.split('=')[1].strip()
-        if re.match('^ +Database alias += .*$', line):
-          database_alias = line.split('=')[1].strip()
-        if re.match('^ +Directory entry type += Indirect$', line):
-          # Local Database found -> Add Database to Dict
-          database_facts[instance + "_" + database_name] = {
-           'database_name': database_name,
-           'database_alias': database_alias,
-           'instance_name': instance,
-           'instance_path': instance_facts[instance]['path'],
-          }
-          database_alias = None
-          database_name = None
-
-  return database_facts  
+  return {'directory_entry': hashlib.sha1(directory_entry.encode('utf-8')).hexdigest(), 'path_mtime': path_mtime}
+
+def get_db2_database_details(module, database_facts, max_workers=DEFAULT_MAX_WORKERS, snapshot_file=None, snapshot_ttl=86400):
+  snapshot = {}
+  if snapshot_file:
+    try:
+      with open(snapshot_file) as f:
+        snapshot = json.load(f)
+    except (IOError, OSError, ValueError):
+      snapshot = {} # No or unreadable snapshot
+
+  changes = {'added': [], 'changed': [], 'removed': sorted(set(snapshot.keys()) - set(database_facts.keys())), 'unchanged': []}
+  new_snapshot = {}
+  keys = []
+  for key in sorted(database_facts.keys()):
+    fingerprint = get_db2_database_fingerprint(database_facts[key])
+    previous = snapshot.get(key)
+
+    if previous and previous.get('fingerprint') == fingerprint and time.time() - previous.get('timestamp', 0) <= snapshot_ttl:
+      new_snapshot[key] = previous
+      changes['unchanged'].append(key)
+    else:
+      new_snapshot[key] = {'fingerprint': fingerprint, 'timestamp': time.time()}
+      changes['changed' if previous else 'added'].append(key)
+      keys.append(key)
+
+  # Gather details of new and changed databases
+  commands = [get_db2_database_details_command(database_facts[key]) for key in keys]
+  for key, command, (rc, out, err) in zip(keys, commands, run_commands_concurrently(module, commands, max_workers)):
+    if rc != 0 and DB2_SESSION_MARKER not in out:
+      module.fail_json(msg="Command %s failed with rc %s\n. stdout: %s\nstderr: %s\n" % (" ".join(command), rc, out, err))
+      return
+    new_snapshot[key]['details'] = parse_db2_database_details(out)
+
+  if snapshot_file:
+    try:
+      with open(snapshot_file, 'w') as f:
+        json.dump(new_snapshot, f)
+    except (IOError, OSError) as e:
+      module.warn("Snapshot %s could not be written. Error: %s" % (snapshot_file, str(e)))
+
+  database_details = {}
+  for key, database in database_facts.items():
+    database_details[key] = dict(database, details=new_snapshot[key].get('details'))
+
+  return database_details, changes
+
+#
+# On-disk fact cache
+#
+# The cache is valid as long as the modification times of db2ls, the install paths
+# and the sqllib directories are unchanged. Every entry (software, instances,
+# databases) keeps the time it was discovered and is used while it is younger
+# than cache_ttl, so entries discovered by an earlier run do not get younger
+# when another entry is refreshed.
+#
+CACHE_TIMESTAMPS = {}
+
+def get_discovery_fingerprint():
+  paths = [DB2LS_COMMAND]
+  paths.extend(DISCOVERY_CACHE.get('software', {}).keys())
+
+  for instance in DISCOVERY_CACHE.get('instances', {}).keys():
+    sqllib_path = os.path.join(os.path.expanduser('~%s' % instance), 'sqllib')
+    paths.append(sqllib_path)
+    paths.append(os.path.join(sqllib_path, 'sqldbdir'))
+
+  fingerprint = {}
+  for path in paths:
+    try:
+      fingerprint[path] = os.path.getmtime(path)
+    except OSError:
+      fingerprint[path] = None
+
+  return fingerprint
+
+def load_discovery_cache(module, cache_file, cache_ttl):
+  try:
+    with open(cache_file) as f:
+      cache = json.load(f)
+  except (IOError, OSError, ValueError):
+    return False # No or unreadable cache
+
+  for path, mtime in cache.get('fingerprint', {}).items():
+    try:
+      current_mtime = os.path.getmtime(path)
+    except OSError:
+      current_mtime = None
+    if current_mtime != mtime:
+      return False
+
+  facts = cache.get('facts', {})
+  timestamps = cache.get('timestamps') or dict.fromkeys(facts.keys(), cache.get('timestamp', 0))
+  for key, value in facts.items():
+    if time.time() - timestamps.get(key, 0) <= cache_ttl:
+      DISCOVERY_CACHE[key] = value
+      CACHE_TIMESTAMPS[key] = timestamps[key]
+
+  return bool(CACHE_TIMESTAMPS)
+
+def save_discovery_cache(module, cache_file):
+  # Entries discovered in this run get the current time
+  now = time.time()
+  for key in DISCOVERY_CACHE.keys():
+    CACHE_TIMESTAMPS.setdefault(key, now)
+
+  cache = {
+    'timestamps': CACHE_TIMESTAMPS,
+    'fingerprint': get_discovery_fingerprint(),
+    'facts': DISCOVERY_CACHE
+  }
+
+  try:
+    with open(cache_file, 'w') as f:
+      json.dump(cache, f)
+  except (IOError, OSError) as e:
+    module.warn("Fact cache %s could not be written. Error: %s" % (cache_file, str(e)))
  
 def main():
 
   module = AnsibleModule(
              argument_spec = dict(
-               filter = dict(default=None, choices=['software', 'instances', 'databases'])
+               filter = dict(default=None, choices=['software', 'instances', 'databases']),
+               max_workers = dict(default=DEFAULT_MAX_WORKERS, type='int'),
+               cache_file = dict(default=None, type='path'),
+               cache_ttl = dict(default=3600, type='int'),
+               database_details = dict(default=False, type='bool'),
+               snapshot_file = dict(default=None, type='path'),
+               snapshot_ttl = dict(default=86400, type='int'),
+               profile = dict(default=False, type='bool')
              )
            )
 
+  if module.params['profile']:
+    Db2Profiler().enable(module)
+
   filter = module.params['filter']
+  max_workers = module.params['max_workers']
+  cache_file = module.params['cache_file']
+  cache_ttl = module.params['cache_ttl']
+  database_details = module.params['database_details']
+  snapshot_file = module.params['snapshot_file']
+  snapshot_ttl = module.params['snapshot_ttl']
+
+  cache_hit = False
+  if cache_file:
+    cache_hit = load_discovery_cache(module, cache_file, cache_ttl)
+  cached_keys = set(DISCOVERY_CACHE.keys())
 
   db2_facts = {}
   
@@ -195,13 +384,22 @@ def main():
     db2_facts['db2_software_list'] = get_db2_software_facts(module)
 
   if not filter or 'instances' in filter:
-    db2_facts['db2_instance_list'] = get_db2_instance_facts(module)
+    db2_facts['db2_instance_list'] = get_db2_instance_facts(module, max_workers)
  
   if not filter or 'databases' in filter:
-    db2_facts['db2_database_list'] = get_db2_database_facts(module)
+    db2_facts['db2_database_list'] = get_db2_database_facts(module, max_workers)
  
+  # Write cache if facts were discovered in this run
+  if cache_file and set(DISCOVERY_CACHE.keys()) != cached_keys:
+    cache_hit = False
+    save_discovery_cache(module, cache_file)
+
+  if database_details and 'db2_database_list' in db2_facts:
+    db2_facts['db2_database_list'], changes = get_db2_database_details(module, db2_facts['db2_database_list'], max_workers, snapshot_file, snapshot_ttl)
+    if snapshot_file:
+      db2_facts['db2_database_changes'] = changes
 
-  module.exit_json(changed=False, ansible_facts=db2_facts)
+  module.exit_json(changed=False, ansible_facts=db2_facts, cache_hit=cache_hit)
 
 
 def init():
@@ -34,8 +34,9 @@ options:
   name:
     description:
       - name of the Db2 instance to add, configure or drop. If the instance should be 
-        created an user with the same name must be created beforehand
-    required: true
+        created an user with the same name must be created beforehand. Required unless
+        instances is used.
+    required: false
     
   path:
     description: Path to Db2 Installation directory (e. g. /opt/IBM/db2/10.1)
@@ -67,6 +68,32 @@ options:
     required: false
     default: SERVER_ENCRYPT
 
+  configurations:
+    description:
+      - list of DBM CFG parameters with keys C(name), C(value) and optional C(automatic)
+    required: false
+
+  instances:
+    description:
+      - list of instances with key C(name) and optional keys C(path), C(state), C(port),
+        C(type), C(auth_type) and C(configurations). Missing keys default to the options
+        of the same name. Existing instances are discovered once, db2icrt/db2idrop, start
+        and configuration run concurrently per instance. Returns C(results) per instance.
+    required: false
+
+  max_workers:
+    description:
+      - Maximum number of instances provisioned concurrently.
+    required: false
+    default: 4
+
+  profile:
+    description:
+      - Add C(profile) to the result with elapsed time, count and output bytes of all
+        subprocesses by phase (db2ls, db2ilist, db2icrt, ps, db2_clp) and peak RSS.
+    required: false
+    default: false
+
 author:
   - ma44in  
 '''
@@ -78,129 +105,155 @@ EXAMPLES = '''
     name: db2inst1
     path: /opt/ibm/db2/V11.1
     state: present
+
+# Many instances of one installation
+- db2_instance:
+    path: /opt/ibm/db2/V11.1
+    max_workers: 8
+    configurations:
+      - name: DIAGLEVEL
+        value: 3
+    instances:
+      - name: db2inst1
+        port: 50000
+      - name: db2inst2
+        port: 50010
+        configurations:
+          - name: INTRA_PARALLEL
+            value: "YES"
+      - name: db2old
+        state: absent
 '''
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.db2_common import DB2LS_COMMAND, Db2Profiler, exec_db2_session, get_db2_instance_facts, map_concurrently, parse_cfg
 import os
 import pwd
-import re
 
-# db2ls output:
 #
-# # /usr/local/bin/db2ls -c
-# #PATH:VRMF:FIXPACK:SPECIAL:INSTALLTIME:INSTALLERUID
-# /opt/IBM/db2/V10.5:10.5.0.6:6 :1:Wed Feb  3 15:01:15 2016 CET :0
-# /opt/IBM/db2/V10.5_FP7:10.5.0.7:7:1:Wed Feb 15 16:07:21 2017 CET :0
-# /opt/IBM/db2/V11.1:11.1.1.1:1 :1:Thu Jul 13 15:28:23 2017 CESTcet :0
+# Instances of all Db2 installations, discovered once per module run
 #
-def __get_existing_db2_software_paths(module):
-    db2ls_command = os.path.join('/', 'usr', 'local', 'bin', 'db2ls') # /usr/local/bin/db2ls
- 
-    if not os.path.isfile(db2ls_command):
-        module.fail_json(msg="Path %s does not exists" % db2ls_command)
-        return
-
-    # Get list of db2 software
-    software_paths = []
- 
-    # Call dbls with '-c' to get colon-seperated output
-    db2ls_command = "%s %s" % (db2ls_command, '-c') 
-    rc, out, err = module.run_command(db2ls_command)
-    if rc == 0:
-        for line in out.splitlines(): # e. g. line: /opt/IBM/db2/V10.5:10.5.0.6:6 :1:Wed Feb 3 15:01:15 2016 CET :0"
-            if line.startswith('/'):
-                software_path = line.split(':')[0]
-                software_paths.append(software_path)
-    else:
-        module.fail_json(msg="Command %s failed with rc %s\n. stdout: %s\nstderr: %s\n" % (db2ls_command, rc, out, err))
-    
-    return software_paths
-
 def __get_existing_instances(module):
-    instances = []
+    if not os.path.isfile(DB2LS_COMMAND):
+        module.fail_json(msg="Path %s does not exists" % DB2LS_COMMAND)
+        return
 
-    for software_path in __get_existing_db2_software_paths(module):
-        db2ilist_command = os.path.join(software_path, 'bin', 'db2ilist') # e. g. /opt/ibm/db2/V11.1/bin/db2ilist
-        
-        if not os.path.isfile(db2ilist_command):
-            module.fail_json(msg="Path %s does not exists" % db2ilist_command)
-            return
-    
-        # Get list of db2 instances
-        rc, out, err = module.run_command(db2ilist_command)
-        if rc == 0:
-            for instance in out.splitlines():
-                instances.append(instance)
-        else:
-            module.fail_json(msg="Command %s failed with rc %s\n. stdout: %s\nstderr: %s\n" % (db2ilist_command, rc, out, err))
-            return
-    
-    return instances
+    return list(get_db2_instance_facts(module).keys())
 
 #
-# Execute command local
+# Fast checks of instance state
 #
-# Using db2 command line interface on the host to execute command
+# The fast checks read the file system and /proc only. They return None if the
+# result is inconclusive, then the checks fall back to db2ls/db2ilist and ps.
+# All results are cached for the module run.
 #
-def __exec_db2_commmand_local(module, instance_name, command):
-    # build db2 command line call
-    db2_command=[]
-    db2_command.append("/bin/sh -c \"")
-    db2_command.append("PATH=/bin:/usr/bin . ~%s/sqllib/db2profile;" % instance_name)
-    db2_command.append("db2 -tx \\\"%s;\\\"" % command)
-    db2_command.append("\"")
-    db2_command = " ".join(db2_command)
+INSTANCE_STATE_CACHE = {}
+
+def __get_instance_user(instance_name):
+    try:
+        return pwd.getpwnam(instance_name)
+    except KeyError:
+        return None
+
+def __instance_exists_fast(instance_name):
+    instance_user = __get_instance_user(instance_name)
+    if instance_user is None:
+        return False # An instance requires an user with the same name
+
+    # db2icrt creates ~inst/sqllib, db2idrop removes it
+    if os.path.isfile(os.path.join(instance_user.pw_dir, 'sqllib', 'db2profile')):
+        return True
+
+    return None
+
+# uids of all db2sysc processes, /proc is scanned once for all instances
+def __get_db2sysc_uids():
+    if 'db2sysc_uids' in INSTANCE_STATE_CACHE:
+        return INSTANCE_STATE_CACHE['db2sysc_uids']
+
+    uids = set()
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(os.path.join('/proc', pid, 'comm')) as f:
+                if f.read().strip() == 'db2sysc':
+                    uids.add(os.stat(os.path.join('/proc', pid)).st_uid)
+        except (IOError, OSError):
+            continue # Process terminated in between
+
+    INSTANCE_STATE_CACHE['db2sysc_uids'] = uids
+    return uids
 
-    return module.run_command(db2_command) # returns: rc, out, err 
+def __instance_running_fast(instance_name):
+    instance_user = __get_instance_user(instance_name)
+    if instance_user is None or not os.path.isdir('/proc/self'):
+        return None
+
+    # Look for db2sysc processes of the instance user
+    return instance_user.pw_uid in __get_db2sysc_uids()
 
 def __instance_running(module, instance_name):
-    # $ ps -u db2inst1 --no-headers -o comm
-    # db2sysc
-    # db2vend
-    # db2fmp
-    # db2fmp
-    # #db2vend
-    rc, out, err = module.run_command("ps -u %s --no-headers -o comm" % instance_name)
+    if ('running', instance_name) in INSTANCE_STATE_CACHE:
+        return INSTANCE_STATE_CACHE[('running', instance_name)]
+
+    running = __instance_running_fast(instance_name)
+    if running is None:
+        # $ ps -u db2inst1 --no-headers -o comm
+        # db2sysc
+        # db2vend
+        # db2fmp
+        # db2fmp
+        # #db2vend
+        rc, out, err = module.run_command("ps -u %s --no-headers -o comm" % instance_name)
 
-    if err:
-      module.fail_json(msg="could not get process list of instance user", err=err) 
+        if err:
+          module.fail_json(msg="could not get process list of instance user", err=err) 
 
-    if "db2sysc" in out:
-      return True
+        running = "db2sysc" in out
 
-    return False
+    INSTANCE_STATE_CACHE[('running', instance_name)] = running
+    return running
 
 def __instance_exists(module, instance_name):
-    if instance_name in __get_existing_instances(module):
-        return True
-    else:
-        return False
+    if ('exists', instance_name) in INSTANCE_STATE_CACHE:
+        return INSTANCE_STATE_CACHE[('exists', instance_name)]
 
-def main():
-    module = AnsibleModule(
-        argument_spec = dict(
-            name = dict(required=True, type='str'),
-            path = dict(required=False, type='str'),
-            type = dict(required=False, default='WSE', type='str'),
-            port = dict(required=False, type='int'),
-            configurations=dict(required=False, default=[], type='list'),
-            auth_type = dict(required=False, default='SERVER_ENCRYPT', type='str'),
-            state = dict(choices=['present', 'absent'], default='present')
-        )
-    )
+    exists = __instance_exists_fast(instance_name)
+    if exists is None:
+        exists = instance_name in __get_existing_instances(module)
 
-    instance_name = module.params['name']
-    software_path = module.params['path']
-    instance_port = module.params['port']
-    instance_type = module.params['type']
-    instance_auth_type = module.params['auth_type']
-    configurations = module.params['configurations']
-    state = module.params['state']
+    INSTANCE_STATE_CACHE[('exists', instance_name)] = exists
+    return exists
+
+#
+# Create, drop, start and configure one instance
+#
+# Returns a result dict instead of failing the module, so that it can run in a
+# worker thread. On failure the result contains failed and msg.
+#
+def __provision_instance(module, instance):
+    instance_name = instance['name']
+    software_path = instance.get('path')
+    instance_port = instance.get('port')
+    instance_type = instance.get('type') or 'WSE'
+    instance_auth_type = instance.get('auth_type') or 'SERVER_ENCRYPT'
+    configurations = instance.get('configurations') or []
+    state = instance.get('state') or 'present'
+
+    result = {
+        'name': instance_name,
+        'state': state,
+        'changed': False,
+        'failed': False,
+        'db2_instance_created': False,
+        'db2_instance_started': False,
+        'update_dbm_results': [],
+        'db2icrt_command': None,
+        'update_dbm_commands': []
+    }
 
     # Build db2icrt Command
-    has_changed = False
-    instance_created = False
-    instance_started = False
     db2icrt_command = None
 
     if state == "present" and not __instance_exists(module, instance_name):
@@ -210,65 +263,164 @@ def main():
 
     # Execute db2icrt command if necessary
     if db2icrt_command:
+        result['db2icrt_command'] = db2icrt_command
         rc, out, err = module.run_command(db2icrt_command)
 
         if rc == 0:
-            has_changed=True
-            instance_created=True
+            result['changed'] = True
+            result['db2_instance_created'] = True
+            INSTANCE_STATE_CACHE[('exists', instance_name)] = state == "present"
+            INSTANCE_STATE_CACHE.pop(('running', instance_name), None)
         else:
-            module.fail_json(msg="FAILED COMMAND: %s, RC: %s, STDOUT: %s, STDERR: %s" % (db2icrt_command, rc, out, err))
-            return
+            result.update(failed=True, msg="FAILED COMMAND: %s, RC: %s, STDOUT: %s, STDERR: %s" % (db2icrt_command, rc, out, err))
+            return result
+
+    # Dropped instance: nothing to start or configure
+    if state == "absent":
+        return result
 
-    # Start Instance if necessary
-    if state == "present" and not __instance_running(module, instance_name):
+    # Start Instance if necessary and read current DBM configuration in one CLP session
+    db2_start_command = None
+    if not __instance_running(module, instance_name):
         db2_start_command = "START DATABASE MANAGER"
-        rc, out, err = __exec_db2_commmand_local(module, instance_name, db2_start_command)
-        
-        if rc == 0:
-            has_changed=True
-            instance_started = True
+
+    rc, out, err, results = exec_db2_session(module, instance_name, [c for c in [db2_start_command, "GET DBM CFG"] if c])
+
+    if db2_start_command:
+        start_rc, start_out = results[0]
+
+        if start_rc == 0:
+            result['changed'] = True
+            result['db2_instance_started'] = True
+            INSTANCE_STATE_CACHE[('running', instance_name)] = True
         else:
-            module.fail_json(msg="FAILED COMMAND: %s, RC: %s, STDOUT: %s, STDERR: %s" % (db2_start_command, rc, out, err))
-            return
-    
-    # Read current DBM configuration
-    #   $ db2 get dbm cfg
-    #   Number of FCM buffers                 (FCM_NUM_BUFFERS) = AUTOMATIC(1024)
-    #   FCM buffer size                       (FCM_BUFFER_SIZE) = 32768
+            result.update(failed=True, msg="FAILED COMMAND: %s, RC: %s, STDOUT: %s, STDERR: %s" % (db2_start_command, start_rc, start_out, err))
+            return result
+
     current_configurations = {}
-    rc, out, err = __exec_db2_commmand_local(module, instance_name, "GET DBM CFG")
-    if rc == 0:
-        for line in out.splitlines():
-            match = re.match(".* \((.*)\) = (.*)", line)
-            
-            if match:
-                current_configurations[match.group(1).upper()] = match.group(2)
-    
-    update_dbm_commands = []        
-            
+    get_dbm_cfg_rc, get_dbm_cfg_out = results[-1]
+    if get_dbm_cfg_rc == 0:
+        current_configurations = parse_cfg(get_dbm_cfg_out)
+
+    update_dbm_commands = []
+    update_dbm_parameters = []
+
     for target_configuration in configurations:
         parameter = target_configuration['name'].upper()
-        
-        current_value = current_configurations[parameter]   
-        target_value = target_configuration['value']        
+
+        if parameter not in current_configurations:
+            result.update(failed=True, msg="Unknown DBM CFG parameter %s" % parameter)
+            return result
+
+        current_value = current_configurations[parameter]
+        target_value = target_configuration['value']
         target_automatic_flag = target_configuration['automatic'] if 'automatic' in target_configuration else False
-        
-        if target_automatic_flag is True:                
+
+        if target_automatic_flag is True:
             if current_value != "AUTOMATIC(%s)" % target_value:
                 update_dbm_commands.append("UPDATE DBM CFG USING %s %s AUTOMATIC" % (parameter, target_value))
+                update_dbm_parameters.append(parameter)
         else:
             if current_value != "%s" % target_value:
                 update_dbm_commands.append("UPDATE DBM CFG USING %s %s" % (parameter, target_value))
+                update_dbm_parameters.append(parameter)
 
-    for update_dbm_command in update_dbm_commands:
-        rc, out, err = __exec_db2_commmand_local(module, instance_name, update_dbm_command)
-        
-        if rc == 0:
-            has_changed = True
+    result['update_dbm_commands'] = update_dbm_commands
+
+    # Apply all updates in one CLP session and read the resulting DBM configuration in the same session
+    if update_dbm_commands:
+        rc, out, err, results = exec_db2_session(module, instance_name, update_dbm_commands + ["GET DBM CFG"])
+        updated_configurations = parse_cfg(results[-1][1]) if results[-1][0] == 0 else {}
+
+        for parameter, update_dbm_command, (update_rc, update_out) in zip(update_dbm_parameters, update_dbm_commands, results):
+            result['update_dbm_results'].append({
+                'parameter': parameter,
+                'command': update_dbm_command,
+                'rc': update_rc,
+                'stdout': update_out,
+                'previous_value': current_configurations[parameter],
+                'value': updated_configurations.get(parameter)
+            })
+
+        failed_dbm_results = [update_dbm_result for update_dbm_result in result['update_dbm_results'] if update_dbm_result['rc'] != 0]
+        if failed_dbm_results:
+            result.update(failed=True, msg="FAILED COMMANDS: %s" % [update_dbm_result['command'] for update_dbm_result in failed_dbm_results], stderr=err)
+            return result
+
+        result['changed'] = True
+
+    return result
+
+#
+# Provision many instances concurrently
+#
+# Existence and state of all instances are determined once before the workers
+# start: one db2ls/db2ilist discovery and one scan of /proc for all instances.
+#
+def __provision_instances(module, instances, max_workers):
+    for instance in instances:
+        if __instance_exists(module, instance['name']) and (instance.get('state') or 'present') == 'present':
+            __instance_running(module, instance['name'])
+
+    # Results keep the order of the instances
+    return map_concurrently(__provision_instance, [(module, instance) for instance in instances], max_workers)
+
+def main():
+    module = AnsibleModule(
+        argument_spec = dict(
+            name = dict(required=False, type='str'),
+            path = dict(required=False, type='str'),
+            type = dict(required=False, default='WSE', type='str'),
+            port = dict(required=False, type='int'),
+            configurations=dict(required=False, default=[], type='list'),
+            auth_type = dict(required=False, default='SERVER_ENCRYPT', type='str'),
+            state = dict(choices=['present', 'absent'], default='present'),
+            instances = dict(required=False, type='list', default=None),
+            max_workers = dict(required=False, type='int', default=4),
+            profile = dict(required=False, type='bool', default=False)
+        ),
+        mutually_exclusive = [['name', 'instances']],
+        required_one_of = [['name', 'instances']]
+    )
+
+    if module.params['profile']:
+        Db2Profiler().enable(module)
+
+    # Defaults of the instances in list mode
+    defaults = dict((option, module.params[option]) for option in ['path', 'type', 'port', 'configurations', 'auth_type', 'state'])
+
+    if module.params['instances'] is not None:
+        instances = []
+        for instance in module.params['instances']:
+            if not isinstance(instance, dict) or 'name' not in instance:
+                module.fail_json(msg="each instance must be a dict with key name: %s" % instance)
+                return
+            if instance.get('state', defaults['state']) not in ('present', 'absent'):
+                module.fail_json(msg="invalid state %s of instance %s, valid states: present, absent" % (instance['state'], instance['name']))
+                return
+            instances.append(dict(defaults, **instance))
+
+        results = __provision_instances(module, instances, module.params['max_workers'])
+        has_changed = any([result['changed'] for result in results])
+        failed_instances = [result['name'] for result in results if result['failed']]
+
+        if failed_instances:
+            module.fail_json(msg="FAILED INSTANCES: %s" % failed_instances, changed=has_changed, results=results)
+            return
+
+        module.exit_json(changed=has_changed, results=results)
+        return
+
+    result = __provision_instance(module, dict(defaults, name=module.params['name']))
+
+    if result['failed']:
+        if result['update_dbm_results']:
+            module.fail_json(msg=result['msg'], update_dbm_results=result['update_dbm_results'], stderr=result.get('stderr'))
         else:
-            module.fail_json(msg="FAILED COMMAND: %s, RC: %s, STDOUT: %s, STDERR: %s" % (update_dbm_command, rc, out, err))
+            module.fail_json(msg=result['msg'])
+        return
 
-    module.exit_json(changed=has_changed, db2_instance_created=instance_created, db2_instance_started=instance_started, msg="DB2ICRT COMMAND: %s, UPDATE DBM COMMANDS: %s" % (db2icrt_command, update_dbm_commands))
+    module.exit_json(changed=result['changed'], db2_instance_created=result['db2_instance_created'], db2_instance_started=result['db2_instance_started'], update_dbm_results=result['update_dbm_results'], msg="DB2ICRT COMMAND: %s, UPDATE DBM COMMANDS: %s" % (result['db2icrt_command'], result['update_dbm_commands']))
 
 def init():
     if __name__ == '__main__':
@@ -0,0 +1,307 @@
+#!/usr/bin/python
+
+from __future__ import (absolute_import, division)
+__metaclass__ = type
+
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+
+DOCUMENTATION = '''
+---
+module: db2_load
+version_added: 2.4
+short_description: Load data into many Db2 tables concurrently
+description:
+  - Load tables from files or from a cursor (LOAD FROM ... OF CURSOR). Each table is loaded
+    in its own CLP session, up to max_workers tables at the same time. Returns rows read,
+    loaded, rejected and the elapsed time per table.
+options:
+  instance:
+    description:
+      - name of the Db2 instance
+    required: true
+
+  database:
+    description:
+      - name of the Db2 database
+    required: true
+
+  tables:
+    description:
+      - list of tables to load. Keys C(name) (target table), either C(file) (path of the input file)
+        or C(query) (SELECT statement for a cursor load), C(filetype) (DEL, IXF, ASC. Default DEL),
+        C(mode) (INSERT, REPLACE. Default INSERT) and C(options) (additional LOAD options, e. g.
+        NONRECOVERABLE).
+    required: true
+
+  max_workers:
+    description:
+      - Maximum number of tables loaded concurrently.
+    required: false
+    default: 4
+
+  cpu_parallelism:
+    description:
+      - CPU_PARALLELISM of each LOAD. Db2 chooses the value if not set.
+    required: false
+
+  disk_parallelism:
+    description:
+      - DISK_PARALLELISM of each LOAD. Db2 chooses the value if not set.
+    required: false
+
+  progress_file:
+    description:
+      - path of a file to which a JSON line is appended when the load of a table starts
+        and finishes and, every progress_interval seconds while loads are running, with the
+        current phase (e. g. LOAD, BUILD) and its completed and total work (rows or indexes)
+        of each running load from LIST UTILITIES SHOW DETAIL. Can be followed with tail -f
+        while the module runs.
+    required: false
+
+  progress_interval:
+    description:
+      - Seconds between two progress lines of the running loads in progress_file.
+    required: false
+    default: 10
+
+author:
+  - ma44in
+'''
+
+EXAMPLES = '''
+# Note:
+# Nightly refresh from a staging database
+- db2_load:
+    instance: db2inst1
+    database: SAMPLE
+    max_workers: 8
+    cpu_parallelism: 2
+    progress_file: /tmp/load_progress.json
+    progress_interval: 5
+    tables:
+      - name: APP.CUSTOMER
+        query: "SELECT * FROM STAGE.CUSTOMER"
+        mode: REPLACE
+        options: NONRECOVERABLE
+      - name: APP.ORDERS
+        file: /data/export/orders.del
+        filetype: DEL
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.db2_common import exec_db2_session, map_concurrently, write_progress
+import re
+import threading
+import time
+
+#
+# Parse LOAD summary
+#
+#   Number of rows read         = 1000
+#   Number of rows skipped      = 0
+#   Number of rows loaded       = 998
+#   Number of rows rejected     = 2
+#   Number of rows deleted      = 0
+#   Number of rows committed    = 1000
+#
+LOAD_SUMMARY_PATTERN = re.compile(r"^\s*Number of rows (\w+)\s+= (\d+)\s*$")
+
+def __parse_load_summary(out):
+    summary = {}
+    for line in out.splitlines():
+        match = LOAD_SUMMARY_PATTERN.match(line)
+        if match:
+            summary['rows_%s' % match.group(1).lower()] = int(match.group(2))
+
+    return summary
+
+def __build_load_commands(table, cursor_name, cpu_parallelism=None, disk_parallelism=None):
+    commands = []
+
+    if table.get('query'):
+        commands.append("DECLARE %s CURSOR FOR %s" % (cursor_name, table['query']))
+        load_command = "LOAD FROM %s OF CURSOR" % cursor_name
+    else:
+        load_command = "LOAD FROM %s OF %s" % (table['file'], table.get('filetype', 'DEL').upper())
+
+    load_command += " %s INTO %s" % (table.get('mode', 'INSERT').upper(), table['name'])
+
+    if cpu_parallelism:
+        load_command += " CPU_PARALLELISM %s" % cpu_parallelism
+    if disk_parallelism:
+        load_command += " DISK_PARALLELISM %s" % disk_parallelism
+    if table.get('options'):
+        load_command += " %s" % table['options']
+
+    commands.append(load_command)
+    return commands
+
+#
+# Progress reporting
+#
+# One JSON line per event, written while the loads are running. The output of a
+# LOAD arrives only when it finished, the progress of the running loads is read
+# from the utilities of the instance:
+#
+#   Type                             = LOAD
+#   Description                      = [LOADID: ...] OFFLINE LOAD DEL AUTOMATIC INDEXING INSERT APP.ORDERS
+#      Phase Number [Current]        = 2
+#         Description                = LOAD
+#         Total Work                 = 11000 rows
+#         Completed Work             = 5000 rows
+#
+UTILITY_FIELD_PATTERN = re.compile(r"^(\s*)(Type|Description|Phase Number \[Current\]|Phase Number|Total Work|Completed Work)\s+= ?(.*)$")
+WORK_PATTERN = re.compile(r"^(\d+)\s*(\w*)")
+
+def __parse_load_utilities(out):
+    # Returns dict of table name with phase, completed and total work of the current phase of each LOAD
+    loads = {}
+    utility = None
+    phase = None
+
+    for line in out.splitlines():
+        match = UTILITY_FIELD_PATTERN.match(line)
+        if not match:
+            continue
+
+        indent, field, value = match.groups()
+        if field == 'Type':
+            utility = {'type': value.strip()}
+            phase = None
+        elif utility is None:
+            continue
+        elif field == 'Description' and not indent:
+            utility['table'] = value.split()[-1] if value.split() else None
+        elif field.startswith('Phase Number'):
+            phase = {} if field.endswith('[Current]') else None
+        elif phase is not None:
+            if field == 'Description':
+                phase['phase'] = value.strip()
+            else:
+                work = WORK_PATTERN.match(value.strip())
+                if work:
+                    phase['completed_work' if field == 'Completed Work' else 'total_work'] = int(work.group(1))
+                    phase['unit'] = work.group(2)
+            if utility['type'] == 'LOAD' and utility.get('table'):
+                loads[utility['table']] = phase
+
+    return loads
+
+def __watch_load_progress(module, instance_name, tables, progress_file, progress_interval, finished):
+    table_names = set([table['name'].upper() for table in tables])
+
+    while not finished.wait(progress_interval):
+        try:
+            rc, out, err, results = exec_db2_session(module, instance_name, ["LIST UTILITIES SHOW DETAIL"])
+        except Exception as e:
+            module.warn("Progress of the loads could not be read. Error: %s" % str(e))
+            return
+
+        for table_name, phase in sorted(__parse_load_utilities(results[0][1]).items()):
+            if table_name.upper() in table_names and not finished.is_set():
+                write_progress(module, progress_file, dict(phase, table=table_name, status='running'))
+
+def __load_table(module, instance_name, database_name, table, index, cpu_parallelism, disk_parallelism, progress_file):
+    commands = __build_load_commands(table, "DB2LOADCUR%s" % index, cpu_parallelism, disk_parallelism)
+    write_progress(module, progress_file, {'table': table['name'], 'status': 'started'})
+
+    start = time.time()
+    rc, out, err, results = exec_db2_session(module, instance_name, commands, database_name)
+    load_rc, load_out = results[-1]
+
+    # First failing command of the session
+    failed = [(command_rc, command_out) for command_rc, command_out in results if command_rc >= 4]
+
+    result = {
+        'table': table['name'],
+        'commands': commands,
+        'rc': failed[0][0] if failed else load_rc,
+        'stdout': failed[0][1] if failed else load_out,
+        'elapsed': round(time.time() - start, 3)
+    }
+    result.update(__parse_load_summary(load_out))
+
+    write_progress(module, progress_file, {'table': table['name'], 'status': 'failed' if failed else 'finished',
+                                             'rc': result['rc'], 'rows_loaded': result.get('rows_loaded'),
+                                             'elapsed': result['elapsed']})
+    return result
+
+def __load_tables(module, instance_name, database_name, tables, max_workers, cpu_parallelism, disk_parallelism, progress_file, progress_interval=10):
+    finished = threading.Event()
+    if progress_file and progress_interval > 0:
+        watcher = threading.Thread(target=__watch_load_progress, args=(module, instance_name, tables, progress_file, progress_interval, finished))
+        watcher.daemon = True
+        watcher.start()
+
+    try:
+        # Results keep the order of the tables
+        return map_concurrently(__load_table, [(module, instance_name, database_name, table, index, cpu_parallelism, disk_parallelism, progress_file)
+                                               for index, table in enumerate(tables)], max_workers)
+    finally:
+        finished.set()
+
+def main():
+    module = AnsibleModule(
+        argument_spec = dict(
+            instance = dict(required=True, type='str'),
+            database = dict(required=True, type='str'),
+            tables = dict(required=True, type='list'),
+            max_workers = dict(required=False, type='int', default=4),
+            cpu_parallelism = dict(required=False, type='int', default=None),
+            disk_parallelism = dict(required=False, type='int', default=None),
+            progress_file = dict(required=False, type='path', default=None),
+            progress_interval = dict(required=False, type='int', default=10)
+        )
+    )
+
+    instance_name = module.params['instance']
+    database_name = module.params['database']
+    tables = module.params['tables']
+    max_workers = module.params['max_workers']
+    cpu_parallelism = module.params['cpu_parallelism']
+    disk_parallelism = module.params['disk_parallelism']
+    progress_file = module.params['progress_file']
+    progress_interval = module.params['progress_interval']
+
+    for table in tables:
+        if not isinstance(table, dict) or 'name' not in table or not (table.get('file') or table.get('query')):
+            module.fail_json(msg="each table must be a dict with key name and either file or query: %s" % table)
+            return
+
+    start = time.time()
+    results = __load_tables(module, instance_name, database_name, tables, max_workers, cpu_parallelism, disk_parallelism, progress_file, progress_interval)
+    elapsed = round(time.time() - start, 3)
+
+    # rc 2: warning, e. g. SQL3107W rows rejected
+    failed_tables = [result['table'] for result in results if result['rc'] >= 4]
+    rows_loaded = sum([result.get('rows_loaded', 0) for result in results])
+
+    if failed_tables:
+        module.fail_json(msg="LOAD FAILED FOR TABLES: %s" % failed_tables, changed=len(failed_tables) < len(results), results=results, elapsed=elapsed)
+        return
+
+    module.exit_json(changed=True, results=results, rows_loaded=rows_loaded, elapsed=elapsed)
+
+def init():
+    if __name__ == '__main__':
+        return main()
+
+init()
@@ -0,0 +1,233 @@
+#!/usr/bin/python
+
+from __future__ import (absolute_import, division)
+__metaclass__ = type
+
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+
+DOCUMENTATION = '''
+---
+module: db2_maintenance
+version_added: 2.4
+short_description: Run RUNSTATS and REORG on the tables of a Db2 database concurrently
+description:
+  - Reads the tables of the given schemas from SYSCAT.TABLES with one query and runs
+    REORG and/or RUNSTATS on up to max_workers tables at the same time. Tables without
+    statistics (FPAGES -1, size unknown) are scheduled first, then the largest tables by
+    FPAGES. Tables with statistics younger than stats_age hours are skipped. CLP warnings
+    (rc 2, e. g. SQL2314W) do not fail a table.
+options:
+  instance:
+    description:
+      - name of the Db2 instance
+    required: true
+
+  database:
+    description:
+      - name of the Db2 database
+    required: true
+
+  schemas:
+    description:
+      - list of schemas whose tables are maintained
+    required: true
+
+  actions:
+    description:
+      - maintenance actions per table. REORG runs before RUNSTATS.
+    required: false
+    default: ["runstats"]
+    choices: ["runstats", "reorg"]
+
+  runstats_options:
+    description:
+      - options appended to RUNSTATS ON TABLE <table>
+    required: false
+    default: WITH DISTRIBUTION AND DETAILED INDEXES ALL
+
+  reorg_options:
+    description:
+      - options appended to REORG TABLE <table>
+    required: false
+
+  stats_age:
+    description:
+      - Skip tables whose STATS_TIME is younger than the given number of hours. 0 maintains all tables.
+    required: false
+    default: 0
+
+  max_workers:
+    description:
+      - Maximum number of tables maintained concurrently.
+    required: false
+    default: 4
+
+author:
+  - ma44in
+'''
+
+EXAMPLES = '''
+# Note:
+# RUNSTATS on all tables of schema APP without statistics of the last 24 hours
+- db2_maintenance:
+    instance: db2inst1
+    database: SAMPLE
+    schemas:
+      - APP
+    stats_age: 24
+    max_workers: 8
+
+- db2_maintenance:
+    instance: db2inst1
+    database: SAMPLE
+    schemas:
+      - APP
+    actions:
+      - reorg
+      - runstats
+    reorg_options: "ALLOW READ ACCESS"
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.db2_common import exec_db2_session, map_concurrently
+import time
+
+#
+# Read tables of the schemas from the catalog
+#
+# One row per table, columns separated by '|':
+#   APP|ORDERS|120394|1
+#   schema|table|fpages|stats_fresh
+#
+# Tables without statistics have FPAGES -1, they come first: their size is
+# unknown and they need RUNSTATS most.
+#
+def __get_tables(module, instance_name, database_name, schemas, stats_age):
+    if stats_age > 0:
+        fresh = "CASE WHEN STATS_TIME > CURRENT TIMESTAMP - %s HOURS THEN 1 ELSE 0 END" % int(stats_age)
+    else:
+        fresh = "0"
+
+    query = ("SELECT RTRIM(TABSCHEMA) || '|' || RTRIM(TABNAME) || '|' || RTRIM(CHAR(FPAGES)) || '|' || CHAR(%s)"
+             " FROM SYSCAT.TABLES WHERE TYPE = 'T' AND TABSCHEMA IN (%s)"
+             " ORDER BY CASE WHEN FPAGES < 0 THEN 0 ELSE 1 END, FPAGES DESC, TABSCHEMA, TABNAME") % (fresh, ", ".join(["'%s'" % schema.upper().replace("'", "''") for schema in schemas]))
+
+    rc, out, err, results = exec_db2_session(module, instance_name, [query], database_name)
+    query_rc, query_out = results[0]
+
+    # rc 1: no rows
+    if query_rc not in (0, 1):
+        module.fail_json(msg="FAILED COMMAND: %s, RC: %s, STDOUT: %s, STDERR: %s" % (query, query_rc, query_out, err))
+        return
+
+    tables = []
+    for line in query_out.splitlines():
+        columns = line.strip().split('|')
+        if len(columns) == 4:
+            tables.append({
+                'schema': columns[0],
+                'table': columns[1],
+                'fpages': int(columns[2]),
+                'stats_fresh': columns[3].strip() == '1'
+            })
+
+    return tables
+
+def __maintain_table(module, instance_name, database_name, table, actions, runstats_options, reorg_options):
+    table_name = '"%s"."%s"' % (table['schema'], table['table'])
+
+    commands = []
+    if 'reorg' in actions:
+        commands.append(("REORG TABLE %s %s" % (table_name, reorg_options or '')).strip())
+    if 'runstats' in actions:
+        commands.append(("RUNSTATS ON TABLE %s %s" % (table_name, runstats_options or '')).strip())
+
+    start = time.time()
+    rc, out, err, results = exec_db2_session(module, instance_name, commands, database_name)
+
+    result = dict(table)
+    result.update(commands=commands, rc=0, elapsed=round(time.time() - start, 3))
+    for command_rc, command_out in results:
+        # rc 2: warning, e. g. SQL2314W, returned with the highest rc of the table
+        if command_rc >= 4:
+            result.update(rc=command_rc, stdout=command_out)
+            break
+        if command_rc > result['rc']:
+            result.update(rc=command_rc, stdout=command_out)
+
+    return result
+
+def __maintain_tables(module, instance_name, database_name, tables, actions, runstats_options, reorg_options, max_workers):
+    # Tables without statistics start first, then the largest tables
+    return map_concurrently(__maintain_table, [(module, instance_name, database_name, table, actions, runstats_options, reorg_options)
+                                               for table in tables], max_workers)
+
+def main():
+    module = AnsibleModule(
+        argument_spec = dict(
+            instance = dict(required=True, type='str'),
+            database = dict(required=True, type='str'),
+            schemas = dict(required=True, type='list'),
+            actions = dict(required=False, type='list', default=['runstats']),
+            runstats_options = dict(required=False, type='str', default='WITH DISTRIBUTION AND DETAILED INDEXES ALL'),
+            reorg_options = dict(required=False, type='str', default=None),
+            stats_age = dict(required=False, type='int', default=0),
+            max_workers = dict(required=False, type='int', default=4)
+        )
+    )
+
+    instance_name = module.params['instance']
+    database_name = module.params['database']
+    schemas = module.params['schemas']
+    actions = [action.lower() for action in module.params['actions']]
+    runstats_options = module.params['runstats_options']
+    reorg_options = module.params['reorg_options']
+    stats_age = module.params['stats_age']
+    max_workers = module.params['max_workers']
+
+    for action in actions:
+        if action not in ('runstats', 'reorg'):
+            module.fail_json(msg="unknown action %s, valid actions: runstats, reorg" % action)
+            return
+
+    start = time.time()
+    tables = __get_tables(module, instance_name, database_name, schemas, stats_age)
+    skipped_tables = [dict(table, skipped=True) for table in tables if table['stats_fresh']]
+    tables = [table for table in tables if not table['stats_fresh']]
+
+    results = []
+    if tables:
+        results = __maintain_tables(module, instance_name, database_name, tables, actions, runstats_options, reorg_options, max_workers)
+    elapsed = round(time.time() - start, 3)
+
+    failed_tables = ["%s.%s" % (result['schema'], result['table']) for result in results if result['rc'] >= 4]
+
+    if failed_tables:
+        module.fail_json(msg="MAINTENANCE FAILED FOR TABLES: %s" % failed_tables, changed=len(failed_tables) < len(results), results=results, skipped=skipped_tables, elapsed=elapsed)
+        return
+
+    module.exit_json(changed=len(results) > 0, results=results, skipped=skipped_tables, elapsed=elapsed)
+
+def init():
+    if __name__ == '__main__':
+        return main()
+
+init()
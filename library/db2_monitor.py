@@ -0,0 +1,371 @@
+#!/usr/bin/python
+
+from __future__ import (absolute_import, division)
+__metaclass__ = type
+
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+
+DOCUMENTATION = '''
+---
+module: db2_monitor
+version_added: 2.4
+short_description: Collect monitoring metrics of a Db2 database with MON_GET table functions
+description:
+  - Reads the requested metric groups of a database with MON_GET table functions in one
+    CLP session and returns typed values.
+  - The sample is stored in sample_file. The next run returns the difference of each
+    counter to the stored sample and its rate per second, e. g. rows read per second or
+    lock waits per second. Counters that decrease (database reactivated) have no delta.
+options:
+  instance:
+    description:
+      - name of the Db2 instance
+    required: true
+
+  database:
+    description:
+      - name of the Db2 database
+    required: true
+
+  metrics:
+    description:
+      - metric groups to collect. Predefined groups are C(database) (MON_GET_DATABASE),
+        C(tablespace) (MON_GET_TABLESPACE), C(bufferpool) (MON_GET_BUFFERPOOL) and
+        C(lock_waits) (MON_GET_APPL_LOCKWAIT).
+      - A group can also be a dict with keys C(name), C(table_function) (e. g.
+        "MON_GET_TABLE('', '', -2)"), C(keys), C(counters), C(gauges) and C(text)
+        (lists of column names).
+    required: false
+    default: ["database", "tablespace", "bufferpool", "lock_waits"]
+
+  sample_file:
+    description:
+      - file of the previous sample. Default /var/tmp/db2_monitor/<instance>_<database>.json
+    required: false
+
+author:
+  - ma44in
+'''
+
+EXAMPLES = '''
+# Note:
+# Health check every 5 minutes, rates per second since the previous check
+- db2_monitor:
+    instance: db2inst1
+    database: SAMPLE
+  register: monitor
+
+- debug:
+    msg: "{{ monitor.deltas.database[0].lock_waits_per_sec }} lock waits/s"
+
+# Table activity with a custom group
+- db2_monitor:
+    instance: db2inst1
+    database: SAMPLE
+    metrics:
+      - database
+      - name: table
+        table_function: "MON_GET_TABLE('APP', '', -2)"
+        keys: [TABSCHEMA, TABNAME, MEMBER]
+        counters: [ROWS_READ, ROWS_INSERTED, ROWS_UPDATED, ROWS_DELETED]
+'''
+
+RETURN = '''
+samples:
+  description: rows per metric group with lower case column names
+  returned: always
+  type: dict
+  sample:
+    database:
+      - member: 0
+        db_status: ACTIVE
+        rows_read: 1234567
+        lock_waits: 12
+        num_locks_held: 40
+    bufferpool:
+      - bp_name: IBMDEFAULTBP
+        member: 0
+        pool_data_l_reads: 100000
+        pool_data_p_reads: 1000
+        hit_ratio: 0.99
+deltas:
+  description: counter differences and rates per second to the previous sample, per metric group. Empty on the first run.
+  returned: always
+  type: dict
+  sample:
+    database:
+      - member: 0
+        rows_read: 30000
+        rows_read_per_sec: 100.0
+        lock_waits: 3
+        lock_waits_per_sec: 0.01
+interval:
+  description: seconds since the previous sample, null on the first run
+  returned: always
+  type: float
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.db2_common import exec_db2_session
+import json
+import os
+import tempfile
+import time
+
+#
+# Metric groups
+#
+# keys: identify a row across samples, counters: monotonic, delta and rate per second,
+# gauges: current values, text: strings
+#
+METRIC_GROUPS = {
+    'database': {
+        'table_function': "MON_GET_DATABASE(-2)",
+        'keys': ['MEMBER'],
+        'counters': ['ROWS_READ', 'ROWS_RETURNED', 'ROWS_MODIFIED',
+                     'POOL_DATA_L_READS', 'POOL_DATA_P_READS', 'POOL_INDEX_L_READS', 'POOL_INDEX_P_READS',
+                     'DIRECT_READS', 'DIRECT_WRITES', 'TOTAL_APP_COMMITS', 'TOTAL_APP_ROLLBACKS',
+                     'LOCK_WAITS', 'LOCK_WAIT_TIME', 'LOCK_TIMEOUTS', 'DEADLOCKS', 'LOCK_ESCALS',
+                     'TOTAL_SORTS', 'SORT_OVERFLOWS', 'TOTAL_CPU_TIME'],
+        'gauges': ['NUM_LOCKS_HELD', 'NUM_LOCKS_WAITING', 'APPLS_CUR_CONS'],
+        'text': ['DB_STATUS']
+    },
+    'tablespace': {
+        'table_function': "MON_GET_TABLESPACE('', -2)",
+        'keys': ['TBSP_NAME', 'MEMBER'],
+        'counters': ['POOL_DATA_L_READS', 'POOL_DATA_P_READS', 'POOL_DATA_WRITES',
+                     'POOL_INDEX_L_READS', 'POOL_INDEX_P_READS', 'DIRECT_READS', 'DIRECT_WRITES'],
+        'gauges': ['TBSP_PAGE_SIZE', 'TBSP_USED_PAGES', 'TBSP_TOTAL_PAGES'],
+        'text': ['TBSP_TYPE', 'TBSP_STATE']
+    },
+    'bufferpool': {
+        'table_function': "MON_GET_BUFFERPOOL('', -2)",
+        'keys': ['BP_NAME', 'MEMBER'],
+        'counters': ['POOL_DATA_L_READS', 'POOL_DATA_P_READS', 'POOL_INDEX_L_READS', 'POOL_INDEX_P_READS',
+                     'POOL_DATA_WRITES', 'POOL_INDEX_WRITES', 'POOL_ASYNC_DATA_READS'],
+        'gauges': ['BP_CUR_BUFFSZ'],
+        'text': []
+    },
+    'lock_waits': {
+        'table_function': "MON_GET_APPL_LOCKWAIT(NULL, -2)",
+        'keys': [],
+        'counters': [],
+        'gauges': ['APPLICATION_HANDLE', 'HLD_APPLICATION_HANDLE', 'LOCK_WAIT_ELAPSED_TIME'],
+        'text': ['LOCK_NAME', 'LOCK_OBJECT_TYPE', 'LOCK_MODE', 'LOCK_MODE_REQUESTED', 'TABSCHEMA', 'TABNAME']
+    }
+}
+
+COLUMN_DELIMITER = '|'
+
+#
+# Build query of a metric group
+#
+# One delimited line per row, NULL as empty column:
+#   0|ACTIVE|1234567|...
+#
+def __get_group_columns(group):
+    return group['keys'] + [column for column in group['text'] + group['gauges'] + group['counters'] if column not in group['keys']]
+
+def __build_group_query(group):
+    columns = ["COALESCE(RTRIM(CHAR(%s)), '')" % column for column in __get_group_columns(group)]
+    return "SELECT %s FROM TABLE(%s) AS T" % ((" || '%s' || " % COLUMN_DELIMITER).join(columns), group['table_function'])
+
+def __convert_value(value, numeric):
+    value = value.strip()
+    if value == '':
+        return None
+    if not numeric:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+def __parse_group_rows(group, out):
+    columns = __get_group_columns(group)
+    text_columns = set(group['text'])
+
+    rows = []
+    for line in out.splitlines():
+        values = line.rstrip().split(COLUMN_DELIMITER)
+        if len(values) != len(columns):
+            continue
+        rows.append(dict((column.lower(), __convert_value(value, column not in text_columns)) for column, value in zip(columns, values)))
+
+    return rows
+
+def __get_row_key(group, row):
+    return COLUMN_DELIMITER.join([str(row.get(column.lower())) for column in group['keys']])
+
+#
+# Derived values
+#
+def __add_hit_ratio(row, prefix=''):
+    logical_reads = (row.get(prefix + 'pool_data_l_reads') or 0) + (row.get(prefix + 'pool_index_l_reads') or 0)
+    physical_reads = (row.get(prefix + 'pool_data_p_reads') or 0) + (row.get(prefix + 'pool_index_p_reads') or 0)
+    row['hit_ratio'] = round(1 - physical_reads / logical_reads, 4) if logical_reads > 0 else None
+
+#
+# Deltas to the previous sample
+#
+# Rows are matched by their key columns. A counter lower than in the previous sample
+# was reset (database deactivated and activated), the row has no delta.
+#
+def __get_group_deltas(group_name, group, rows, previous_rows, interval):
+    if not group['counters'] or not group['keys'] or not interval or interval <= 0:
+        return []
+
+    previous_rows_by_key = dict((__get_row_key(group, row), row) for row in previous_rows)
+
+    deltas = []
+    for row in rows:
+        previous_row = previous_rows_by_key.get(__get_row_key(group, row))
+        if not previous_row:
+            continue
+
+        delta = dict((column.lower(), row.get(column.lower())) for column in group['keys'])
+        reset = False
+        for column in group['counters']:
+            column = column.lower()
+            if not isinstance(row.get(column), (int, float)) or not isinstance(previous_row.get(column), (int, float)):
+                continue
+            if row[column] < previous_row[column]:
+                reset = True
+                break
+            delta[column] = row[column] - previous_row[column]
+            delta["%s_per_sec" % column] = round(delta[column] / interval, 3)
+
+        if reset:
+            continue
+
+        if group_name == 'bufferpool':
+            __add_hit_ratio(delta)
+
+        delta['interval'] = interval
+        deltas.append(delta)
+
+    return deltas
+
+#
+# Sample file
+#
+# {"time": 1500000000.0, "instance": "db2inst1", "database": "SAMPLE", "samples": {"database": [...], ...}}
+#
+def __load_sample(sample_file):
+    try:
+        with open(sample_file) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+def __save_sample(module, sample_file, sample):
+    try:
+        sample_dir = os.path.dirname(sample_file)
+        if not os.path.isdir(sample_dir):
+            os.makedirs(sample_dir)
+
+        fd, tmp_file = tempfile.mkstemp(dir=sample_dir, prefix='.db2_monitor_')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(sample, f)
+        os.rename(tmp_file, sample_file)
+    except (IOError, OSError) as e:
+        module.warn("Sample file %s could not be written. Error: %s" % (sample_file, str(e)))
+
+def __get_metric_groups(module, metrics):
+    groups = []
+    for metric in metrics:
+        if isinstance(metric, dict):
+            if 'name' not in metric or 'table_function' not in metric:
+                module.fail_json(msg="each custom metric group must be a dict with keys name and table_function: %s" % metric)
+                return
+            group = {'table_function': metric['table_function']}
+            for columns in ['keys', 'counters', 'gauges', 'text']:
+                group[columns] = [column.upper() for column in metric.get(columns) or []]
+            if not __get_group_columns(group):
+                module.fail_json(msg="custom metric group %s has no columns" % metric['name'])
+                return
+            groups.append((metric['name'], group))
+        elif metric in METRIC_GROUPS:
+            groups.append((metric, METRIC_GROUPS[metric]))
+        else:
+            module.fail_json(msg="unknown metric group %s, valid groups: %s" % (metric, ", ".join(sorted(METRIC_GROUPS.keys()))))
+            return
+
+    return groups
+
+def main():
+    module = AnsibleModule(
+        argument_spec = dict(
+            instance = dict(required=True, type='str'),
+            database = dict(required=True, type='str'),
+            metrics = dict(required=False, type='list', default=['database', 'tablespace', 'bufferpool', 'lock_waits']),
+            sample_file = dict(required=False, type='path', default=None)
+        )
+    )
+
+    instance_name = module.params['instance']
+    database_name = module.params['database']
+    metrics = module.params['metrics']
+    sample_file = module.params['sample_file'] or os.path.join('/var/tmp/db2_monitor', "%s_%s.json" % (instance_name, database_name.upper()))
+
+    groups = __get_metric_groups(module, metrics)
+
+    # All groups in one CLP session
+    sample_time = time.time()
+    rc, out, err, results = exec_db2_session(module, instance_name, [__build_group_query(group) for name, group in groups], database_name)
+
+    samples = {}
+    failed_groups = []
+    for (group_name, group), (query_rc, query_out) in zip(groups, results):
+        # rc 1: no rows, e. g. no lock waits
+        if query_rc not in (0, 1):
+            failed_groups.append({'group': group_name, 'rc': query_rc, 'stdout': query_out})
+            continue
+
+        samples[group_name] = __parse_group_rows(group, query_out)
+        if group_name == 'bufferpool':
+            for row in samples[group_name]:
+                __add_hit_ratio(row)
+
+    if failed_groups:
+        module.fail_json(msg="MON_GET QUERIES FAILED FOR GROUPS: %s" % [group['group'] for group in failed_groups], results=failed_groups, stderr=err)
+        return
+
+    previous_sample = __load_sample(sample_file)
+    interval = None
+    deltas = {}
+    if previous_sample and previous_sample.get('instance') == instance_name and previous_sample.get('database') == database_name.upper():
+        interval = round(sample_time - previous_sample['time'], 3)
+        for group_name, group in groups:
+            deltas[group_name] = __get_group_deltas(group_name, group, samples[group_name], previous_sample['samples'].get(group_name, []), interval)
+
+    __save_sample(module, sample_file, {'time': sample_time, 'instance': instance_name, 'database': database_name.upper(), 'samples': samples})
+
+    module.exit_json(changed=False, samples=samples, deltas=deltas, interval=interval)
+
+def init():
+    if __name__ == '__main__':
+        return main()
+
+init()
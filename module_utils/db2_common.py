@@ -0,0 +1,462 @@
+from __future__ import (absolute_import, division)
+__metaclass__ = type
+
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+#
+# Shared helpers of the db2 library modules
+#
+# Discovery of software, instances and databases, precompiled parse patterns,
+# CLP sessions and profiling. The modules import this file from the
+# module_utils folder of the role:
+#
+#   from ansible.module_utils.db2_common import get_db2_database_facts
+#
+# Every task executes a module in a fresh python process. Only cheap modules are
+# imported here; multiprocessing.pool and optional python modules (yaml, ibm_db)
+# are imported on first use, patterns are compiled once per process and
+# discovery results are cached for the module run.
+#
+from ansible.module_utils._text import to_bytes
+from ansible.module_utils.six.moves import shlex_quote
+import importlib
+import json
+import os
+import re
+import resource
+import tempfile
+import threading
+import time
+
+DEFAULT_MAX_WORKERS = 8
+DB2LS_COMMAND = os.path.join('/', 'usr', 'local', 'bin', 'db2ls') # /usr/local/bin/db2ls
+
+# Discovery results of this module run, keys: software, instances, databases
+DISCOVERY_CACHE = {}
+
+#
+# Precompiled patterns
+#
+#   Log file size (4KB)                         (LOGFILSIZ) = 1024
+#   Number of FCM buffers                 (FCM_NUM_BUFFERS) = AUTOMATIC(1024)
+#
+CFG_PARAMETER_PATTERN = re.compile(r".* \((.*)\) = (.*)")
+
+#   Database alias                       = MWT1
+#   Directory entry type                 = Indirect
+DATABASE_DIRECTORY_PATTERN = re.compile(r"^ +(Database alias|Database name|Local database directory|Directory entry type) += ?(.*)$")
+
+#
+# Optional python modules
+#
+# Imported on first use, returns None if the module is not installed.
+#
+OPTIONAL_MODULES = {}
+
+def import_optional(name):
+    if name not in OPTIONAL_MODULES:
+        try:
+            OPTIONAL_MODULES[name] = importlib.import_module(name)
+        except ImportError:
+            OPTIONAL_MODULES[name] = None
+    return OPTIONAL_MODULES[name]
+
+#
+# Thread pool
+#
+# multiprocessing.pool is the most expensive import of the modules, it is only
+# imported by tasks running something concurrently.
+#
+def create_thread_pool(processes):
+    from multiprocessing.pool import ThreadPool
+    return ThreadPool(processes)
+
+#
+# Call a function concurrently
+#
+# Calls func with every tuple of args_list on at most max_workers threads and
+# returns the results in the order of args_list. The first exception of a call
+# is raised after all calls finished.
+#
+def map_concurrently(func, args_list, max_workers=DEFAULT_MAX_WORKERS):
+    if len(args_list) <= 1 or max_workers <= 1:
+        return [func(*args) for args in args_list]
+
+    pool = create_thread_pool(min(max_workers, len(args_list)))
+    try:
+        async_results = [pool.apply_async(func, args) for args in args_list]
+        return [async_result.get() for async_result in async_results]
+    finally:
+        pool.close()
+        pool.join()
+
+#
+# Run commands concurrently
+#
+# Returns list of (rc, out, err) in the order of the given commands.
+#
+def run_commands_concurrently(module, commands, max_workers=DEFAULT_MAX_WORKERS):
+    return map_concurrently(module.run_command, [(command,) for command in commands], max_workers)
+
+#
+# Progress reporting
+#
+# One JSON line per event appended to progress_file while the jobs are running,
+# the time of the event is added. Errors are reported as warnings.
+#
+PROGRESS_LOCK = threading.Lock()
+
+def write_progress(module, progress_file, event):
+    if not progress_file:
+        return
+
+    event['time'] = time.time()
+    with PROGRESS_LOCK:
+        try:
+            with open(progress_file, "a") as f:
+                f.write(json.dumps(event) + "\n")
+        except (IOError, OSError) as e:
+            module.warn("Progress file %s could not be written. Error: %s" % (progress_file, str(e)))
+
+#
+# Parse output of GET DB CFG and GET DBM CFG
+#
+# Returns dict of parameter name (upper case) and value.
+#
+def parse_cfg(out):
+    configurations = {}
+    match_parameter = CFG_PARAMETER_PATTERN.match
+    for line in out.splitlines():
+        # Skip headers and empty lines without running the pattern
+        if ') = ' not in line:
+            continue
+        match = match_parameter(line)
+        if match:
+            configurations[match.group(1).upper()] = match.group(2)
+
+    return configurations
+
+#
+# Parse output of LIST DATABASE DIRECTORY
+#
+# Database 1 entry:
+#   Database alias                       = MWT1
+#   Database name                        = MWT1
+#   Local database directory             = /db2/db2mwtt1/home
+#   Database release level               = 14.00
+#   Comment                              =
+#   Directory entry type                 = Indirect
+#
+# Returns list of local databases (directory entry type Indirect) as dicts with
+# database_alias, database_name and local_database_directory.
+#
+def parse_database_directory(out):
+    databases = []
+    entry = {}
+    match_field = DATABASE_DIRECTORY_PATTERN.match
+    for line in out.splitlines():
+        match = match_field(line)
+        if not match:
+            continue
+
+        field, value = match.group(1), match.group(2).strip()
+        if field == 'Database alias':
+            entry['database_alias'] = value
+        elif field == 'Database name':
+            entry['database_name'] = value
+        elif field == 'Local database directory':
+            entry['local_database_directory'] = value
+        else:
+            if value == 'Indirect':
+                databases.append({
+                    'database_alias': entry.get('database_alias'),
+                    'database_name': entry.get('database_name'),
+                    'local_database_directory': entry.get('local_database_directory'),
+                })
+            entry = {}
+
+    return databases
+
+#
+# Discovery
+#
+# db2ls -> db2ilist of each installation -> list database directory of each
+# instance. Each level is discovered once per module run.
+#
+# db2ls output:
+#
+# # /usr/local/bin/db2ls -c
+# #PATH:VRMF:FIXPACK:SPECIAL:INSTALLTIME:INSTALLERUID
+# /opt/IBM/db2/V10.5:10.5.0.6:6 :1:Wed Feb  3 15:01:15 2016 CET :0
+# /opt/IBM/db2/V10.5_FP7:10.5.0.7:7:1:Wed Feb 15 16:07:21 2017 CET :0
+# /opt/IBM/db2/V11.1:11.1.1.1:1 :1:Thu Jul 13 15:28:23 2017 CESTcet :0
+#
+def get_db2_software_facts(module):
+    if 'software' in DISCOVERY_CACHE:
+        return DISCOVERY_CACHE['software']
+
+    software_facts = {}
+
+    if os.path.isfile(DB2LS_COMMAND):
+        # Call dbls with '-c' to get colon-seperated output
+        db2ls_command = "%s %s" % (DB2LS_COMMAND, '-c')
+        rc, out, err = module.run_command(db2ls_command)
+        if rc != 0:
+            module.fail_json(msg="Command %s failed with rc %s\n. stdout: %s\nstderr: %s\n" % (db2ls_command, rc, out, err))
+            return
+
+        for line in out.splitlines(): # e. g. line: /opt/IBM/db2/V10.5:10.5.0.6:6 :1:Wed Feb 3 15:01:15 2016 CET :0"
+            if line.startswith('#') or not line.strip():
+                continue
+            columns = line.split(':')
+            software_facts[columns[0]] = {
+                'vrmf': columns[1], # Db2 Version e. g.: 10.5.0.6
+                'fixpack': columns[2],
+                'special': columns[3]
+                # installtime, installeruid: CSV Output broken due to : in date ...
+            }
+
+    DISCOVERY_CACHE['software'] = software_facts
+    return software_facts
+
+def get_db2_instance_facts(module, max_workers=DEFAULT_MAX_WORKERS):
+    if 'instances' in DISCOVERY_CACHE:
+        return DISCOVERY_CACHE['instances']
+
+    instance_facts = {}
+
+    software_paths = []
+    db2ilist_commands = []
+    for software_path in sorted(get_db2_software_facts(module).keys()):
+        db2ilist_command = os.path.join(software_path, 'bin', 'db2ilist') # e. g. /opt/ibm/db2/V11.1/bin/db2ilist
+        if os.path.isfile(db2ilist_command):
+            software_paths.append(software_path)
+            db2ilist_commands.append(db2ilist_command)
+
+    # Get list of db2 instances of each software path
+    for software_path, db2ilist_command, (rc, out, err) in zip(software_paths, db2ilist_commands, run_commands_concurrently(module, db2ilist_commands, max_workers)):
+        if rc != 0:
+            module.fail_json(msg="Command %s failed with rc %s\n. stdout: %s\nstderr: %s\n" % (db2ilist_command, rc, out, err))
+            return
+        for instance in out.splitlines():
+            instance_facts[instance] = {'path': software_path}
+
+    DISCOVERY_CACHE['instances'] = instance_facts
+    return instance_facts
+
+def get_db2_database_facts(module, max_workers=DEFAULT_MAX_WORKERS):
+    if 'databases' in DISCOVERY_CACHE:
+        return DISCOVERY_CACHE['databases']
+
+    instance_facts = get_db2_instance_facts(module, max_workers)
+    database_facts = {}
+
+    instances = []
+    commands = []
+    for instance in sorted(instance_facts.keys()):
+        instance_db2profile_path = os.path.join(os.path.expanduser('~%s' % instance), 'sqllib', 'db2profile')
+        if not os.path.isfile(instance_db2profile_path):
+            continue
+
+        command = []
+        if os.getuid() != 0:
+            command.append("/bin/sudo")
+        command.append("/bin/su %s -c" % instance)
+        command.append("'. %s; LANG=C db2 list database directory'" % instance_db2profile_path)
+        instances.append(instance)
+        commands.append(" ".join(command))
+
+    # Get Database Directory of all Instances
+    for instance, command, (rc, out, err) in zip(instances, commands, run_commands_concurrently(module, commands, max_workers)):
+        if rc != 0:
+            # SQL1057W  The system database directory is empty.
+            # SQL1031N  The database directory cannot be found on the indicated file system.
+            if "SQL1057W" in out or "SQL1031N" in out:
+                continue # No databases in this instance
+            module.fail_json(msg="Command %s failed with rc %s\n. stdout: %s\nstderr: %s\n" % (command, rc, out, err))
+            return
+
+        for database in parse_database_directory(out):
+            database_facts[instance + "_" + database['database_name']] = dict(database,
+                                                                              instance_name=instance,
+                                                                              instance_path=instance_facts[instance]['path'])
+
+    DISCOVERY_CACHE['databases'] = database_facts
+    return database_facts
+
+#
+# Local databases of all instances as targets of db2_command and db2_backup
+#
+# Returns list of dicts with instance and database, sorted by instance and database.
+#
+def get_db2_database_targets(module, max_workers=DEFAULT_MAX_WORKERS):
+    databases = get_db2_database_facts(module, max_workers)
+    return [{'instance': databases[key]['instance_name'], 'database': databases[key]['database_name']} for key in sorted(databases.keys())]
+
+#
+# Execute list of commands local in one CLP session
+#
+# All db2 calls share the CLP back-end process (db2bp) of the shell and therefore
+# one attachment/connection, db2profile is sourced once. After each command a
+# marker line with the return code of the db2 call is echoed to split the output
+# per command. DB2DBDFT is set with database_name; BACKUP and RESTORE run without
+# it, they must not hold a connection.
+#
+# The script is passed to /bin/sh in a file, a long list of commands exceeds the
+# limit of one argument string (MAX_ARG_STRLEN, 128 KiB). Commands longer than
+# MAX_COMMAND_ARGUMENT_BYTES are written to a file which db2 reads with -f.
+#
+# Returns rc, out, err of the shell and a list of (rc, out) per command. Commands
+# which were not executed (timeout, stop_on_error) get rc of the shell or 8.
+#
+DB2_SESSION_MARKER = "__DB2_SESSION_RC__"
+MAX_COMMAND_ARGUMENT_BYTES = 64 * 1024
+
+def build_db2_session_script(instance_name, commands, database_name=None, stop_on_error=False, terminator=';', command_files=None):
+    db2_options = "-tx" if terminator == ';' else "-td%s -x" % terminator
+    command_files = command_files or {}
+
+    script = []
+    script.append("LANG=C PATH=/bin:/usr/bin . ~%s/sqllib/db2profile" % instance_name)
+    if database_name:
+        script.append("export DB2DBDFT=%s" % database_name)
+
+    for i, command in enumerate(commands):
+        if i in command_files:
+            script.append("db2 %s -f %s" % (db2_options, shlex_quote(command_files[i])))
+        else:
+            script.append("db2 %s %s" % (db2_options, shlex_quote("%s%s" % (command, terminator))))
+        script.append("rc=$?; echo \"%s $rc\"" % DB2_SESSION_MARKER)
+
+        if stop_on_error:
+            # CLP rc 4 and 8: error
+            script.append("if [ $rc -ge 4 ]; then db2 terminate > /dev/null; exit $rc; fi")
+
+    script.append("db2 terminate > /dev/null")
+    return "\n".join(script)
+
+def write_temp_file(prefix, suffix, text):
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix)
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    return path
+
+def exec_db2_session(module, instance_name, commands, database_name=None, timeout=0, stop_on_error=False, terminator=';'):
+    command_files = {}
+    script_file = None
+    try:
+        for i, command in enumerate(commands):
+            if len(to_bytes(command)) > MAX_COMMAND_ARGUMENT_BYTES:
+                command_files[i] = write_temp_file('db2_statement_', '.sql', "%s%s\n" % (command, terminator))
+
+        script_file = write_temp_file('db2_session_', '.sh', build_db2_session_script(instance_name, commands, database_name,
+                                                                                      stop_on_error, terminator, command_files))
+        shell_command = ["/bin/sh", script_file]
+        if timeout:
+            shell_command = ["timeout", str(timeout)] + shell_command
+        rc, out, err = module.run_command(shell_command)
+    finally:
+        for path in list(command_files.values()) + [script_file]:
+            if path:
+                os.remove(path)
+
+    results = []
+    command_out = []
+    for line in out.splitlines():
+        if line.startswith(DB2_SESSION_MARKER):
+            results.append((int(line.split()[1]), "\n".join(command_out)))
+            command_out = []
+        else:
+            command_out.append(line)
+
+    # Commands not executed, e. g. shell terminated
+    for command in commands[len(results):]:
+        results.append((rc if rc != 0 else 8, "Not executed. DB2 session terminated with rc %s" % rc))
+
+    return rc, out, err, results
+
+#
+# Profiling
+#
+# Wraps run_command of the module and records elapsed time, count and bytes of
+# output of each subprocess by phase. The profile (incl. peak RSS of the module
+# and its children) is added to the result of exit_json and fail_json.
+#
+PROFILE_PHASES = [
+    ('db2ls', 'db2ls'),
+    ('db2ilist', 'db2ilist'),
+    ('db2icrt', 'db2icrt'),
+    ('db2idrop', 'db2idrop'),
+    ('list database directory', 'db2_list_database_directory'),
+    ('db2profile', 'db2_clp'),
+    ('db2_session_', 'db2_clp'),
+    ('ps ', 'ps'),
+]
+
+class Db2Profiler(object):
+
+    def __init__(self):
+        self.start = time.time()
+        self.phases = {}
+        self.calibration = None
+        self.lock = threading.Lock()
+        self.run_command = None
+
+    def enable(self, module):
+        run_command = module.run_command
+        exit_json = module.exit_json
+        fail_json = module.fail_json
+
+        def profiled_run_command(args, *posargs, **kwargs):
+            start = time.time()
+            rc, out, err = run_command(args, *posargs, **kwargs)
+            self.add(self.classify(args), time.time() - start, len(out or '') + len(err or ''))
+            return rc, out, err
+
+        # Unprofiled run_command, e.g. for calibration
+        self.run_command = run_command
+        module.run_command = profiled_run_command
+        module.exit_json = lambda **kwargs: exit_json(profile=self.result(), **kwargs)
+        module.fail_json = lambda **kwargs: fail_json(profile=self.result(), **kwargs)
+
+    def classify(self, args):
+        command = " ".join(args) if isinstance(args, (list, tuple)) else args
+        for keyword, phase in PROFILE_PHASES:
+            if keyword in command:
+                return phase
+        return os.path.basename(command.split()[0]) if command.split() else 'unknown'
+
+    def add(self, phase, elapsed, output_bytes=0):
+        with self.lock:
+            stats = self.phases.setdefault(phase, {'count': 0, 'elapsed': 0.0, 'output_bytes': 0})
+            stats['count'] += 1
+            stats['elapsed'] += elapsed
+            stats['output_bytes'] += output_bytes
+
+    def result(self):
+        with self.lock:
+            phases = dict((phase, dict(stats, elapsed=round(stats['elapsed'], 6))) for phase, stats in self.phases.items())
+
+        return {
+            'elapsed': round(time.time() - self.start, 6),
+            'phases': phases,
+            'subprocess_count': sum([stats['count'] for stats in phases.values()]),
+            'output_bytes': sum([stats['output_bytes'] for stats in phases.values()]),
+            # ru_maxrss: KB on Linux
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'peak_rss_children_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+            'calibration': self.calibration
+        }
@@ -0,0 +1,39 @@
+#
+# Import of the library modules in tests
+#
+# module_utils of the role are merged into ansible.module_utils, as ansible does
+# for roles. Private functions of a module are read with getattr, e. g.
+# getattr(db2_command, '__split_sql_file').
+#
+from __future__ import (absolute_import, division, print_function)
+
+import importlib
+import os
+import sys
+
+TESTS_PATH = os.path.dirname(os.path.abspath(__file__))
+LIBRARY_PATH = os.path.join(TESTS_PATH, '..', 'library')
+MODULE_UTILS_PATH = os.path.join(TESTS_PATH, '..', 'module_utils')
+FAKE_DB2_PATH = os.path.join(TESTS_PATH, '..', 'benchmarks', 'fake_db2')
+
+def load_library_module(name):
+    import ansible.module_utils
+    if MODULE_UTILS_PATH not in ansible.module_utils.__path__:
+        ansible.module_utils.__path__.append(MODULE_UTILS_PATH)
+
+    sys.path.insert(0, LIBRARY_PATH)
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.pop(0)
+
+class FakeModule(object):
+    # Stand-in for AnsibleModule: warnings are collected, fail_json raises
+    def __init__(self):
+        self.warnings = []
+
+    def warn(self, warning):
+        self.warnings.append(warning)
+
+    def fail_json(self, **kwargs):
+        raise AssertionError(kwargs['msg'])
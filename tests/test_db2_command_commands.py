@@ -0,0 +1,56 @@
+#
+# Tests of commands of db2_command in one CLP session
+#
+# exec_db2_session of db2_common is replaced by a stand-in returning the
+# session output and the (rc, output) of every command.
+#
+#   $ python -m pytest tests
+#
+# Requires ansible to be importable (the modules import AnsibleModule).
+#
+from __future__ import (absolute_import, division, print_function)
+
+import unittest
+
+from library_loader import FakeModule, load_library_module
+
+class TestCommandsLocal(unittest.TestCase):
+    def setUp(self):
+        self.db2_command = load_library_module('db2_command')
+        self.exec_db2_session = self.db2_command.exec_db2_session
+
+    def tearDown(self):
+        self.db2_command.exec_db2_session = self.exec_db2_session
+
+    def exec_commands(self, session_results, ignorable_sqlcodes=None):
+        marker = self.db2_command.DB2_SESSION_MARKER
+        out = "\n".join(["%s\n%s %s" % (stdout, marker, rc) for rc, stdout in session_results])
+
+        def fake_exec_db2_session(module, instance_name, commands, database_name=None, timeout=0, stop_on_error=False, terminator=';'):
+            return max([rc for rc, stdout in session_results]), out, '', session_results
+
+        self.db2_command.exec_db2_session = fake_exec_db2_session
+        commands = ["COMMAND %s" % n for n in range(len(session_results))]
+        return getattr(self.db2_command, '__exec_db2_commands_local')(FakeModule(), 'db2inst1', 'DB1', commands, None, ignorable_sqlcodes)[0]
+
+    def test_ignorable_sqlcode(self):
+        results = self.exec_commands([(4, "SQL0601N  The name of the object to be created is identical.  SQLSTATE=42710")], ['SQL0601N'])
+
+        self.assertEqual(results[0]['rc'], 0)
+        self.assertEqual(results[0]['db2_rc'], 4)
+
+    def test_sqlcode_not_ignorable(self):
+        results = self.exec_commands([(4, "SQL0204N  \"DB2INST1.T1\" is an undefined name.  SQLSTATE=42704")], ['SQL0601N'])
+
+        self.assertEqual(results[0]['rc'], 100)
+
+    def test_error_without_sqlcode_keeps_rc(self):
+        results = self.exec_commands([(0, "DB20000I  The SQL command completed successfully."),
+                                      (4, "db2: cannot open file /tmp/missing.sql")], ['SQL0601N'])
+
+        self.assertEqual(results[0]['rc'], 0)
+        self.assertEqual(results[1]['rc'], 4)
+        self.assertEqual(results[1]['sqlcodes'], {})
+
+if __name__ == '__main__':
+    unittest.main()
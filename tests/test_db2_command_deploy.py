@@ -0,0 +1,125 @@
+#
+# Tests of deploy of db2_command
+#
+# Ordering of the files of a directory or manifest, checks of the dependency
+# graph, the critical path and the scheduling of the files. The execution of a
+# file (__exec_db2_commmand_local) is replaced by a stand-in.
+#
+#   $ python -m pytest tests
+#
+# Requires ansible to be importable (the modules import AnsibleModule).
+#
+from __future__ import (absolute_import, division, print_function)
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from library_loader import FakeModule, load_library_module
+
+class FakeParser(object):
+    def __init__(self, sqlcodes):
+        self.sqlcodes = sqlcodes
+
+class TestDeploy(unittest.TestCase):
+    def setUp(self):
+        self.db2_command = load_library_module('db2_command')
+        self.path = tempfile.mkdtemp(prefix='test_db2_command_')
+        self.exec_command = getattr(self.db2_command, '__exec_db2_commmand_local')
+
+    def tearDown(self):
+        setattr(self.db2_command, '__exec_db2_commmand_local', self.exec_command)
+        shutil.rmtree(self.path)
+
+    def call(self, name, *args):
+        return getattr(self.db2_command, name)(*args)
+
+    def write_files(self, names):
+        for name in names:
+            file = os.path.join(self.path, name)
+            if not os.path.isdir(os.path.dirname(file)):
+                os.makedirs(os.path.dirname(file))
+            with open(file, 'w') as f:
+                f.write("SELECT 1 FROM SYSIBM.SYSDUMMY1;\n")
+
+    def write_manifest(self, entries):
+        manifest = os.path.join(self.path, 'manifest.json')
+        with open(manifest, 'w') as f:
+            json.dump({'files': entries}, f)
+        return manifest
+
+    def deploy(self, deploy_files, failing=(), logfile=None):
+        executed = []
+
+        def fake_exec_command(module, instance_name, database_name, file, logfile=None, *args):
+            executed.append((os.path.relpath(file, self.path), logfile))
+            rc = 4 if os.path.basename(file) in failing else 0
+            return rc, '', '', 'db2 -vtxf %s' % file, FakeParser({'SQL0204N': 1} if rc else {})
+
+        setattr(self.db2_command, '__exec_db2_commmand_local', fake_exec_command)
+        results, elapsed = self.call('__deploy_files', FakeModule(), 'db2inst1', 'DB1', deploy_files, logfile, None, 2, 0, False, 100)
+        return dict((result['name'], result) for result in results), executed
+
+    def test_directory_stages(self):
+        self.write_files(['010_tables.sql', '010_sequences.sql', '020_views.sql', 'grants.sql', 'notes.txt'])
+        deploy_files = self.call('__get_deploy_files_from_directory', self.path)
+
+        self.assertEqual([(deploy_file['name'], deploy_file['depends_on']) for deploy_file in deploy_files],
+                         [('010_sequences.sql', []), ('010_tables.sql', []),
+                          ('020_views.sql', ['010_sequences.sql', '010_tables.sql']), ('grants.sql', ['020_views.sql'])])
+
+    def test_manifest_dependencies(self):
+        self.write_files(['tables.sql', 'views.sql'])
+        deploy_files = self.call('__get_deploy_files_from_manifest', self.write_manifest(['tables.sql', {'file': 'views.sql', 'depends_on': 'tables.sql'}]))
+
+        self.assertEqual([(deploy_file['name'], deploy_file['depends_on']) for deploy_file in deploy_files],
+                         [('tables.sql', []), ('views.sql', ['tables.sql'])])
+        self.assertEqual(deploy_files[1]['file'], os.path.join(self.path, 'views.sql'))
+
+    def test_check_rejects_cycles_and_unknown_files(self):
+        self.write_files(['a.sql', 'b.sql'])
+        a, b = os.path.join(self.path, 'a.sql'), os.path.join(self.path, 'b.sql')
+
+        for deploy_files, error in [([{'name': 'a.sql', 'file': a, 'depends_on': ['b.sql']}, {'name': 'b.sql', 'file': b, 'depends_on': ['a.sql']}], 'cycle'),
+                                    ([{'name': 'a.sql', 'file': a, 'depends_on': ['c.sql']}], 'unknown file'),
+                                    ([{'name': 'a.sql', 'file': a, 'depends_on': []}, {'name': 'a.sql', 'file': a, 'depends_on': []}], 'more than once')]:
+            with self.assertRaises(ValueError) as context:
+                self.call('__check_deploy_files', deploy_files)
+            self.assertIn(error, str(context.exception))
+
+    def test_dependencies_run_first_and_failures_skip_downstream(self):
+        self.write_files(['tables.sql', 'views.sql', 'grants.sql', 'other.sql'])
+        deploy_files = self.call('__get_deploy_files_from_manifest', self.write_manifest([
+            'tables.sql', {'file': 'views.sql', 'depends_on': ['tables.sql']},
+            {'file': 'grants.sql', 'depends_on': ['views.sql']}, 'other.sql']))
+
+        results, executed = self.deploy(deploy_files)
+        order = [name for name, logfile in executed]
+        self.assertLess(order.index('tables.sql'), order.index('views.sql'))
+        self.assertLess(order.index('views.sql'), order.index('grants.sql'))
+
+        results, executed = self.deploy(deploy_files, failing=['views.sql'])
+        self.assertEqual(results['views.sql']['status'], 'failed')
+        self.assertEqual(results['grants.sql']['status'], 'skipped')
+        self.assertEqual(results['other.sql']['status'], 'succeeded')
+        self.assertNotIn('grants.sql', [name for name, logfile in executed])
+
+    def test_logfiles_of_same_file_names_in_different_directories(self):
+        self.write_files(['app1/tables.sql', 'app2/tables.sql'])
+        deploy_files = self.call('__get_deploy_files_from_manifest', self.write_manifest(['app1/tables.sql', 'app2/tables.sql']))
+
+        results, executed = self.deploy(deploy_files, logfile='/tmp/deploy.log')
+        self.assertEqual(sorted(executed), [('app1/tables.sql', '/tmp/deploy.log.000.tables.sql'), ('app2/tables.sql', '/tmp/deploy.log.001.tables.sql')])
+
+    def test_critical_path(self):
+        deploy_files = [{'name': 'a', 'depends_on': []}, {'name': 'b', 'depends_on': ['a']},
+                        {'name': 'c', 'depends_on': ['a']}, {'name': 'd', 'depends_on': ['b', 'c']}]
+        results = [{'name': 'a', 'elapsed': 1}, {'name': 'b', 'elapsed': 5}, {'name': 'c', 'elapsed': 2}, {'name': 'd', 'elapsed': 1}]
+
+        self.assertEqual(self.call('__get_deploy_critical_path', deploy_files, results), (['a', 'b', 'd'], 7))
+        self.assertEqual(self.call('__get_deploy_critical_path', [], []), ([], 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+#
+# Tests of engine ibm_db of db2_command against a stand-in ibm_db module
+#
+#   $ python -m pytest tests
+#
+# Requires ansible to be importable (the modules import AnsibleModule).
+#
+from __future__ import (absolute_import, division, print_function)
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from library_loader import FakeModule, load_library_module
+
+#
+# Stand-in for ibm_db
+#
+# exec_immediate returns a statement over the rows of a table, or raises the
+# error configured for the statement text.
+#
+class FakeStatement(object):
+    def __init__(self, rows, columns):
+        self.rows = list(rows)
+        self.columns = columns
+        self.fetches = 0
+
+class FakeIbmDb(object):
+    def __init__(self, tables=None, errors=None):
+        self.tables = tables or {}
+        self.errors = errors or {}
+        self.error = ''
+        self.connect_instance = None
+        self.closed = 0
+
+    def connect(self, database, user, password):
+        self.connect_instance = os.environ.get('DB2INSTANCE')
+        return {'database': database}
+
+    def close(self, conn):
+        self.closed += 1
+
+    def exec_immediate(self, conn, command):
+        if command in self.errors:
+            self.error = self.errors[command]
+            raise Exception(self.error)
+        if command in self.tables:
+            columns, rows = self.tables[command]
+            return FakeStatement([dict(zip(columns, row)) for row in rows], columns)
+        return FakeStatement([], [])
+
+    def num_fields(self, stmt):
+        return len(stmt.columns)
+
+    def num_rows(self, stmt):
+        return 1
+
+    def fetch_assoc(self, stmt):
+        stmt.fetches += 1
+        return stmt.rows.pop(0) if stmt.rows else False
+
+    def free_result(self, stmt):
+        return True
+
+    def stmt_errormsg(self):
+        return self.error
+
+    def conn_errormsg(self):
+        return ''
+
+class TestIbmDbEngine(unittest.TestCase):
+    def setUp(self):
+        self.db2_command = load_library_module('db2_command')
+        self.db2_common = sys.modules['ansible.module_utils.db2_common']
+        self.ibm_db = FakeIbmDb(
+            tables={'SELECT ID, NAME FROM T1': (['ID', 'NAME'], [(n, 'NAME%s' % n) for n in range(5)])},
+            errors={'SELECT * FROM T2': '[IBM][CLI Driver][DB2/LINUXX8664] SQL0204N  "DB2INST1.T2" is an undefined name.  SQLSTATE=42704 SQLCODE=-204',
+                    'SELECT * FROM T3': '[IBM][CLI Driver] CLI0108E  Communication link failure. SQLSTATE=40003'})
+        self.db2_common.OPTIONAL_MODULES['ibm_db'] = self.ibm_db
+
+    def tearDown(self):
+        getattr(self.db2_command, '__close_ibm_db_connections')()
+        self.db2_common.OPTIONAL_MODULES.pop('ibm_db', None)
+
+    def exec_commands(self, commands, **kwargs):
+        return getattr(self.db2_command, '__exec_db2_command_ibm_db')(FakeModule(), 'db2inst1', 'DB1', commands, **kwargs)
+
+    def test_rows_as_dicts(self):
+        result = self.exec_commands(['SELECT ID, NAME FROM T1'])[0]
+
+        self.assertEqual(result['rc'], 0)
+        self.assertEqual(result['row_count'], 5)
+        self.assertEqual(result['rows'][0], {'ID': 0, 'NAME': 'NAME0'})
+        self.assertEqual(result['rows'][-1], {'ID': 4, 'NAME': 'NAME4'})
+        self.assertNotIn('truncated', result)
+
+    def test_statement_without_result_set(self):
+        result = self.exec_commands(['DELETE FROM T1'])[0]
+
+        self.assertEqual(result['rc'], 0)
+        self.assertEqual(result['row_count'], 1)
+        self.assertNotIn('rows', result)
+
+    def test_chunked_fetch(self):
+        self.db2_command.ibm_db = self.ibm_db
+        stmt = self.ibm_db.exec_immediate(None, 'SELECT ID, NAME FROM T1')
+        chunks = list(getattr(self.db2_command, '__fetch_ibm_db_chunks')(stmt, 2))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual([row['ID'] for chunk in chunks for row in chunk], [0, 1, 2, 3, 4])
+
+    def test_chunked_fetch_stops_at_max_rows(self):
+        self.db2_command.ibm_db = self.ibm_db
+        stmt = self.ibm_db.exec_immediate(None, 'SELECT ID, NAME FROM T1')
+        chunks = list(getattr(self.db2_command, '__fetch_ibm_db_chunks')(stmt, 2, 3))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        # Rows beyond max_rows are not fetched
+        self.assertEqual(stmt.fetches, 3)
+
+    def test_max_rows_truncates_result_set(self):
+        result = self.exec_commands(['SELECT ID, NAME FROM T1'], fetch_size=2, max_rows=3)[0]
+
+        self.assertEqual(result['row_count'], 3)
+        self.assertTrue(result['truncated'])
+
+        result = self.exec_commands(['SELECT ID, NAME FROM T1'], max_rows=5)[0]
+        self.assertEqual(result['row_count'], 5)
+        self.assertFalse(result['truncated'])
+
+    def test_error_to_sqlcode(self):
+        results = self.exec_commands(['SELECT * FROM T2', 'SELECT ID, NAME FROM T1'])
+
+        self.assertEqual(results[0]['rc'], 4)
+        self.assertEqual(results[0]['sqlcodes'], {'SQL0204N': 1})
+        self.assertIn('SQLSTATE=42704', results[0]['stdout'])
+        # Following commands are still executed
+        self.assertEqual(results[1]['rc'], 0)
+
+    def test_ignorable_error(self):
+        result = self.exec_commands(['SELECT * FROM T2'], ignorable_sqlcodes=['SQL0204N'])[0]
+
+        self.assertEqual(result['rc'], 0)
+        self.assertEqual(result['sqlcodes'], {'SQL0204N': 1})
+
+    def test_error_without_sqlcode_is_not_ignorable(self):
+        result = self.exec_commands(['SELECT * FROM T3'], ignorable_sqlcodes=['SQL0204N'])[0]
+
+        self.assertEqual(result['rc'], 4)
+        self.assertEqual(result['sqlcodes'], {})
+
+    def test_result_sets_streamed_to_logfile(self):
+        path = tempfile.mkdtemp(prefix='test_db2_command_')
+        try:
+            logfile = os.path.join(path, 'rows.log')
+            results = self.exec_commands(['DELETE FROM T1', 'SELECT ID, NAME FROM T1'], fetch_size=2, logfile=logfile)
+
+            self.assertEqual(results[1]['row_count'], 5)
+            self.assertEqual(results[1]['logfile'], logfile)
+            self.assertNotIn('rows', results[1])
+            with open(logfile) as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual([line['command'] for line in lines], [1] * 5)
+            self.assertEqual(lines[-1]['row'], {'ID': 4, 'NAME': 'NAME4'})
+        finally:
+            shutil.rmtree(path)
+
+    def test_connection_reuse_and_environment(self):
+        os.environ['DB2INSTANCE'] = 'db2other'
+        try:
+            self.exec_commands(['DELETE FROM T1'])
+            self.exec_commands(['DELETE FROM T1'])
+
+            self.assertEqual(self.ibm_db.connect_instance, 'db2inst1')
+            self.assertEqual(os.environ['DB2INSTANCE'], 'db2other')
+            self.assertEqual(len(self.db2_command.DB2_CONNECTIONS), 1)
+        finally:
+            os.environ.pop('DB2INSTANCE', None)
+
+if __name__ == '__main__':
+    unittest.main()
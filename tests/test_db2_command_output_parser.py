@@ -0,0 +1,80 @@
+#
+# Tests of Db2OutputParser of db2_command
+#
+# sqlcodes and records of CLP output and the statement index derived from the
+# statement echo of 'db2 -v'.
+#
+#   $ python -m pytest tests
+#
+# Requires ansible to be importable (the modules import AnsibleModule).
+#
+from __future__ import (absolute_import, division, print_function)
+
+import unittest
+
+from library_loader import load_library_module
+
+class TestDb2OutputParser(unittest.TestCase):
+    def setUp(self):
+        self.db2_command = load_library_module('db2_command')
+
+    def parse(self, output, statements=None, max_records=100):
+        return self.db2_command.Db2OutputParser(max_records, statements).feed_output(output)
+
+    def test_sqlcodes_and_records(self):
+        parser = self.parse("SQL0601N  The name of the object to be created is identical to the existing\n"
+                            "name \"DB2INST1.T1\" of type \"TABLE\".  SQLSTATE=42710\n\n"
+                            "SQL0347W  The recursive common table expression may contain an infinite loop.\n"
+                            "SQLSTATE=01605\n")
+
+        self.assertEqual(parser.sqlcodes, {'SQL0601N': 1})
+        self.assertEqual([(record['sqlcode'], record['code'], record['sqlstate']) for record in parser.records],
+                         [('SQL0601N', -601, '42710'), ('SQL0347W', 347, '01605')])
+        self.assertIn('DB2INST1.T1', parser.records[0]['message'])
+
+    def test_max_records(self):
+        parser = self.parse("SQL0601N  Error.  SQLSTATE=42710\n" * 5, max_records=2)
+
+        self.assertEqual(parser.sqlcodes, {'SQL0601N': 5})
+        self.assertEqual(parser.record_count, 5)
+        self.assertEqual(len(parser.records), 2)
+
+    def test_without_statements_all_records_belong_to_statement_1(self):
+        parser = self.parse("CREATE TABLE T1 (ID INTEGER)\nSQL0601N  Error.  SQLSTATE=42710\n"
+                            "CREATE TABLE T2 (ID INTEGER)\nSQL0601N  Error.  SQLSTATE=42710\n")
+
+        self.assertEqual([record['statement'] for record in parser.records], [1, 1])
+
+    def test_statement_index_from_echo(self):
+        statements = ["CONNECT TO DB1", "CREATE TABLE T1 (ID INTEGER)", "SELECT ID FROM T1", "CREATE TABLE T2 (ID INTEGER)"]
+        parser = self.parse("CONNECT TO DB1\n\n"
+                            "   Database Connection Information\n\n"
+                            " Database server        = DB2/LINUXX8664 11.5.8.0\n"
+                            " Local database alias   = DB1\n\n"
+                            "CREATE TABLE T1 (ID INTEGER)\n"
+                            "DB20000I  The SQL command completed successfully.\n\n"
+                            "SELECT ID FROM T1\n\n"
+                            "ID\n-----------\n  CREATE TABLE T1\n\n  0 record(s) selected.\n\n"
+                            "CREATE TABLE T2 (ID INTEGER)\n"
+                            "SQL0601N  The name of the object to be created is identical.  SQLSTATE=42710\n", statements)
+
+        # Output of CONNECT and SELECT is not taken for an echo
+        self.assertEqual(parser.statement, 4)
+        self.assertEqual([(record['sqlcode'], record['statement']) for record in parser.records], [('SQL0601N', 4)])
+
+    def test_echo_of_multiline_statement_with_terminator(self):
+        statements = [("CREATE TABLE T1 (\n  ID INTEGER\n)", ';'), ("CREATE PROCEDURE P1 BEGIN DECLARE X INTEGER; END", '@')]
+        parser = self.parse("CREATE TABLE T1 ( ID INTEGER );\n"
+                            "DB20000I  The SQL command completed successfully.\n\n"
+                            "CREATE PROCEDURE P1 BEGIN DECLARE X INTEGER; END@\n"
+                            "SQL0454N  The signature provided in the definition for routine \"P1\" matches.  SQLSTATE=42723\n", statements)
+
+        self.assertEqual([(record['sqlcode'], record['statement']) for record in parser.records], [('SQL0454N', 2)])
+
+    def test_echo_prefix_must_end_at_word(self):
+        parser = self.parse("CREATE TABLE T10 (ID INTEGER)\n", ["CREATE TABLE T1 (ID INTEGER)"])
+
+        self.assertEqual(parser.statement, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+#
+# Tests of the SQL file splitter and of resume of db2_command
+#
+# The resumable execution runs against the stand-in db2 of benchmarks/fake_db2:
+# the db2profile of the session is replaced by a PATH to the stand-in.
+#
+#   $ python -m pytest tests
+#
+# Requires ansible to be importable (the modules import AnsibleModule).
+#
+from __future__ import (absolute_import, division, print_function)
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from library_loader import FAKE_DB2_PATH, FakeModule, load_library_module
+
+class TestSplitSqlFile(unittest.TestCase):
+    def setUp(self):
+        self.db2_command = load_library_module('db2_command')
+        self.path = tempfile.mkdtemp(prefix='test_db2_command_')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def split(self, text):
+        file = os.path.join(self.path, 'test.sql')
+        with open(file, 'w') as f:
+            f.write(text)
+        return getattr(self.db2_command, '__split_sql_file')(file)
+
+    def test_terminator_in_quotes(self):
+        self.assertEqual(self.split("INSERT INTO T1 VALUES ('a;b', \"C;D\");\nSELECT 1 FROM T1;\n"),
+                         [("INSERT INTO T1 VALUES ('a;b', \"C;D\")", ';'), ("SELECT 1 FROM T1", ';')])
+
+    def test_multiline_string_keeps_line_breaks(self):
+        self.assertEqual(self.split("INSERT INTO T1 VALUES ('a\nb');\n"), [("INSERT INTO T1 VALUES ('a\nb')", ';')])
+
+    def test_line_comments(self):
+        self.assertEqual(self.split("-- header; with terminator\nCREATE TABLE T1 (ID INTEGER); -- trailing;\n"),
+                         [("CREATE TABLE T1 (ID INTEGER)", ';')])
+
+    def test_block_comments(self):
+        statements = self.split("/* header\n   comment; */\nSELECT /* inline; */ ID\n  FROM T1;\n")
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(" ".join(statements[0][0].split()), "SELECT ID FROM T1")
+
+    def test_single_line_break_per_line(self):
+        self.assertEqual(self.split("SELECT ID\n  FROM T1\n  WHERE ID = 1;\n"), [("SELECT ID\n  FROM T1\n  WHERE ID = 1", ';')])
+
+    def test_set_terminator(self):
+        statements = self.split("CREATE TABLE T1 (ID INTEGER);\n--#SET TERMINATOR @\n"
+                                "CREATE PROCEDURE P1 BEGIN DECLARE X INTEGER; SET X = 1; END@\n"
+                                "--#SET TERMINATOR ;\nDROP TABLE T1;\n")
+        self.assertEqual(statements, [("CREATE TABLE T1 (ID INTEGER)", ';'),
+                                      ("CREATE PROCEDURE P1 BEGIN DECLARE X INTEGER; SET X = 1; END", '@'),
+                                      ("DROP TABLE T1", ';')])
+
+    def test_last_statement_without_terminator(self):
+        self.assertEqual(self.split("SELECT 1 FROM T1;\nSELECT 2 FROM T1"), [("SELECT 1 FROM T1", ';'), ("SELECT 2 FROM T1", ';')])
+
+class TestResume(unittest.TestCase):
+    def setUp(self):
+        self.db2_command = load_library_module('db2_command')
+        self.path = tempfile.mkdtemp(prefix='test_db2_command_')
+        self.file = os.path.join(self.path, 'test.sql')
+        self.logfile = os.path.join(self.path, 'test.log')
+        self.module = FakeModule()
+
+        # Sessions are counted by their prologue
+        self.sessions = 0
+        self.prologue = getattr(self.db2_command, '__build_db2_session_prologue')
+
+        def fake_prologue(instance_name, database_name):
+            self.sessions += 1
+            return ["PATH=%s:%s:$PATH" % (FAKE_DB2_PATH, os.path.dirname(sys.executable)), "export FAKE_DB2_LATENCY=0"]
+
+        setattr(self.db2_command, '__build_db2_session_prologue', fake_prologue)
+        self.environment = dict(os.environ)
+
+    def tearDown(self):
+        setattr(self.db2_command, '__build_db2_session_prologue', self.prologue)
+        os.environ.clear()
+        os.environ.update(self.environment)
+        shutil.rmtree(self.path)
+
+    def write_file(self, statements):
+        with open(self.file, 'w') as f:
+            f.write("".join(["%s;\n" % statement for statement in statements]))
+
+    def resume(self, ignorable_sqlcodes=None, **environment):
+        os.environ.update(dict((key, str(value)) for key, value in environment.items()))
+        return getattr(self.db2_command, '__exec_db2_file_resumable')(self.module, 'db2inst1', 'DB1', self.file, self.logfile, ignorable_sqlcodes)
+
+    def read_log(self):
+        with open(self.logfile) as f:
+            return f.read()
+
+    def test_ignorable_errors_in_one_session(self):
+        self.write_file(["CREATE TABLE T%s (ID INTEGER)" % n for n in range(10)])
+        result = self.resume(['SQL0601N'], FAKE_DB2_ERROR_RATE=1)
+
+        self.assertEqual(self.sessions, 1)
+        self.assertIsNone(result['failed_statement'])
+        self.assertEqual(result['statements_executed'], 10)
+        self.assertEqual(result['sqlcodes'], {'SQL0601N': 10})
+        self.assertFalse(os.path.exists(result['state_file']))
+
+    def test_logfile_has_echo_and_no_markers(self):
+        self.write_file(["CREATE TABLE T%s (ID INTEGER)" % n for n in range(3)])
+        self.resume()
+
+        log = self.read_log()
+        self.assertNotIn('__DB2_SESSION_RC__', log)
+        for n in range(3):
+            self.assertIn("CREATE TABLE T%s (ID INTEGER)" % n, log)
+
+    def test_failed_statement_and_resume_with_replay(self):
+        self.write_file(["CONNECT TO DB1", "SET SCHEMA APP", "CREATE TABLE T1 (ID INTEGER)",
+                         "CREATE TABLE T2 (ID INTEGER) IN FAILME", "CREATE TABLE T3 (ID INTEGER)"])
+
+        result = self.resume(['SQL0601N'], FAKE_DB2_FAIL_MATCH='FAILME')
+        self.assertEqual(result['failed_statement']['index'], 3)
+        self.assertEqual(result['failed_statement']['sqlcodes'], {'SQL0204N': 1})
+        with open(result['state_file']) as f:
+            self.assertEqual([entry['index'] for entry in json.load(f)['completed']], [0, 1, 2])
+
+        # Rerun: CONNECT and SET SCHEMA are replayed in the new session, CREATE TABLE T1 is skipped
+        result = self.resume(['SQL0601N'], FAKE_DB2_FAIL_MATCH='NOTHING')
+        self.assertEqual(self.sessions, 2)
+        self.assertIsNone(result['failed_statement'])
+        self.assertEqual((result['statements_skipped'], result['statements_replayed'], result['statements_executed']), (3, 2, 2))
+
+        log = self.read_log()
+        self.assertEqual(log.count("CONNECT TO DB1"), 2)
+        self.assertEqual(log.count("SET SCHEMA APP"), 2)
+        self.assertEqual(log.count("CREATE TABLE T1 (ID INTEGER)"), 1)
+        self.assertFalse(os.path.exists(result['state_file']))
+
+    def test_changed_file_restarts_at_first_change(self):
+        self.write_file(["CREATE TABLE T1 (ID INTEGER)", "CREATE TABLE T2 (ID INTEGER) IN FAILME"])
+        self.resume(FAKE_DB2_FAIL_MATCH='FAILME')
+
+        self.write_file(["CREATE TABLE T0 (ID INTEGER)", "CREATE TABLE T2 (ID INTEGER)"])
+        result = self.resume(FAKE_DB2_FAIL_MATCH='NOTHING')
+        self.assertEqual((result['statements_skipped'], result['statements_executed']), (0, 2))
+
+    def test_corrupt_state_file_is_ignored(self):
+        state_file = getattr(self.db2_command, '__get_resume_state_file')(self.file, self.logfile)
+        with open(state_file, 'w') as f:
+            f.write("{not json")
+
+        self.assertEqual(getattr(self.db2_command, '__load_resume_state')(state_file), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#
+# Tests of result_format structured of db2_command
+#
+# The DESCRIBE output and DEL export parsers, and the query of the export.
+# __exec_db2_commands_local is replaced by a stand-in writing the DEL file.
+#
+#   $ python -m pytest tests
+#
+# Requires ansible to be importable (the modules import AnsibleModule).
+#
+from __future__ import (absolute_import, division, print_function)
+
+import unittest
+
+from library_loader import FakeModule, load_library_module
+
+DESCRIBE_OUTPUT = """
+ Column Information
+
+ Number of columns: 4
+
+ SQL type              Type length  Column name                     Name length
+ --------------------  -----------  ------------------------------  -----------
+ 497   INTEGER                    4  ID                                        2
+ 449   VARCHAR                   64  NAME                                      4
+ 485   DECIMAL                 9, 2  PRICE                                     5
+ 481   DOUBLE                     8  RATIO                                     5
+"""
+
+class TestParsers(unittest.TestCase):
+    def setUp(self):
+        self.db2_command = load_library_module('db2_command')
+
+    def parse_del(self, text, sql_types=None):
+        return list(getattr(self.db2_command, '__parse_del_rows')(text.splitlines(True), sql_types))
+
+    def test_describe_columns(self):
+        self.assertEqual(getattr(self.db2_command, '__parse_describe_columns')(DESCRIBE_OUTPUT),
+                         [('ID', 'INTEGER'), ('NAME', 'VARCHAR'), ('PRICE', 'DECIMAL'), ('RATIO', 'DOUBLE')])
+
+    def test_del_values_converted_by_type(self):
+        rows = self.parse_del('1,"A",12.50,+1.5E+000\n', ['INTEGER', 'VARCHAR', 'DECIMAL', 'DOUBLE'])
+        self.assertEqual(rows, [[1, 'A', '12.50', 1.5]])
+
+    def test_del_escaped_quotes_and_separators(self):
+        self.assertEqual(self.parse_del('"say ""hi"", then go",2\n'), [['say "hi", then go', '2']])
+
+    def test_del_multiline_string(self):
+        self.assertEqual(self.parse_del('1,"line 1\nline 2"\n2,"x"\n', ['INTEGER', 'VARCHAR']), [[1, 'line 1\nline 2'], [2, 'x']])
+
+    def test_del_null_and_empty_string(self):
+        self.assertEqual(self.parse_del('1,,""\n', ['INTEGER', 'VARCHAR', 'VARCHAR']), [[1, None, '']])
+
+    def test_del_last_line_without_newline(self):
+        self.assertEqual(self.parse_del('1,"A"\n2,"B"', ['INTEGER']), [[1, 'A'], [2, 'B']])
+
+class TestStructuredQuery(unittest.TestCase):
+    def setUp(self):
+        self.db2_command = load_library_module('db2_command')
+        self.exec_commands = getattr(self.db2_command, '__exec_db2_commands_local')
+        self.commands = []
+
+        def fake_exec_commands(module, instance_name, database_name, commands, logfile=None, ignorable_sqlcodes=None, timeout=0):
+            self.commands = commands
+            # EXPORT TO <file> OF DEL ...
+            with open(commands[1].split()[2], 'w') as f:
+                f.write("".join(['%s,"NAME%s"\n' % (n, n) for n in range(10)]))
+            results = [{'command': command, 'db2_rc': 0, 'rc': 0, 'stdout': ''} for command in commands]
+            results[0]['stdout'] = " 497   INTEGER                    4  ID                                        2\n" \
+                                   " 449   VARCHAR                   64  NAME                                      4\n"
+            return results, '', '', ''
+
+        setattr(self.db2_command, '__exec_db2_commands_local', fake_exec_commands)
+
+    def tearDown(self):
+        setattr(self.db2_command, '__exec_db2_commands_local', self.exec_commands)
+
+    def query(self, query, max_rows=0, row_offset=0):
+        return getattr(self.db2_command, '__exec_db2_query_structured')(FakeModule(), 'db2inst1', 'DB1', query, max_rows, row_offset)
+
+    def test_select_is_wrapped(self):
+        self.query("SELECT ID, NAME FROM T1", max_rows=3, row_offset=2)
+        self.assertEqual(self.commands[0], "DESCRIBE SELECT * FROM (SELECT ID, NAME FROM T1) AS T FETCH FIRST 5 ROWS ONLY")
+
+    def test_common_table_expression_is_not_wrapped(self):
+        query = "WITH X AS (SELECT ID, NAME FROM T1) SELECT * FROM X"
+        result = self.query(query, max_rows=3, row_offset=2)
+
+        self.assertEqual(self.commands[0], "DESCRIBE %s" % query)
+        self.assertEqual([row['ID'] for row in result['rows']], [2, 3, 4])
+
+    def test_query_with_own_limit_is_not_wrapped(self):
+        for query in ["SELECT ID, NAME FROM T1 ORDER BY ID", "SELECT ID, NAME FROM T1 FETCH FIRST 8 ROWS ONLY",
+                      "SELECT ID, NAME FROM T1 ORDER BY ID OFFSET 1 ROWS FETCH NEXT 8 ROWS ONLY"]:
+            result = self.query(query, max_rows=4)
+
+            self.assertEqual(self.commands[0], "DESCRIBE %s" % query)
+            self.assertEqual(result['row_count'], 4)
+            self.assertEqual(result['rows'][0], {'ID': 0, 'NAME': 'NAME0'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#
+# Tests of the incremental db2diag.log scanner of db2_diag
+#
+#   $ python -m pytest tests
+#
+# Requires ansible to be importable (the modules import AnsibleModule).
+#
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from library_loader import FakeModule, load_library_module
+
+RECORD = """%s-%02d.00.00.000000+120 I%sE400          LEVEL: %s
+PID     : 12345                TID : 140000       PROC : db2sysc 0
+INSTANCE: db2inst1             NODE : 000          DB   : SAMPLE
+FUNCTION: DB2 UDB, lock manager, sqlplnfd, probe:10
+MESSAGE : %s
+DATA #1 : SQLCA, PD_DB2_TYPE_SQLCA, 136 bytes
+ sqlcaid : SQLCA     sqlcabc: 136   sqlcode: %s   sqlerrml: 2
+
+"""
+
+class TestScanDiagLog(unittest.TestCase):
+    def setUp(self):
+        self.db2_diag = load_library_module('db2_diag')
+        self.path = tempfile.mkdtemp(prefix='test_db2_diag_')
+        self.log_file = os.path.join(self.path, 'db2diag.log')
+        self.state_file = os.path.join(self.path, 'state', 'db2inst1.json')
+        self.records = 0
+        self.index_interval = self.db2_diag.INDEX_INTERVAL
+
+    def tearDown(self):
+        self.db2_diag.INDEX_INTERVAL = self.index_interval
+        shutil.rmtree(self.path)
+
+    def append(self, level='Error', sqlcode=-911, hour=None, text=None):
+        hour = self.records if hour is None else hour
+        self.records += 1
+        with open(self.log_file, 'a') as f:
+            f.write(text if text is not None else RECORD % ('2017-07-13', hour, self.records, level, "ZRC=0x80100002=SQLP_LTIMEOUT", sqlcode))
+
+    def scan(self, levels=('Error', 'Severe'), since=None, until=None, sqlcodes=None, incremental=True, max_entries=100):
+        return getattr(self.db2_diag, '__scan_diag_log')(FakeModule(), 'db2inst1', self.log_file, self.state_file, list(levels),
+                                                          since, until, sqlcodes, incremental, max_entries)
+
+    def test_incremental_scan_reads_new_records_only(self):
+        self.append()
+        self.append(level='Info', sqlcode=0)
+        entries, stats = self.scan()
+        self.assertEqual(len(entries), 1)
+        self.assertEqual((stats['records_scanned'], stats['level_counts']), (2, {'Error': 1, 'Info': 1}))
+        self.assertEqual(stats['end_offset'], os.path.getsize(self.log_file))
+
+        entries, stats = self.scan()
+        self.assertEqual((entries, stats['scanned_bytes']), ([], 0))
+
+        self.append(level='Severe', sqlcode=-1224)
+        entries, stats = self.scan()
+        self.assertEqual([(entry['level'], entry['sqlcodes'], entry['database']) for entry in entries], [('Severe', [-1224], 'SAMPLE')])
+        self.assertEqual(entries[0]['instance'], 'db2inst1')
+
+    def test_record_being_written_is_read_on_next_run(self):
+        self.append()
+        complete = os.path.getsize(self.log_file)
+        self.append(text=(RECORD % ('2017-07-13', 5, 2, 'Error', 'partial', -911)).rstrip('\n'))
+
+        entries, stats = self.scan()
+        self.assertEqual((len(entries), stats['end_offset']), (1, complete))
+
+        with open(self.log_file, 'a') as f:
+            f.write("\n\n")
+        entries, stats = self.scan()
+        self.assertEqual([entry['message'] for entry in entries], ['partial'])
+
+    def test_rotated_log_is_read_from_start(self):
+        self.append()
+        self.scan()
+
+        os.rename(self.log_file, self.log_file + ".archived")
+        self.append(sqlcode=-904)
+        entries, stats = self.scan()
+        self.assertEqual(stats['start_offset'], 0)
+        self.assertEqual([entry['sqlcodes'] for entry in entries], [[-904]])
+
+    def test_filters(self):
+        for hour, sqlcode in enumerate([-911, -904, -911, -911]):
+            self.append(sqlcode=sqlcode, hour=hour)
+
+        entries, stats = self.scan(sqlcodes=set([-911]), since='2017-07-13-01.00.00', until='2017-07-13-03.00.00', incremental=False)
+        self.assertEqual([entry['timestamp'][:13] for entry in entries], ['2017-07-13-02'])
+
+        entries, stats = self.scan(incremental=False, max_entries=2)
+        self.assertEqual([entry['timestamp'][:13] for entry in entries], ['2017-07-13-02', '2017-07-13-03'])
+
+    def test_since_starts_at_indexed_offset(self):
+        self.db2_diag.INDEX_INTERVAL = 1
+        for hour in range(4):
+            self.append(hour=hour)
+        self.scan()
+
+        entries, stats = self.scan(since='2017-07-13-02.00.00', incremental=False)
+        self.assertGreater(stats['start_offset'], 0)
+        self.assertEqual([entry['timestamp'][:13] for entry in entries], ['2017-07-13-02', '2017-07-13-03'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#
+# Tests of the on-disk fact cache of db2_facts
+#
+#   $ python -m pytest tests
+#
+# Requires ansible to be importable (the modules import AnsibleModule).
+#
+from __future__ import (absolute_import, division, print_function)
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from library_loader import FakeModule, load_library_module
+
+class TestDiscoveryCache(unittest.TestCase):
+    def setUp(self):
+        self.db2_facts = load_library_module('db2_facts')
+        self.path = tempfile.mkdtemp(prefix='test_db2_facts_')
+        self.cache_file = os.path.join(self.path, 'facts.json')
+        self.clear()
+
+    def tearDown(self):
+        self.clear()
+        shutil.rmtree(self.path)
+
+    def clear(self):
+        self.db2_facts.DISCOVERY_CACHE.clear()
+        self.db2_facts.CACHE_TIMESTAMPS.clear()
+
+    def write_cache(self, cache):
+        with open(self.cache_file, 'w') as f:
+            json.dump(cache, f)
+
+    def read_cache(self):
+        with open(self.cache_file) as f:
+            return json.load(f)
+
+    def test_refresh_keeps_timestamps_of_other_entries(self):
+        software_time = time.time() - 600
+        self.write_cache({'timestamps': {'software': software_time}, 'fingerprint': {}, 'facts': {'software': {'/opt/ibm/db2/V11.5': {}}}})
+
+        self.assertTrue(self.db2_facts.load_discovery_cache(FakeModule(), self.cache_file, 3600))
+        self.db2_facts.DISCOVERY_CACHE['instances'] = {'db2inst1': {}}
+        self.db2_facts.save_discovery_cache(FakeModule(), self.cache_file)
+
+        timestamps = self.read_cache()['timestamps']
+        self.assertEqual(timestamps['software'], software_time)
+        self.assertGreater(timestamps['instances'], software_time)
+
+    def test_expired_entries_are_not_loaded(self):
+        self.write_cache({'timestamps': {'software': time.time() - 7200, 'instances': time.time()}, 'fingerprint': {},
+                          'facts': {'software': {}, 'instances': {'db2inst1': {}}}})
+
+        self.assertTrue(self.db2_facts.load_discovery_cache(FakeModule(), self.cache_file, 3600))
+        self.assertEqual(sorted(self.db2_facts.DISCOVERY_CACHE.keys()), ['instances'])
+
+    def test_changed_fingerprint_invalidates_cache(self):
+        self.write_cache({'timestamps': {'software': time.time()}, 'fingerprint': {self.path: 0}, 'facts': {'software': {}}})
+
+        self.assertFalse(self.db2_facts.load_discovery_cache(FakeModule(), self.cache_file, 3600))
+        self.assertEqual(self.db2_facts.DISCOVERY_CACHE, {})
+
+if __name__ == '__main__':
+    unittest.main()